@@ -0,0 +1,65 @@
+"""
+An overloaded JSON RPC server: 64 clients calling as fast as they can a
+method whose backend can run four 10ms queries at a time, with and without
+admission control.
+
+Without it every call queues and latency grows with the number of
+clients. With it the excess is shed quickly and admitted calls stay fast.
+"""
+import threading
+import time
+
+import benchutil
+from rpc import admission, exceptions, jsonrpc
+
+CLIENTS = 64
+SECONDS = 2.0
+BACKEND = threading.Semaphore(4)
+
+
+class Handler(object):
+    def query(self):
+        with BACKEND:
+            time.sleep(0.01)
+        return "result"
+
+
+def overload(server):
+    """
+    Run CLIENTS calling `query` for SECONDS.
+
+    Return: a tuple of (sorted latencies of answered calls, number shed)
+    """
+    latencies, shed = [], [0]
+    deadline = time.time() + SECONDS
+    def client():
+        while time.time() < deadline:
+            start = time.time()
+            try:
+                server._dispatch("query", [], 1)
+            except exceptions.OverloadedError:
+                shed[0] += 1
+                time.sleep(0.01)
+                continue
+            latencies.append(time.time() - start)
+    threads = [threading.Thread(target=client) for i in range(CLIENTS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sorted(latencies), shed[0]
+
+
+def main():
+    for label, control in [("unlimited", None),
+                           ("admission", admission.AdmissionControl(limit=4, queue=8,
+                                                                    queue_timeout=0.05))]:
+        server = jsonrpc.Server("localhost", 7890, Handler, codec="stdlib", admission=control)
+        latencies, shed = overload(server)
+        benchutil.report(label + " answered", len(latencies) / SECONDS, "calls/s")
+        benchutil.report(label + " shed", shed / SECONDS, "calls/s")
+        benchutil.report(label + " p50", latencies[len(latencies) / 2] * 1000, "ms")
+        benchutil.report(label + " p99", latencies[int(len(latencies) * 0.99)] * 1000, "ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+A thundering herd: many identical calls arrive at once for an expensive
+JSON RPC method (a 20ms query against a backend which can only run four
+at a time), with and without servers.coalesce.
+"""
+import threading
+import time
+
+import benchutil
+from rpc import jsonrpc, servers
+
+CLIENTS = 200
+BACKEND = threading.Semaphore(4)
+
+
+def query():
+    with BACKEND:
+        time.sleep(0.02)
+    return "result"
+
+
+class Handler(object):
+    def __init__(self):
+        self.calls = 0
+
+    def plain(self, key):
+        self.calls += 1
+        return query()
+
+    @servers.coalesce
+    def coalesced(self, key):
+        self.calls += 1
+        return query()
+
+
+def herd(server, method):
+    """
+    Make CLIENTS concurrent calls to `method`.
+
+    Return: the number of seconds until all were answered
+    """
+    threads = [threading.Thread(target=server._dispatch, args=(method, ["popular"], i))
+               for i in range(CLIENTS)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.time() - start
+
+
+def main():
+    for method in ["plain", "coalesced"]:
+        server = jsonrpc.Server("localhost", 7890, Handler, codec="stdlib")
+        elapsed = herd(server, method)
+        benchutil.report(method + " handler calls", server.handler.calls, "calls")
+        benchutil.report(method + " herd answered in", elapsed * 1000, "ms")
+
+if __name__ == '__main__':
+    main()
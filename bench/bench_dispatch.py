@@ -0,0 +1,45 @@
+"""
+Server side cost of dispatching a JSON RPC call, from the method name to
+the response object.
+
+Compares the original dispatch (hasattr then getattr on the handler for
+every call, then asking collections.Iterator whether to stream the result)
+with the current Server, which looks methods up in the dispatch table it
+built when it started and checks the number of arguments before calling.
+"""
+import collections
+import timeit
+
+import benchutil
+from rpc import jsonrpc
+
+RUNS = 200000
+
+
+class Handler(object):
+    def sayhi(self, person):
+        return "Hi " + person
+
+
+def original(handler, method, params, reqid):
+    """
+    The original dispatch.
+    """
+    if not hasattr(handler, method):
+        return dict(id=reqid, result=None, error="Not Found")
+    result = getattr(handler, method)(*params)
+    if isinstance(result, collections.Iterator):
+        return result
+    return dict(id=reqid, result=result, error=None)
+
+
+def main():
+    server = jsonrpc.Server("localhost", 7890, Handler, codec="stdlib")
+    for label, fn in [("original", lambda: original(server.handler, "sayhi", ["Larry"], 1)),
+                      ("current", lambda: server._dispatch("sayhi", ["Larry"], 1)),
+                      ("system.listMethods", lambda: server._dispatch("system.listMethods", [], 1))]:
+        elapsed = min(timeit.repeat(fn, number=RUNS, repeat=3))
+        benchutil.report(label, elapsed / RUNS * 1e6, "us/call")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+"""
+Server side cost of answering a JSON RPC call to a pure method whose
+result is a thousand row table, with and without servers.memoize.
+"""
+import timeit
+
+import benchutil
+from rpc import jsonrpc, servers
+
+RUNS = 2000
+
+ROWS = [dict(id=i, name="row {0}".format(i), score=i * 0.5) for i in range(1000)]
+
+
+class Handler(object):
+    def table(self, n):
+        return ROWS[:n]
+
+    @servers.memoize
+    def memoized(self, n):
+        return ROWS[:n]
+
+
+def main():
+    server = jsonrpc.Server("localhost", 7890, Handler, codec="stdlib")
+    for method in ["table", "memoized"]:
+        call = dict(method=method, params=[1000], id=1)
+        fn = lambda: server.parse_response(None, server._call(call))
+        elapsed = min(timeit.repeat(fn, number=RUNS, repeat=3))
+        benchutil.report(method, elapsed / RUNS * 1e6, "us/call")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""
+Server side cost of timing calls into the metrics.
+
+Compares calling a handler method directly with calling it through
+HTTPServer.invoke, which times it into the method's histogram, and
+reports the difference - the instrumentation's cost per call.
+"""
+import timeit
+
+import benchutil
+from rpc import jsonrpc
+
+RUNS = 500000
+
+
+class Handler(object):
+    def ping(self):
+        return "pong!"
+
+
+def main():
+    server = jsonrpc.Server("localhost", 7890, Handler, codec="stdlib")
+    method = server.table['ping']
+    results = {}
+    for label, fn in [("bare", lambda: method.fn()),
+                      ("invoke", lambda: server.invoke(method, ()))]:
+        results[label] = min(timeit.repeat(fn, number=RUNS, repeat=5)) / RUNS * 1e6
+        benchutil.report(label, results[label], "us/call")
+    benchutil.report("overhead", results["invoke"] - results["bare"], "us/call")
+
+if __name__ == '__main__':
+    main()
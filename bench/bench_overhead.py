@@ -0,0 +1,43 @@
+"""
+Client side overhead of a JSON RPC call: everything before the request
+touches the network.
+
+Compares the original call path (a fresh lambda per attribute access, a
+uuid4 request id and a dict of separately serialized fields) with the
+current Client, whose network send is stubbed out.
+"""
+import json
+import timeit
+import uuid
+
+import benchutil
+from rpc import jsonrpc
+
+RUNS = 200000
+
+
+def original(method, *params):
+    """
+    The original call path up to the network.
+    """
+    stub = lambda *a: (method, a)
+    method, params = stub(*params)
+    reqid = uuid.uuid4().hex
+    payload = dict(params=params, id=reqid, method=method)
+    return reqid, dict([(k, json.dumps(v)) for k, v in payload.items()])
+
+
+def main():
+    for wire in ["form", "json"]:
+        client = jsonrpc.Client("localhost", wire=wire, codec="stdlib")
+        client._send = lambda payload: payload
+        client._parse_resp = lambda reqid, resp: resp
+        for label, fn in [("original", lambda: original("sayhi", "Larry")),
+                          ("current " + wire, lambda: client.sayhi("Larry"))]:
+            if label == "original" and wire == "json":
+                continue
+            elapsed = min(timeit.repeat(fn, number=RUNS, repeat=3))
+            benchutil.report(label, elapsed / RUNS * 1e6, "us/call")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+"""
+Encode and decode cost of a JSON RPC call by payload size, for the form
+encoded and application/json wire formats.
+
+Each measurement covers the client building the request body and the server
+decoding it back into params, without the network in between.
+"""
+import time
+import urllib
+
+import webob
+
+import benchutil
+from rpc import jsonrpc
+
+SIZES = [("1 KB", 1 << 10), ("10 KB", 10 << 10), ("100 KB", 100 << 10),
+         ("1 MB", 1 << 20), ("10 MB", 10 << 20)]
+
+ROW = {"name": 'Larry "the" Lobster', "path": "/usr/local/bin", "score": 3.14159}
+
+
+class Handler(object):
+    def echo(self, rows):
+        return len(rows)
+
+
+def params(size):
+    """
+    Build a list of rows which is roughly `size` bytes once serialized.
+    """
+    return [dict(ROW, id=i) for i in range(max(1, size / 80))]
+
+
+def roundtrip(client, server, rows):
+    reqid, payload = client._build_payload(client, "echo", rows)
+    if client.wire == "json":
+        body, ctype = payload, 'application/json'
+    else:
+        body, ctype = urllib.urlencode(payload), 'application/x-www-form-urlencoded'
+    request = webob.Request.blank('/', POST=body, content_type=ctype)
+    server.procedure(request)
+    return len(body)
+
+
+def main():
+    server = jsonrpc.Server('localhost', 0, Handler)
+    for label, size in SIZES:
+        rows = params(size)
+        for wire in ["form", "json"]:
+            client = jsonrpc.Client("localhost", wire=wire)
+            runs = max(3, (1 << 20) * 20 / size) if size < (1 << 20) else 3
+            start = time.time()
+            for i in range(runs):
+                nbytes = roundtrip(client, server, rows)
+            elapsed = (time.time() - start) / runs
+            benchutil.report("{0} {1} ({2:,} bytes)".format(label, wire, nbytes),
+                             elapsed * 1000, "ms")
+
+if __name__ == '__main__':
+    main()
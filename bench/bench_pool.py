@@ -0,0 +1,25 @@
+"""
+Calls per second from a JSON RPC Client against a local keep-alive server,
+with a fresh connection per call versus the shared keep-alive pool.
+"""
+import requests
+
+import benchutil
+from rpc import jsonrpc
+
+
+def main():
+    url = benchutil.pong_server()
+    client = jsonrpc.Client(url)
+
+    def fresh():
+        reqid, payload = client._build_payload(client, "ping")
+        resp = requests.post(client.url, data=payload, timeout=client.timeout,
+                             headers={'Connection': 'close'})
+        client._parse_resp(reqid, resp)
+
+    benchutil.report("connection per call", benchutil.rate(fresh), "calls/s")
+    benchutil.report("keep-alive pool", benchutil.rate(client.ping), "calls/s")
+
+if __name__ == '__main__':
+    main()
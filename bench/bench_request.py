@@ -0,0 +1,42 @@
+"""
+Server side cost of a JSON RPC request through the WSGI app, from environ
+to response body, wrapping requests in webob.Request or our lightweight
+servers.Request.
+"""
+import json
+import StringIO
+import timeit
+import urllib
+
+import benchutil
+from rpc import jsonrpc, servers
+
+RUNS = 20000
+
+
+class Handler(object):
+    def sayhi(self, person):
+        return "Hi " + person
+
+
+def environ(content_type, body):
+    return {'REQUEST_METHOD': 'POST', 'CONTENT_TYPE': content_type,
+            'CONTENT_LENGTH': str(len(body)), 'QUERY_STRING': '',
+            'wsgi.input': StringIO.StringIO(body)}
+
+
+def main():
+    server = jsonrpc.Server("localhost", 7890, Handler, codec="stdlib")
+    start_response = lambda status, headers: None
+    form = urllib.urlencode(dict(method='"sayhi"', params='["Larry"]', id='1'))
+    body = json.dumps(dict(method="sayhi", params=["Larry"], id=1))
+    for wire, content_type, data in [("form", 'application/x-www-form-urlencoded', form),
+                                     ("json", 'application/json', body)]:
+        for name, klass in [("webob", servers.webob.Request), ("Request", servers.Request)]:
+            server.request_class = klass
+            fn = lambda: server.app(environ(content_type, data), start_response)
+            elapsed = min(timeit.repeat(fn, number=RUNS, repeat=3))
+            benchutil.report("{0} {1}".format(name, wire), elapsed / RUNS * 1e6, "us/request")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Calls per second from concurrent clients against a JSON RPC Server whose
+handler takes 10ms per call, served by the simple backend versus the
+threaded and event loop backends.
+"""
+import threading
+import time
+from wsgiref import simple_server
+
+import benchutil
+from rpc import jsonrpc, servers
+
+CLIENTS = 16
+
+_servers = []
+
+
+class Handler(object):
+    def slow(self):
+        time.sleep(0.01)
+        return "pong!"
+
+
+class _QuietHandler(simple_server.WSGIRequestHandler):
+    def log_message(self, *args):
+        return
+
+
+def serve(backend):
+    """
+    Serve a JSON RPC Server with `backend` on a free local port in a
+    background thread.
+
+    Return: the URL of the server
+    """
+    server = jsonrpc.Server('127.0.0.1', 0, Handler, backend=backend)
+    httpd = server.backend.make_server('127.0.0.1', 0, server.app)
+    httpd.RequestHandlerClass = _QuietHandler
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    _servers.append((httpd, thread))
+    return "http://127.0.0.1:{0}".format(httpd.server_address[1])
+
+
+def concurrent_rate(url, seconds=2.0):
+    """
+    Call `url` from CLIENTS threads at once for `seconds`.
+
+    Return: calls per second
+    """
+    counts = []
+    deadline = time.time() + seconds
+    def caller():
+        client = jsonrpc.Client(url, timeout=30, maxconns=CLIENTS)
+        calls = 0
+        while time.time() < deadline:
+            client.slow()
+            calls += 1
+        counts.append(calls)
+    threads = [threading.Thread(target=caller) for i in range(CLIENTS)]
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(counts) / (time.time() - start)
+
+
+def main():
+    benchutil.report("simple backend", concurrent_rate(serve("simple")), "calls/s")
+    threaded = servers.ThreadedBackend(workers=CLIENTS)
+    benchutil.report("threaded backend", concurrent_rate(serve(threaded)), "calls/s")
+    evented = servers.EventLoopBackend(workers=CLIENTS)
+    benchutil.report("eventloop backend", concurrent_rate(serve(evented)), "calls/s")
+    for httpd, thread in _servers:
+        httpd.shutdown()
+        thread.join()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Shared helpers for the rpc benchmarks.
+
+The benchmarks are plain scripts, run them from the repository root:
+
+    $ python bench/bench_pool.py
+"""
+import BaseHTTPServer
+import json
+import os
+import SocketServer
+import sys
+import threading
+import time
+import urlparse
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    A minimal keep-alive JSON RPC endpoint that answers every call with
+    `"pong!"`, echoing the request id.
+    """
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def _reply(self, data):
+        reqid = json.loads(data.get('id', ['null'])[0])
+        body = json.dumps(dict(id=reqid, result="pong!", error=None))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._reply(urlparse.parse_qs(urlparse.urlparse(self.path).query))
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        self._reply(urlparse.parse_qs(self.rfile.read(length)))
+
+    def log_message(self, *args):
+        return
+
+
+class _ThreadedServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def pong_server():
+    """
+    Start a keep-alive pong server on a free local port in a background
+    thread.
+
+    Return: the URL of the server
+    """
+    httpd = _ThreadedServer(('127.0.0.1', 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return "http://127.0.0.1:{0}".format(httpd.server_address[1])
+
+
+def rate(fn, seconds=2.0):
+    """
+    Call `fn` repeatedly for `seconds`.
+
+    Return: calls per second
+    """
+    calls = 0
+    start = time.time()
+    deadline = start + seconds
+    while time.time() < deadline:
+        fn()
+        calls += 1
+    return calls / (time.time() - start)
+
+
+def report(label, value, unit):
+    print("{0:<40} {1:>14,.1f} {2}".format(label, value, unit))
@@ -0,0 +1,248 @@
+"""
+rpc.admission
+
+Admission control - shed load the server can't keep up with quickly,
+rather than letting every call queue until its client times out.
+
+An AdmissionControl can be passed to HTTP servers as `admission`. Calls it
+turns away are answered with a 503 and a Retry-After header.
+
+Calls only reach admission control once one of the server backend's
+workers has taken them, so its `limit` must be at most the number of
+workers to have any effect.
+"""
+import contextlib
+import itertools
+import threading
+import time
+
+from rpc import exceptions
+
+SHEDDABLE = 0
+NORMAL = 1
+CRITICAL = 2
+
+WAITING = "waiting"
+ADMITTED = "admitted"
+SHED = "shed"
+
+class _Shed(exceptions.OverloadedError):
+    """
+    A call admission control turned away, which servers answer with a 503
+    telling the client to retry after `retry_after` seconds. Handlers
+    raising OverloadedError themselves aren't shed, so their errors are
+    answered as any other.
+    """
+
+    def __init__(self, message, retry_after):
+        exceptions.OverloadedError.__init__(self, message)
+        self.retry_after = retry_after
+
+
+class _Waiter(object):
+    """
+    A call waiting in the queue for its turn.
+    """
+    __slots__ = ('priority', 'seq', 'deadline', 'state', 'event')
+
+    def __init__(self, priority, seq, deadline):
+        self.priority = priority
+        self.seq = seq
+        self.deadline = deadline
+        self.state = WAITING
+        self.event = threading.Event()
+
+    def shed(self):
+        self.state = SHED
+        self.event.set()
+
+
+class AdmissionControl(object):
+    """
+    Limit the number of calls running at once to `limit`, with up to
+    `queue` more waiting for up to `queue_timeout` seconds for their turn.
+    Calls beyond those are shed with `rpc.exceptions.OverloadedError`.
+    Calls which wait too long are shed by a timer, or when the next call
+    arrives or finishes, if that's sooner.
+
+    Each method belongs to a priority class, CRITICAL, NORMAL or SHEDDABLE,
+    as named in `priorities` or NORMAL by default. Waiting calls of higher
+    classes go first, and when the queue is full a call may push out a
+    waiting call of a lower class.
+
+    Given a `latency_target` in seconds, the limit adapts between
+    `min_limit` and `max_limit` (AIMD): growing by one for every `limit`
+    calls which finish within the target, and shrinking by `backoff` when
+    they don't.
+
+    The counters `admitted`, `queued` and `shed` record what we've done.
+
+    >>> admission = AdmissionControl(limit=32, queue=64, priorities={'health': CRITICAL})
+    >>> server = jsonrpc.Server("localhost", 7890, Handler, admission=admission)
+    """
+
+    def __init__(self, limit=64, queue=128, queue_timeout=1.0, priorities=None,
+                 latency_target=None, min_limit=1, max_limit=1024, backoff=0.9,
+                 retry_after=1):
+        """
+        Arguments:
+        - `limit`: number of calls
+        - `queue`: number of calls
+        - `queue_timeout`: number of seconds
+        - `priorities`: dict of method: priority class
+        - `latency_target`: number of seconds, or None for a fixed limit
+        - `min_limit`: number of calls
+        - `max_limit`: number of calls
+        - `backoff`: factor to shrink the limit by
+        - `retry_after`: number of seconds clients should wait after being shed
+        """
+        self.limit = float(limit)
+        self.queue = queue
+        self.queue_timeout = queue_timeout
+        self.priorities = priorities or {}
+        self.latency_target = latency_target
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.retry_after = retry_after
+        self.running = 0
+        self.admitted = 0
+        self.queued = 0
+        self.shed = 0
+        self._waiting = []
+        self._seq = itertools.count()
+        self._shrunk = 0
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<AdmissionControl {0}/{1} running, {2} waiting>".format(
+            self.running, int(self.limit), len(self._waiting))
+
+    def stats(self):
+        """
+        Return our counters as a dict
+        """
+        return dict(limit=int(self.limit), running=self.running, waiting=len(self._waiting),
+                    admitted=self.admitted, queued=self.queued, shed=self.shed)
+
+    def _overloaded(self, method):
+        self.shed += 1
+        return _Shed("Too busy to call {0}".format(method), self.retry_after)
+
+    def _acquire(self, method):
+        """
+        Wait for our turn to call `method`.
+
+        Raises: OverloadedError if we're shed
+        """
+        priority = self.priorities.get(method, NORMAL)
+        with self._lock:
+            if self.running < int(self.limit) and not self._waiting:
+                self.running += 1
+                self.admitted += 1
+                return
+            now = time.time()
+            self._expire(now)
+            if len(self._waiting) >= self.queue or not self.running:
+                victim = min(self._waiting, key=lambda w: (w.priority, -w.seq)) \
+                  if self._waiting and self.running else None
+                if victim is None or victim.priority >= priority:
+                    raise self._overloaded(method)
+                self._waiting.remove(victim)
+                victim.shed()
+            waiter = _Waiter(priority, next(self._seq), now + self.queue_timeout)
+            self._waiting.append(waiter)
+            self.queued += 1
+            if self._timer is None:
+                self._schedule(waiter.deadline - now)
+        # Waiting with a timeout polls on Python 2, which would delay our
+        # turn by up to 50ms - instead the queue is swept for calls which
+        # have waited too long by a timer, and whenever a call comes or goes.
+        waiter.event.wait()
+        with self._lock:
+            if waiter.state == ADMITTED:
+                return
+            raise self._overloaded(method)
+
+    def _schedule(self, delay):
+        """
+        Sweep the queue in `delay` seconds, under our lock.
+        """
+        self._timer = threading.Timer(max(delay, 0), self._sweep)
+        self._timer.daemon = True
+        self._timer.start()
+        return
+
+    def _sweep(self):
+        """
+        Shed waiting calls whose `queue_timeout` has passed, even if no
+        call comes or goes, and sweep again when the next one's will.
+        """
+        with self._lock:
+            now = time.time()
+            self._expire(now)
+            self._timer = None
+            if self._waiting:
+                self._schedule(min(waiter.deadline for waiter in self._waiting) - now)
+        return
+
+    def _expire(self, now):
+        """
+        Shed waiting calls whose `queue_timeout` has passed.
+        """
+        expired = [waiter for waiter in self._waiting if waiter.deadline <= now]
+        for waiter in expired:
+            self._waiting.remove(waiter)
+            waiter.shed()
+        return
+
+    def _release(self, elapsed):
+        """
+        Give up our turn after a call which took `elapsed` seconds, letting
+        the best waiting calls have theirs.
+        """
+        with self._lock:
+            self.running -= 1
+            if self.latency_target is not None:
+                self._adapt(elapsed)
+            if self._waiting:
+                self._expire(time.time())
+            while self._waiting and self.running < int(self.limit):
+                waiter = max(self._waiting, key=lambda w: (w.priority, -w.seq))
+                self._waiting.remove(waiter)
+                waiter.state = ADMITTED
+                self.running += 1
+                self.admitted += 1
+                waiter.event.set()
+        return
+
+    def _adapt(self, elapsed):
+        """
+        Grow or shrink our limit after a call which took `elapsed` seconds.
+        We shrink at most once per `elapsed` seconds, so that a burst of
+        slow calls only counts once.
+        """
+        if elapsed <= self.latency_target:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+            return
+        now = time.time()
+        if now - self._shrunk >= elapsed:
+            self.limit = max(self.min_limit, self.limit * self.backoff)
+            self._shrunk = now
+        return
+
+    @contextlib.contextmanager
+    def admit(self, method):
+        """
+        Context manager that waits for our turn to call `method`, and gives
+        it up afterwards.
+
+        Raises: OverloadedError if the call is shed
+        """
+        self._acquire(method)
+        start = time.time()
+        try:
+            yield
+        finally:
+            self._release(time.time() - start)
@@ -0,0 +1,132 @@
+"""
+rpc.breaker
+
+Circuit breakers - fail fast rather than waiting out timeouts on an
+endpoint that is already failing.
+"""
+import collections
+import threading
+import time
+
+from rpc import exceptions
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half-open"
+
+class CircuitBreaker(object):
+    """
+    A circuit breaker for a single endpoint.
+
+    While closed, calls go ahead and we record their outcomes. Calls which
+    raise, or which take longer than `slow_call` seconds, count as failures.
+    Once at least `min_calls` of the last `window` calls have been made and
+    `error_rate` of them have failed, we open.
+
+    While open, calls fail immediately with `rpc.exceptions.CircuitOpenError`.
+    After `reset_timeout` seconds we are half-open, letting up to
+    `probes` calls through at a time. A probe which succeeds closes us
+    again, one which fails opens us again.
+
+    >>> breaker = CircuitBreaker(error_rate=0.5, slow_call=1.0, reset_timeout=10)
+    >>> client = jsonrpc.Client("localhost:7890", breaker=breaker)
+    """
+
+    def __init__(self, error_rate=0.5, window=20, min_calls=10, slow_call=None,
+                 reset_timeout=30, probes=1):
+        """
+        Arguments:
+        - `error_rate`: fraction of calls which must fail for us to open
+        - `window`: number of recent calls we judge the error rate over
+        - `min_calls`: number of calls needed before we'll open
+        - `slow_call`: number of seconds, or None to ignore latency
+        - `reset_timeout`: number of seconds we stay open
+        - `probes`: number of calls let through at once while half-open
+        """
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.slow_call = slow_call
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+        self.opened = 0
+        self._outcomes = collections.deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = None
+        self._probing = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<CircuitBreaker {0}>".format(self.state)
+
+    @property
+    def state(self):
+        """
+        One of "closed", "open" or "half-open"
+        """
+        if self._state == OPEN and time.time() - self._opened_at >= self.reset_timeout:
+            return HALF_OPEN
+        return self._state
+
+    def _open(self):
+        self._state = OPEN
+        self._opened_at = time.time()
+        self._probing = 0
+        self.opened += 1
+
+    def allow(self):
+        """
+        Predicate function to determine whether a call may go ahead.
+        """
+        with self._lock:
+            state = self.state
+            if state == CLOSED:
+                return True
+            if state == OPEN or self._probing >= self.probes:
+                return False
+            self._state = HALF_OPEN
+            self._probing += 1
+            return True
+
+    def record(self, success, latency=0):
+        """
+        Record the outcome of a call.
+
+        Arguments:
+        - `success`: bool
+        - `latency`: number of seconds
+        """
+        failed = not success or (self.slow_call is not None and latency > self.slow_call)
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probing = max(0, self._probing - 1)
+                if failed:
+                    self._open()
+                else:
+                    self._state = CLOSED
+                    self._outcomes.clear()
+                return
+            self._outcomes.append(failed)
+            if len(self._outcomes) < self.min_calls:
+                return
+            if sum(self._outcomes) >= self.error_rate * len(self._outcomes):
+                self._open()
+                self._outcomes.clear()
+        return
+
+    def call(self, fn, method, args, kwargs=None):
+        """
+        Return the result of `fn(method, *args, **kwargs)` if we are
+        closed, recording its outcome.
+
+        Raises: CircuitOpenError if we are open.
+        """
+        if not self.allow():
+            raise exceptions.CircuitOpenError("Circuit open, not calling {0}".format(method))
+        start = time.time()
+        try:
+            result = fn(method, *args, **(kwargs or {}))
+        except Exception:
+            self.record(False)
+            raise
+        self.record(True, time.time() - start)
+        return result
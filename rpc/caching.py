@@ -0,0 +1,250 @@
+"""
+rpc.caching
+
+Caches for the results of remote calls.
+
+A ResponseCache may be passed to clients as `cache`, or to HTTP servers to
+cache the results of their handler's memoized methods. HTTP servers use a
+SingleFlight to share the result of one call between identical concurrent
+calls to their handler's coalesced methods.
+"""
+import collections
+import copy
+import threading
+import time
+
+from rpc import futures
+
+class ResponseCache(object):
+    """
+    A bounded LRU cache of the results of remote calls, keyed by method
+    and arguments.
+
+    Results expire after `ttl` seconds, or never if `ttl` is None. Passing a
+    dict of `ttls` restricts caching to the methods it names, each with
+    its own ttl.
+
+    Calls which raise (or which the client reports as failed) are not cached
+    unless `cache_errors` is set. Callers get a copy of each cached result,
+    so they may change it without changing the cache.
+
+    >>> cache = ResponseCache(maxsize=500, ttls={'lookup': 30, 'countries': 3600})
+    >>> client = jsonrpc.Client("http://localhost:7890", cache=cache)
+    >>> client.lookup(42)
+    >>> cache.hits, cache.misses
+    (0, 1)
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, ttls=None, cache_errors=False):
+        """
+        Arguments:
+        - `maxsize`: int
+        - `ttl`: number of seconds or None
+        - `ttls`: dict of method: ttl
+        - `cache_errors`: bool
+        """
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.ttls = ttls or {}
+        self.cache_errors = cache_errors
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()
+        self._cleared = 0
+        self._generations = collections.defaultdict(int)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<ResponseCache {0}/{1} entries>".format(len(self), self.maxsize)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def cached(self, method):
+        """
+        Predicate function to determine whether we cache calls to `method`
+        """
+        return not self.ttls or method in self.ttls
+
+    def key(self, method, args, kwargs):
+        """
+        The cache key for a call to `method` with `args` and `kwargs`.
+        """
+        if kwargs:
+            return repr((method, args, sorted(kwargs.items())))
+        return repr((method, args))
+
+    def get(self, key):
+        """
+        Look up `key`.
+
+        Return: a tuple of (found, entry) where entry is a tuple of
+        (value, exception)
+        """
+        with self._lock:
+            try:
+                expires, method, entry = self._entries.pop(key)
+            except KeyError:
+                self.misses += 1
+                return False, None
+            if expires is not None and expires < time.time():
+                self.misses += 1
+                return False, None
+            self._entries[key] = expires, method, entry
+            self.hits += 1
+            return True, entry
+
+    def generation(self, method):
+        """
+        How many times results for `method` have been invalidated. Take it
+        before making a call, and pass it to `put` with the result, so that
+        results computed before an invalidation aren't stored after it.
+        """
+        with self._lock:
+            return self._cleared, self._generations[method]
+
+    def put(self, key, method, value=None, exception=None, generation=None):
+        """
+        Store the result of a call to `method` under `key`, evicting the
+        least recently used entry if we're full.
+
+        If `generation` is given, the result is dropped if `method` has been
+        invalidated since it was taken.
+        """
+        ttl = self.ttls.get(method, self.ttl)
+        expires = None if ttl is None else time.time() + ttl
+        with self._lock:
+            if generation is not None and generation != (self._cleared,
+                                                         self._generations[method]):
+                return
+            self._entries.pop(key, None)
+            self._entries[key] = expires, method, (value, exception)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return
+
+    def invalidate(self, method=None):
+        """
+        Drop every cached result, or only those for `method`.
+
+        Arguments:
+        - `method`: string
+        """
+        with self._lock:
+            if method is None:
+                self._cleared += 1
+                self._entries.clear()
+                return
+            self._generations[method] += 1
+            for key, (expires, name, entry) in self._entries.items():
+                if name == method:
+                    del self._entries[key]
+        return
+
+    def call(self, fn, method, args, kwargs=None, failed=None):
+        """
+        Return the result of `fn(method, *args, **kwargs)`, from the cache
+        if we can.
+
+        Arguments:
+        - `fn`: callable
+        - `method`: string
+        - `args`: tuple
+        - `kwargs`: dict
+        - `failed`: predicate taking the result, True if the call failed
+        """
+        kwargs = kwargs or {}
+        if not self.cached(method):
+            return fn(method, *args, **kwargs)
+        key = self.key(method, args, kwargs)
+        found, entry = self.get(key)
+        if found:
+            value, exception = entry
+            if exception is not None:
+                raise exception
+            return copy.deepcopy(value)
+        generation = self.generation(method)
+        try:
+            value = fn(method, *args, **kwargs)
+        except Exception as err:
+            if self.cache_errors:
+                self.put(key, method, exception=err, generation=generation)
+            raise
+        if self.cache_errors or failed is None or not failed(value):
+            self.put(key, method, value=value, generation=generation)
+            return copy.deepcopy(value)
+        return value
+
+
+class SingleFlight(object):
+    """
+    Coalesce identical concurrent calls: while a call for a key is running,
+    calls for the same key wait for its result, or exception, rather than
+    making their own.
+
+    The counters `calls` and `coalesced` record how many calls were made,
+    and how many of them waited for another.
+
+    >>> flights = SingleFlight()
+    >>> flights.call(flights.key('lookup', (42,)), handler.lookup, 42)
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<SingleFlight {0} in flight>".format(len(self))
+
+    def __len__(self):
+        return len(self._flights)
+
+    def key(self, method, args):
+        """
+        The key for a call to `method` with `args`.
+        """
+        return repr((method, tuple(args)))
+
+    def call(self, key, fn, *args):
+        """
+        Return the result of `fn(*args)`, or of the call already running
+        for `key`.
+
+        Arguments:
+        - `key`: string
+        - `fn`: callable
+        """
+        with self._lock:
+            self.calls += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = futures.Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return flight.result()
+        try:
+            try:
+                result = fn(*args)
+            finally:
+                self._land(key)
+        except BaseException as err:
+            # Even KeyboardInterrupt or SystemExit, lest the calls waiting
+            # for us wait forever
+            flight.set_exception(err)
+            raise
+        flight.set_result(result)
+        return result
+
+    def _land(self, key):
+        """
+        Let calls for `key` make a call of their own again
+        """
+        with self._lock:
+            del self._flights[key]
+        return
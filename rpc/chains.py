@@ -4,14 +4,35 @@ rpc.chain
 
 This module provides generic support for multiple instantiation
 """
+import collections
+import itertools
+import random
+import threading
+import time
+
+from rpc import breaker as breaker_state
+from rpc import clients, exceptions, futures
+
+ROUND_ROBIN = "round_robin"
+LEAST_OUTSTANDING = "least_outstanding"
+POWER_OF_TWO = "power_of_two"
+
 class ChainList(list):
     """
     List implementation that provides a chain method that will
     create and append to a delegated class, passing through args.
+
+    `workers` bounds the number of members `map_call` will call at once,
+    by default every member is called at once.
+
+    Members may be ejected for a while, e.g. when they are failing, which
+    leaves them out of `available()`.
     """
 
-    def __init__(self, klass=None):
+    def __init__(self, klass=None, workers=None):
         self._klass = klass
+        self.workers = workers
+        self._ejected = {}
         list.__init__(self)
 
     def chain(self, *args, **kwargs):
@@ -22,6 +43,311 @@ class ChainList(list):
         self.append(self._klass(*args, **kwargs))
         return self
 
+    def eject(self, member, seconds):
+        """
+        Leave `member` out of `available()` for the next `seconds`.
+
+        Arguments:
+        - `member`: one of our members
+        - `seconds`: number of seconds
+        """
+        self._ejected[id(member)] = time.time() + seconds
+        return
+
+    def ejected(self, member):
+        """
+        Predicate function to determine whether `member` is currently
+        ejected, either explicitly or because its circuit breaker is open.
+        """
+        until = self._ejected.get(id(member))
+        if until is not None and until > time.time():
+            return True
+        breaker = getattr(member, 'breaker', None)
+        return breaker is not None and breaker.state == breaker_state.OPEN
+
+    def available(self):
+        """
+        The members fit to take calls - those which are not ejected.
+
+        Should every member be ejected, we return them all rather than none.
+        """
+        members = [member for member in self if not self.ejected(member)]
+        return members or list(self)
+
+    def map_call(self, method, *args, **kwargs):
+        """
+        Call `method` with the same arguments on every member of the chain
+        at the same time, returning once they have all finished.
+
+        >>> calls = chain("localhost:7890").chain("localhost:7891").map_call("ping")
+        >>> [call.result() for call in calls]
+
+        Return: a list of `rpc.futures.Future` in the order of our members,
+        each holding that member's result or exception.
+        """
+        if not self:
+            return []
+        def call(member):
+            return getattr(member, method)(*args, **kwargs)
+        with futures.Executor(workers=min(len(self), self.workers or len(self))) as executor:
+            calls = [executor.submit(call, member) for member in self]
+        for future in calls:
+            future.exception()
+        return calls
+
+    def balancer(self, policy=ROUND_ROBIN):
+        """
+        Return a Balancer spreading calls across the members of this chain.
+
+        >>> client = chain("localhost:7890").chain("localhost:7891").balancer()
+        >>> client.ping()
+
+        Arguments:
+        - `policy`: string
+        """
+        return Balancer(self, policy=policy)
+
+    def hedged(self, delay=0.05, percentile=None):
+        """
+        Return a Hedged client over the replicas in this chain.
+
+        >>> client = chain("replica1:7890").chain("replica2:7890").hedged(delay=0.02)
+        >>> client.lookup(42)
+
+        Arguments:
+        - `delay`: number of seconds
+        - `percentile`: number between 0 and 100
+        """
+        return Hedged(self, delay=delay, percentile=percentile)
+
+
+class Balancer(clients.RpcProxy):
+    """
+    A client which spreads its calls across the clients in a ChainList.
+
+    The `policy` determines which client makes each call:
+
+    - "round_robin": each client in turn
+    - "least_outstanding": the client with the fewest calls in flight
+    - "power_of_two": the better of two clients picked at random, judged by
+      calls in flight weighted by recent latency
+
+    Calls only go to members the ChainList has `available`. A member whose
+    calls fail `consecutive_errors` times in a row is ejected from the
+    ChainList for `ejection_time` seconds.
+
+    >>> client = Balancer(jsonrpc.chain("localhost:7890").chain("localhost:7891"),
+    ...                   policy="power_of_two")
+    >>> client.sayhi("Larry")
+    """
+    flavour = "Balanced"
+    policies = (ROUND_ROBIN, LEAST_OUTSTANDING, POWER_OF_TWO)
+
+    def __init__(self, members, policy=ROUND_ROBIN, alpha=0.3, consecutive_errors=5,
+                 ejection_time=30):
+        """
+        Arguments:
+        - `members`: ChainList of clients
+        - `policy`: string
+        - `alpha`: weight of the latest call in our moving average latency
+        - `consecutive_errors`: int, or None never to eject members
+        - `ejection_time`: number of seconds
+        """
+        if policy not in self.policies:
+            raise ValueError("Unknown balancing policy {0}".format(policy))
+        self.members = members
+        self.policy = policy
+        self.alpha = alpha
+        self.consecutive_errors = consecutive_errors
+        self.ejection_time = ejection_time
+        self._errors = {}
+        self._outstanding = {}
+        self._latency = {}
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<{flavour} Client for {members}>".format(
+            flavour=self.flavour, members=list(self.members))
+
+    def outstanding(self, member):
+        """
+        The number of calls `member` currently has in flight
+        """
+        return self._outstanding.get(id(member), 0)
+
+    def latency(self, member):
+        """
+        The moving average latency of calls to `member` in seconds, or None
+        if it hasn't been called yet.
+        """
+        return self._latency.get(id(member))
+
+    def _score(self, member):
+        """
+        Lower is better. Members we have no latency for score 0 so they
+        get tried.
+        """
+        return (self.outstanding(member) + 1) * (self.latency(member) or 0)
+
+    def _pick(self):
+        """
+        Choose the member to make the next call with our policy.
+        """
+        members = self.members.available()
+        if not members:
+            raise IndexError("No clients to balance across")
+        start = next(self._turn) % len(members)
+        if self.policy == ROUND_ROBIN:
+            return members[start]
+        if self.policy == LEAST_OUTSTANDING:
+            rotated = members[start:] + members[:start]
+            return min(rotated, key=self.outstanding)
+        if len(members) == 1:
+            return members[0]
+        return min(random.sample(members, 2), key=self._score)
+
+    def _apicall(self, *args, **kwargs):
+        """
+        Make the call with the member our policy picks, tracking calls in
+        flight and latency.
+        """
+        method = args[1]
+        with self._lock:
+            member = self._pick()
+            key = id(member)
+            self._outstanding[key] = self._outstanding.get(key, 0) + 1
+        start = time.time()
+        failed = True
+        try:
+            result = getattr(member, method)(*args[2:], **kwargs)
+            failed = False
+            return result
+        finally:
+            elapsed = time.time() - start
+            with self._lock:
+                self._outstanding[key] -= 1
+                previous = self._latency.get(key)
+                if previous is None:
+                    self._latency[key] = elapsed
+                else:
+                    self._latency[key] = self.alpha * elapsed + (1 - self.alpha) * previous
+                self._errors[key] = self._errors.get(key, 0) + 1 if failed else 0
+                if self.consecutive_errors and self._errors[key] >= self.consecutive_errors:
+                    self._errors[key] = 0
+                    self.members.eject(member, self.ejection_time)
+
+
+class Hedged(clients.RpcProxy):
+    """
+    A client which hedges its calls across a ChainList of replicas.
+
+    Each call goes to one replica, taking each in turn. If that replica
+    hasn't answered after `delay` seconds, the same call is sent to the
+    next replica, and we take whichever answers first.
+
+    With a `percentile`, we instead hedge once a call has taken longer than
+    that percentile of recently observed latencies, falling back to
+    `delay` until we have seen enough calls.
+
+    Losing calls are cancelled if they have not yet started, otherwise
+    their results are ignored.
+
+    Only replicas the ChainList has `available` are called.
+
+    >>> client = Hedged(jsonrpc.chain("replica1:7890").chain("replica2:7890"),
+    ...                 percentile=95)
+    >>> client.lookup(42)
+    """
+    flavour = "Hedged"
+
+    def __init__(self, members, delay=0.05, percentile=None, window=1000,
+                 min_samples=20, workers=10):
+        """
+        Arguments:
+        - `members`: ChainList of clients
+        - `delay`: number of seconds
+        - `percentile`: number between 0 and 100
+        - `window`: number of latencies to take percentiles over
+        - `min_samples`: number of latencies needed before using percentiles
+        - `workers`: maximum number of calls in flight
+        """
+        self.members = members
+        self.delay = delay
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._latencies = collections.deque(maxlen=window)
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        self._executor = futures.Executor(workers=workers)
+
+    def __repr__(self):
+        return "<{flavour} Client for {members}>".format(
+            flavour=self.flavour, members=list(self.members))
+
+    def __exit__(self, exc, type, stack):
+        self.close()
+        return
+
+    def threshold(self):
+        """
+        The number of seconds to wait for a replica before hedging.
+        """
+        if self.percentile is None:
+            return self.delay
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.delay
+            latencies = sorted(self._latencies)
+        return latencies[int(round((len(latencies) - 1) * self.percentile / 100.0))]
+
+    def _apicall(self, *args, **kwargs):
+        """
+        Make the call with one replica, hedging to a second if it is slow.
+        """
+        method = args[1]
+        members = self.members.available()
+        if not members:
+            raise IndexError("No replicas to call")
+        start = next(self._turn) % len(members)
+        replicas = (members[start:] + members[:start])[:2]
+
+        def call(member):
+            began = time.time()
+            result = getattr(member, method)(*args[2:], **kwargs)
+            with self._lock:
+                self._latencies.append(time.time() - began)
+            return result
+
+        pending = [self._executor.submit(call, replicas[0])]
+        hedge = None
+        if futures.first(pending, self.threshold()) is None and len(replicas) > 1:
+            with self._lock:
+                self.hedges += 1
+            hedge = self._executor.submit(call, replicas[1])
+            pending.append(hedge)
+        while True:
+            done = futures.first(pending)
+            pending.remove(done)
+            if done.exception() is None or not pending:
+                break
+        for loser in pending:
+            loser.cancel()
+        if done is hedge and done.exception() is None:
+            with self._lock:
+                self.hedge_wins += 1
+        return done.result()
+
+    def close(self):
+        """
+        Stop our worker threads once calls in flight have finished.
+        """
+        self._executor.shutdown()
+        return
+
+
 def client_chain(klass, *args, **kwargs):
     """
     The general form of a client chain.
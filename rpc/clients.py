@@ -7,7 +7,24 @@ Base classes for all local client proxies to inherit from.
 class RpcProxy(object):
     """
     A base implementation of the proxy pattern for RPC clients.
+
+    If the proxy has a `cache` (an `rpc.caching.ResponseCache`), calls are
+    answered from it where possible.
+
+    If the proxy has a `retry` policy (an `rpc.retry.RetryPolicy`), calls
+    failing with one of the `transient` errors are retried. Subclasses
+    declare their `transient` errors, and `unsent` errors - those which mean
+    the call was never made.
+
+    If the proxy has a `breaker` (an `rpc.breaker.CircuitBreaker`), each
+    attempt at a call goes through it.
     """
+    cache = None
+    retry = None
+    breaker = None
+    transient = ()
+    unsent = ()
+
     def __init__(self):
         self.url = "None"
         self.flavour = "Base"
@@ -26,10 +43,52 @@ class RpcProxy(object):
         """
         We allow anything not in self.__dict__ to be called as a method.
         abstracting the reqests away.
+
+        Once a public method name has been called, a stub for it is stored
+        on the instance, so later calls to it skip this lookup entirely.
+        Names which are only looked up, such as by `hasattr`, aren't stored.
         """
         if key in self.__dict__:
             return self.__dict__[key]
-        return lambda *a, **kw: self._apicall(self, key, *a, **kw)
+        def first(*a, **kw):
+            if not key.startswith('_'):
+                self.__dict__[key] = lambda *a, **kw: self._call(key, *a, **kw)
+            return self._call(key, *a, **kw)
+        return first
+
+    def _call(self, method, *args, **kwargs):
+        """
+        Dispatch a call to `method`, through our cache if we have one.
+        """
+        if self.cache is None:
+            return self._remote(method, *args, **kwargs)
+        return self.cache.call(self._remote, method, args, kwargs, failed=self._failed)
+
+    def _remote(self, method, *args, **kwargs):
+        """
+        Make a call to `method`, with our retry policy if we have one.
+        """
+        if self.retry is None:
+            return self._attempt(method, *args, **kwargs)
+        return self.retry.call(self._attempt, method, args, kwargs,
+                               transient=self.transient, unsent=self.unsent)
+
+    def _attempt(self, method, *args, **kwargs):
+        """
+        Make one attempt at a call to `method`, through our circuit breaker
+        if we have one.
+        """
+        if self.breaker is None:
+            return self._apicall(self, method, *args, **kwargs)
+        return self.breaker.call(lambda *a, **kw: self._apicall(self, *a, **kw),
+                                 method, args, kwargs)
+
+    def _failed(self, result):
+        """
+        Predicate function to determine whether `result` reports a failed
+        call. Hook for protocols which return errors rather than raising.
+        """
+        return False
 
     def _apicall(self, *args, **kwargs):
         raise NotImplementedError("No proxy dispatch method!")
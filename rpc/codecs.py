@@ -0,0 +1,145 @@
+"""
+rpc.codecs
+
+Serializers for the bodies of our calls.
+
+A codec is anything with `dumps` and `loads` methods. Clients and servers
+accept either a Codec instance or the name of one of the codecs here.
+
+By default we use the fastest JSON encoder installed, trying orjson, ujson
+and simplejson (if built with its C speedups) before the standard library's
+json module. MessagePack is available as the "msgpack" codec.
+"""
+import json
+
+class Codec(object):
+    """
+    Base class for codecs.
+
+    Subclasses should define `dumps` and `loads`.
+    """
+    name = "Base"
+    content_type = None
+
+    def __repr__(self):
+        return "<{0} Codec>".format(self.name)
+
+    def __eq__(self, other):
+        try:
+            return self.name == other.name
+        except AttributeError:
+            return False
+
+    def dumps(self, obj):
+        """
+        Serialize `obj` to a string
+        """
+        raise NotImplementedError()
+
+    def loads(self, data):
+        """
+        Deserialize the string `data`.
+
+        Should raise ValueError if `data` is invalid.
+        """
+        raise NotImplementedError()
+
+
+class JSONCodec(Codec):
+    """
+    JSON using any module with a json compatible `dumps` and `loads`.
+
+    >>> JSONCodec("simplejson", simplejson).dumps([1, 2])
+    '[1, 2]'
+    """
+    content_type = 'application/json'
+
+    def __init__(self, name="stdlib", module=json):
+        """
+        Arguments:
+        - `name`: string
+        - `module`: json compatible module
+        """
+        self.name = name
+        self.dumps = module.dumps
+        self.loads = module.loads
+
+
+class MsgpackCodec(Codec):
+    """
+    MessagePack - a compact binary serialization, which requires the msgpack
+    package.
+
+    Unicode strings are packed as the str type and byte strings as bin, and
+    unpacked to match.
+    """
+    name = "msgpack"
+    content_type = 'application/x-msgpack'
+
+    def __init__(self):
+        import msgpack
+        self._msgpack = msgpack
+
+    def dumps(self, obj):
+        return self._msgpack.packb(obj, use_bin_type=True)
+
+    def loads(self, data):
+        return self._msgpack.unpackb(data, raw=False)
+
+
+def _orjson():
+    import orjson
+    return JSONCodec("orjson", orjson)
+
+def _ujson():
+    import ujson
+    return JSONCodec("ujson", ujson)
+
+def _simplejson():
+    import simplejson
+    from simplejson import _speedups
+    return JSONCodec("simplejson", simplejson)
+
+def _stdlib():
+    return JSONCodec()
+
+_JSON = [("orjson", _orjson), ("ujson", _ujson), ("simplejson", _simplejson),
+         ("stdlib", _stdlib)]
+
+CODECS = dict(_JSON)
+
+_cache = {}
+
+def json_codec():
+    """
+    Return the fastest JSON codec we have installed.
+    """
+    if "json" not in _cache:
+        for name, factory in _JSON:
+            try:
+                _cache["json"] = factory()
+                break
+            except ImportError:
+                continue
+    return _cache["json"]
+
+CODECS["json"] = json_codec
+CODECS["msgpack"] = MsgpackCodec
+
+def get(codec):
+    """
+    Return a Codec instance for `codec`.
+
+    Arguments:
+    - `codec`: a Codec instance, or the name of a codec
+
+    Raises: ValueError for unknown codecs, ImportError if the encoder it
+    names is not installed.
+    """
+    if not isinstance(codec, basestring):
+        return codec
+    if codec not in CODECS:
+        raise ValueError("Unknown codec {0}".format(codec))
+    if codec not in _cache:
+        _cache[codec] = CODECS[codec]()
+    return _cache[codec]
@@ -0,0 +1,153 @@
+"""
+rpc.compression
+
+Compression of HTTP request and response bodies.
+
+Servers compress their responses with whichever of gzip or deflate the
+client prefers, and list the encodings they will accept for requests in
+the Accept-Encoding header of their responses (as in RFC 7694). Clients
+compress their requests once the server has told them it can read them.
+
+Bodies smaller than the `threshold` are never compressed, as the time
+taken outweighs the bytes saved.
+"""
+import zlib
+
+from rpc import exceptions
+
+GZIP = "gzip"
+DEFLATE = "deflate"
+ENCODINGS = (GZIP, DEFLATE)
+
+_WBITS = {GZIP: 16 + zlib.MAX_WBITS, DEFLATE: zlib.MAX_WBITS}
+
+def parse_accept(header):
+    """
+    The encodings an Accept-Encoding `header` accepts, most preferred
+    first.
+
+    Arguments:
+    - `header`: string or None
+    """
+    accepted = []
+    for position, part in enumerate((header or '').split(',')):
+        fields = part.split(';')
+        name = fields[0].strip().lower()
+        quality = 1.0
+        for field in fields[1:]:
+            key, _, value = field.partition('=')
+            if key.strip() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0
+        if name and quality > 0:
+            accepted.append((-quality, position, name))
+    return [name for quality, position, name in sorted(accepted)]
+
+
+class Compression(object):
+    """
+    Settings for compressing bodies: the `threshold` in bytes below which
+    we don't compress, the zlib `level` from 1 (fastest) to 9 (smallest),
+    and the `encodings` we support, most preferred first.
+
+    >>> compression = Compression(threshold=1024, level=6)
+    >>> client = jsonrpc.Client("localhost:7890", wire="json", compression=compression)
+    >>> server = jsonrpc.Server("localhost", 7890, Handler, compression=compression)
+    """
+
+    def __init__(self, threshold=1024, level=6, encodings=ENCODINGS):
+        """
+        Arguments:
+        - `threshold`: number of bytes
+        - `level`: int
+        - `encodings`: sequence of "gzip" and/or "deflate"
+        """
+        for encoding in encodings:
+            if encoding not in _WBITS:
+                raise ValueError("Unsupported encoding {0}".format(encoding))
+        self.threshold = threshold
+        self.level = level
+        self.encodings = tuple(encodings)
+
+    def __repr__(self):
+        return "<Compression {0} over {1} bytes>".format("/".join(self.encodings),
+                                                         self.threshold)
+
+    @property
+    def accept_encoding(self):
+        """
+        The value of an Accept-Encoding header for our encodings
+        """
+        return ", ".join(self.encodings)
+
+    def negotiate(self, header):
+        """
+        The encoding to use for a peer whose Accept-Encoding is `header`, or
+        None if we have none in common.
+
+        Arguments:
+        - `header`: string or None
+        """
+        for encoding in parse_accept(header):
+            if encoding == '*':
+                return self.encodings[0] if self.encodings else None
+            if encoding in self.encodings:
+                return encoding
+        return None
+
+    def compress(self, data, encoding):
+        """
+        Compress the string `data` with `encoding`.
+        """
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, _WBITS[encoding])
+        return compressor.compress(data) + compressor.flush()
+
+    def iter_compress(self, chunks, encoding):
+        """
+        Compress the iterable of strings `chunks` with `encoding`, yielding
+        each chunk's compressed data as soon as we have it so that the
+        receiver can decompress as it goes.
+        """
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, _WBITS[encoding])
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+    def decompress(self, data, encoding, limit=None):
+        """
+        Decompress the string `data`, which was compressed with `encoding`,
+        to no more than `limit` bytes if given - a few KB of gzip can
+        inflate to gigabytes.
+
+        Raises: ValueError for encodings we don't support, or invalid data,
+        TooLargeError if the data decompresses to more than `limit` bytes
+        """
+        if encoding not in self.encodings:
+            raise ValueError("Unsupported encoding {0}".format(encoding))
+        try:
+            if encoding == DEFLATE:
+                try:
+                    return _inflate(data, zlib.MAX_WBITS, limit)
+                except zlib.error:
+                    # Some peers send raw deflate data without the zlib wrapper
+                    return _inflate(data, -zlib.MAX_WBITS, limit)
+            return _inflate(data, _WBITS[encoding], limit)
+        except zlib.error as err:
+            raise ValueError("Invalid {0} data: {1}".format(encoding, err))
+
+
+def _inflate(data, wbits, limit):
+    """
+    Decompress `data` with zlib `wbits`, producing at most `limit` bytes.
+
+    Raises: TooLargeError if there would be more
+    """
+    if limit is None:
+        return zlib.decompress(data, wbits)
+    inflater = zlib.decompressobj(wbits)
+    inflated = inflater.decompress(data, limit + 1)
+    if len(inflated) > limit or inflater.unconsumed_tail:
+        raise exceptions.TooLargeError("Decompresses to over {0} bytes".format(limit))
+    return inflated
@@ -4,11 +4,12 @@ rpc.control
 """
 import ConfigParser
 import os
+import signal
 import sys
 
 import argparse
 
-from rpc import ini, servers
+from rpc import admission, exceptions, ini, profiling, servers
 
 """
 Import Utilities
@@ -48,9 +49,58 @@ def import_module(name, package=None):
     return sys.modules[name]
 
 
+BOOLEANS = {'1': True, 'yes': True, 'true': True, 'on': True,
+            '0': False, 'no': False, 'false': False, 'off': False}
+
+def _boolean(value):
+    """
+    Interpret the config value `value` as a bool, as ConfigParser does.
+    """
+    if value.lower() not in BOOLEANS:
+        raise ValueError("Not a boolean: {0}".format(value))
+    return BOOLEANS[value.lower()]
+
+BACKEND_OPTIONS = dict(workers=int, backlog=int, queue_size=int, pin=_boolean,
+                       graceful_timeout=float, idle_timeout=float)
+
+def _priorities(value):
+    """
+    Interpret the config value `value`, a comma separated list of
+    method:class pairs, as a dict of admission priorities.
+    """
+    classes = dict(critical=admission.CRITICAL, normal=admission.NORMAL,
+                   sheddable=admission.SHEDDABLE)
+    priorities = {}
+    for pair in value.split(','):
+        method, _, name = pair.strip().partition(':')
+        if name.strip().lower() not in classes:
+            raise ValueError("Not a priority class: {0}".format(name))
+        priorities[method.strip()] = classes[name.strip().lower()]
+    return priorities
+
+ADMISSION_OPTIONS = dict(limit=int, queue=int, queue_timeout=float, priorities=_priorities,
+                         latency_target=float, min_limit=int, max_limit=int,
+                         backoff=float, retry_after=int)
+
 class Controller(object):
     """
     Issue commands to a server - Start/stop/restart/status/reload
+
+    HTTP servers may be given a `backend` in the config, with any of the
+    `BACKEND_OPTIONS` for it:
+
+        [rpctl]
+        backend = prefork
+        workers = 8
+        pin = yes
+
+    And admission control, with any of the `ADMISSION_OPTIONS`:
+
+        [admission]
+        limit = 32
+        priorities = health:critical, report:sheddable
+
+    Other servers take neither.
     """
 
     def __init__(self, confpath):
@@ -63,7 +113,7 @@ class Controller(object):
         with open(os.path.abspath(confpath), 'rb') as fh:
             self.conf = ini.IniFile(fh)
         sklass, hklass = self._getklasses()
-        self.server = sklass(self.host, int(self.port), hklass)
+        self.server = sklass(self.host, int(self.port), hklass, **self._server_options(sklass))
         self.daemon = servers.ServerDaemon(self.server, self.pidpath)
         return
 
@@ -89,6 +139,45 @@ class Controller(object):
         hklass = getattr(hmod, hklass)
         return sklass, hklass
 
+    def _server_options(self, sklass):
+        """
+        Based on the current configfile, the keyword arguments to
+        initialise the server class `sklass` with beyond host, port and
+        handler.
+
+        Returns: dict
+
+        Raises: InvalidIniError if the configfile gives HTTP server options
+        for another kind of server
+        """
+        kwargs = {}
+        name = self.conf.get("rpctl", "backend", "")
+        if name:
+            options = self._options("rpctl", BACKEND_OPTIONS)
+            kwargs['backend'] = servers.get_backend(name, **options)
+        options = self._options("admission", ADMISSION_OPTIONS)
+        if options:
+            kwargs['admission'] = admission.AdmissionControl(**options)
+        if kwargs and not issubclass(sklass, servers.HTTPServer):
+            raise exceptions.InvalidIniError(
+                "{0}.{1} is not an HTTP server, so takes no {2}".format(
+                    sklass.__module__, sklass.__name__, " or ".join(sorted(kwargs))))
+        return kwargs
+
+    def _options(self, section, converters):
+        """
+        The options in `section` of the configfile named in `converters`,
+        a dict of option: conversion function.
+
+        Returns: dict
+        """
+        options = {}
+        for option, convert in converters.items():
+            value = self.conf.get(section, option, "")
+            if value:
+                options[option] = convert(value)
+        return options
+
     @staticmethod
     def fromargs(target):
         """
@@ -169,6 +258,31 @@ class Controller(object):
         else:
             print("Server not running")
 
+    def profile(self, seconds=None, requests=None):
+        """
+        Ask the server represented by this controller to profile the next
+        `seconds`, or the next `requests`, writing the stats next to its
+        pidfile.
+        """
+        if not self.daemon.running():
+            print("Server not running")
+            return
+        profiling.write_spec(self.pidpath, seconds=seconds, requests=requests)
+        os.kill(self.daemon.pid, signal.SIGUSR1)
+        print("Profiling Server at {0}:{1}, writing stats to {2}".format(
+            self.host, self.port, os.path.dirname(self.pidpath)))
+
+def profile(args):
+    """
+    Profile a running server for the time or number of requests asked.
+
+    Arguments:
+    - `args`: argparse Namespace
+    """
+    control = Controller(args.config)
+    control.profile(seconds=args.seconds, requests=args.requests)
+    return
+
 def genconfig(args):
     """
     Generate a boilerplate control server config file
@@ -218,6 +332,14 @@ def ui():
     pstatus.add_argument("config", type=str, help="rpctl config file")
     pstatus.set_defaults(func=Controller.fromargs('status'))
 
+    pprofile = subparsers.add_parser("profile", help="Profile a running RPC server")
+    pprofile.add_argument("config", type=str, help="rpctl config file")
+    pprofile.add_argument("--seconds", type=float, default=30,
+                          help="Number of seconds to profile for")
+    pprofile.add_argument("--requests", type=int, default=None,
+                          help="Number of requests to profile, if fewer arrive in time")
+    pprofile.set_defaults(func=profile)
+
     pgenerate = subparsers.add_parser("generate", help="Generate a boilerplate RPC configfile")
     pgenerate.add_argument("target", type=str, help="Location to put the file once generated")
     pgenerate.set_defaults(func=genconfig)
@@ -0,0 +1,563 @@
+"""
+rpc.eventloop
+
+A WSGI server with a single event loop thread for all its connections.
+
+Idle keep-alive connections cost us a socket and a small buffer, not a
+thread. Requests are read and responses written by the loop, while the
+WSGI application itself is called on a pool of worker threads so that
+slow handlers don't hold up the loop.
+
+We use epoll where the platform has it, otherwise poll.
+"""
+import collections
+import errno
+import fcntl
+import os
+import select
+import socket
+import sys
+import threading
+import time
+import traceback
+import urllib
+import StringIO
+
+from rpc import futures
+
+MAX_HEADERS = 65536
+MAX_BODY = 16 * 1024 * 1024
+HIGH_WATER = 262144
+
+if hasattr(select, 'epoll'):
+    _READ, _WRITE = select.EPOLLIN, select.EPOLLOUT
+    _ERROR = select.EPOLLERR | select.EPOLLHUP
+else:
+    _READ, _WRITE = select.POLLIN, select.POLLOUT
+    _ERROR = select.POLLERR | select.POLLHUP | select.POLLNVAL
+
+_AGAIN = (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR)
+
+
+class _Poller(object):
+    """
+    epoll, or poll, with timeouts in seconds.
+    """
+
+    def __init__(self):
+        if hasattr(select, 'epoll'):
+            self._poller = select.epoll()
+            self._scale = 1
+        else:
+            self._poller = select.poll()
+            self._scale = 1000
+        self.register = self._poller.register
+        self.modify = self._poller.modify
+        self.unregister = self._poller.unregister
+
+    def poll(self, timeout):
+        try:
+            return self._poller.poll(timeout * self._scale)
+        except (IOError, select.error) as err:
+            if err.args[0] == errno.EINTR:
+                return []
+            raise
+
+    def close(self):
+        if hasattr(self._poller, 'close'):
+            self._poller.close()
+
+
+class Closed(Exception):
+    """
+    The connection we were writing to has gone.
+    """
+
+
+class _Connection(object):
+    """
+    The state of one client connection.
+
+    The loop thread owns everything but `pending`, which workers writing
+    responses wait on under `cond`.
+    """
+
+    def __init__(self, sock, address):
+        self.sock = sock
+        self.address = address
+        self.inbuf = ''
+        self.chunks = []
+        self.unjoined = 0
+        self.needed = 0
+        self.outbuf = collections.deque()
+        self.pending = 0
+        self.cond = threading.Condition()
+        self.busy = False
+        self.continued = False
+        self.finished = False
+        self.keep_alive = True
+        self.closed = False
+        self.last_active = time.time()
+
+    def wait_writable(self):
+        """
+        Block a worker while too much of its response is waiting to be sent.
+
+        Raises: Closed if the connection closes meanwhile
+        """
+        with self.cond:
+            while self.pending > HIGH_WATER and not self.closed:
+                self.cond.wait(1)
+            if self.closed:
+                raise Closed()
+
+
+def _parse_head(head):
+    """
+    Parse the request line and headers of a request.
+
+    Return: a tuple of (method, target, version, headers) where headers is
+    a dict of lowercased names.
+
+    Raises: ValueError if `head` is malformed
+    """
+    lines = head.split('\r\n')
+    method, target, version = lines[0].split(' ', 2)
+    if not version.startswith('HTTP/'):
+        raise ValueError("Bad request line")
+    headers = {}
+    for line in lines[1:]:
+        name, sep, value = line.partition(':')
+        if not sep:
+            raise ValueError("Bad header")
+        name = name.strip().lower()
+        if name in headers:
+            headers[name] += ',' + value.strip()
+        else:
+            headers[name] = value.strip()
+    return method, target, version, headers
+
+
+class EventLoopWSGIServer(object):
+    """
+    Serve the WSGI `app` on `address` from one event loop thread, calling
+    the app on `workers` threads.
+
+    Connections are kept alive between requests (HTTP/1.1, or HTTP/1.0 on
+    request) and closed once idle for `idle_timeout` seconds. Requests
+    with bodies over `max_body` bytes are refused before we read them.
+    Responses without a Content-Length are sent with chunked transfer
+    encoding to HTTP/1.1 clients, as they are produced.
+
+    At most `queue_size` requests wait for a worker. Requests beyond those
+    are answered with a 503, rather than queueing without bound.
+
+    >>> httpd = EventLoopWSGIServer(('localhost', 7890), server.app)
+    >>> httpd.serve_forever()
+    """
+
+    def __init__(self, address, app, workers=10, backlog=1024, idle_timeout=75,
+                 max_body=MAX_BODY, queue_size=64):
+        """
+        Arguments:
+        - `address`: tuple of (host, port)
+        - `app`: WSGI application
+        - `workers`: int
+        - `backlog`: int
+        - `idle_timeout`: number of seconds
+        - `max_body`: number of bytes
+        - `queue_size`: int
+        """
+        self.app = app
+        self.workers = workers
+        self.idle_timeout = idle_timeout
+        self.max_body = max_body
+        self.queue_size = queue_size
+        self.outstanding = 0
+        self._lock = threading.Lock()
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            self.socket.bind(address)
+            self.socket.listen(backlog)
+        except socket.error:
+            self.socket.close()
+            raise
+        self.socket.setblocking(0)
+        self.server_address = self.socket.getsockname()
+        self._stopping = False
+        self._connections = {}
+        self._posted = collections.deque()
+        self._wakeup, self._waker = os.pipe()
+        for fd in (self._wakeup, self._waker):
+            fcntl.fcntl(fd, fcntl.F_SETFL, fcntl.fcntl(fd, fcntl.F_GETFL) | os.O_NONBLOCK)
+        self._executor = futures.Executor(workers=workers)
+        self._poller = _Poller()
+        self._poller.register(self.socket.fileno(), _READ)
+        self._poller.register(self._wakeup, _READ)
+
+    def __repr__(self):
+        return "<EventLoopWSGIServer on {0}:{1} with {2} connections>".format(
+            self.server_address[0], self.server_address[1], len(self._connections))
+
+    # Loop thread
+
+    def serve_forever(self, poll_interval=0.5):
+        """
+        Run the event loop until `shutdown` is called.
+        """
+        swept = time.time()
+        while not self._stopping:
+            for fd, event in self._poller.poll(poll_interval):
+                if fd == self._wakeup:
+                    self._drain()
+                elif fd == self.socket.fileno():
+                    self._accept()
+                elif fd in self._connections:
+                    self._ready(self._connections[fd], event)
+            if time.time() - swept >= 1:
+                swept = time.time()
+                self._sweep(swept)
+        self._stopping = False
+        return
+
+    def _accept(self):
+        """
+        Accept every connection waiting.
+        """
+        while True:
+            try:
+                sock, address = self.socket.accept()
+            except socket.error as err:
+                if err.args[0] in _AGAIN + (errno.ECONNABORTED, errno.EMFILE, errno.ENFILE):
+                    return
+                raise
+            sock.setblocking(0)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self._connections[sock.fileno()] = _Connection(sock, address)
+            self._poller.register(sock.fileno(), _READ)
+
+    def _ready(self, conn, event):
+        """
+        Deal with `event` on `conn`.
+        """
+        if event & _READ:
+            self._read(conn)
+        if not conn.closed and event & _WRITE:
+            self._write(conn)
+        if not conn.closed and event & _ERROR and not event & _READ:
+            self._close(conn)
+
+    def _read(self, conn):
+        try:
+            data = conn.sock.recv(65536)
+        except socket.error as err:
+            if err.args[0] in _AGAIN:
+                return
+            return self._close(conn)
+        if not data:
+            return self._close(conn)
+        # Joining each read onto the buffer would copy a large body over
+        # and over, so we only join once there's enough for a request
+        conn.chunks.append(data)
+        conn.unjoined += len(data)
+        conn.last_active = time.time()
+        if len(conn.inbuf) + conn.unjoined >= conn.needed:
+            self._next_request(conn)
+
+    def _next_request(self, conn):
+        """
+        Hand the next complete request in `conn`'s buffer to a worker.
+        """
+        if conn.busy:
+            return
+        if conn.chunks:
+            conn.inbuf += ''.join(conn.chunks)
+            conn.chunks, conn.unjoined = [], 0
+        end = conn.inbuf.find('\r\n\r\n')
+        if end == -1:
+            if len(conn.inbuf) > MAX_HEADERS:
+                self._reject(conn, '431 Request Header Fields Too Large')
+            return
+        try:
+            method, target, version, headers = _parse_head(conn.inbuf[:end])
+        except ValueError:
+            return self._reject(conn, '400 Bad Request')
+        length = headers.get('content-length', '0')
+        if not length.isdigit():
+            return self._reject(conn, '400 Bad Request')
+        length = int(length)
+        if length > self.max_body:
+            return self._reject(conn, '413 Request Entity Too Large')
+        if 'transfer-encoding' in headers:
+            return self._reject(conn, '411 Length Required')
+        if len(conn.inbuf) < end + 4 + length:
+            conn.needed = end + 4 + length
+            if headers.get('expect', '').lower() == '100-continue' and not conn.continued:
+                conn.continued = True
+                try:
+                    conn.sock.send("HTTP/1.1 100 Continue\r\n\r\n")
+                except socket.error:
+                    pass
+            return
+        conn.needed = 0
+        body = conn.inbuf[end + 4:end + 4 + length]
+        conn.inbuf = conn.inbuf[end + 4 + length:]
+        connection = headers.get('connection', '').lower()
+        if version == 'HTTP/1.1':
+            conn.keep_alive = 'close' not in connection
+        else:
+            conn.keep_alive = 'keep-alive' in connection
+        if self.outstanding >= self.workers + self.queue_size:
+            return self._reject(conn, '503 Service Unavailable')
+        conn.busy = True
+        conn.continued = False
+        conn.finished = False
+        self._poller.modify(conn.sock.fileno(), _ERROR)
+        environ = self._environ(conn, method, target, version, headers, body)
+        with self._lock:
+            self.outstanding += 1
+        self._executor.submit(self._handle, conn, environ, version)
+
+    def _reject(self, conn, status):
+        """
+        Answer a request we can't make sense of with `status`, then close.
+        """
+        conn.busy = True
+        conn.keep_alive = False
+        conn.inbuf = ''
+        conn.chunks, conn.unjoined, conn.needed = [], 0, 0
+        self._post(conn, "HTTP/1.1 {0}\r\nContent-Length: 0\r\nConnection: close\r\n\r\n".format(
+            status), last=True)
+
+    def _write(self, conn):
+        while conn.outbuf:
+            data = conn.outbuf[0]
+            try:
+                sent = conn.sock.send(data)
+            except socket.error as err:
+                if err.args[0] in _AGAIN:
+                    break
+                return self._close(conn)
+            with conn.cond:
+                conn.pending -= sent
+                conn.cond.notify_all()
+            if sent < len(data):
+                conn.outbuf[0] = data[sent:]
+                break
+            conn.outbuf.popleft()
+        conn.last_active = time.time()
+        if conn.outbuf:
+            self._poller.modify(conn.sock.fileno(), _WRITE)
+        elif conn.finished:
+            if not conn.keep_alive:
+                return self._close(conn)
+            conn.busy = False
+            self._poller.modify(conn.sock.fileno(), _READ)
+            self._next_request(conn)
+        else:
+            self._poller.modify(conn.sock.fileno(), _ERROR)
+
+    def _drain(self):
+        """
+        Queue the data workers have posted for sending.
+        """
+        try:
+            while os.read(self._wakeup, 4096):
+                pass
+        except OSError as err:
+            if err.errno not in _AGAIN:
+                raise
+        while self._posted:
+            conn, data, last = self._posted.popleft()
+            if conn.closed:
+                continue
+            if data:
+                conn.outbuf.append(data)
+            if last:
+                conn.finished = True
+            self._write(conn)
+
+    def _sweep(self, now):
+        """
+        Close connections idle for longer than our idle timeout.
+        """
+        for conn in self._connections.values():
+            if not conn.busy and now - conn.last_active > self.idle_timeout:
+                self._close(conn)
+
+    def _close(self, conn):
+        if conn.closed:
+            return
+        fd = conn.sock.fileno()
+        self._poller.unregister(fd)
+        del self._connections[fd]
+        conn.sock.close()
+        with conn.cond:
+            conn.closed = True
+            conn.cond.notify_all()
+
+    # Worker threads
+
+    def _environ(self, conn, method, target, version, headers, body):
+        """
+        The WSGI environ for a request.
+        """
+        path, _, query = target.partition('?')
+        environ = {
+            'REQUEST_METHOD': method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': urllib.unquote(path),
+            'QUERY_STRING': query,
+            'CONTENT_TYPE': headers.pop('content-type', ''),
+            'CONTENT_LENGTH': headers.pop('content-length', ''),
+            'SERVER_NAME': self.server_address[0],
+            'SERVER_PORT': str(self.server_address[1]),
+            'SERVER_PROTOCOL': version,
+            'REMOTE_ADDR': conn.address[0],
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': StringIO.StringIO(body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in headers.items():
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+        return environ
+
+    def _post(self, conn, data, last=False):
+        """
+        Hand `data` to the loop to send on `conn`, from any thread.
+        """
+        with conn.cond:
+            conn.pending += len(data)
+        self._posted.append((conn, data, last))
+        try:
+            os.write(self._waker, 'x')
+        except OSError as err:
+            if err.errno not in _AGAIN:
+                raise
+
+    def _handle(self, conn, environ, version):
+        """
+        Respond to a request, counting it as outstanding until we have.
+        """
+        try:
+            self._respond(conn, environ, version)
+        finally:
+            with self._lock:
+                self.outstanding -= 1
+        return
+
+    def _respond(self, conn, environ, version):
+        """
+        Call the app for a request, posting the response to the loop.
+        """
+        started = []
+        sent = []
+        def start_response(status, headers, exc_info=None):
+            if exc_info and sent:
+                raise exc_info[0], exc_info[1], exc_info[2]
+            started[:] = [status, headers]
+            return body.append
+        body = []
+        try:
+            result = self.app(environ, start_response)
+            try:
+                if isinstance(result, (list, tuple)):
+                    body.extend(result)
+                    head, chunked = self._head(conn, version, started, ''.join(body))
+                    sent.append(True)
+                    return self._post(conn, head, last=True)
+                chunked = False
+                for data in result:
+                    body.append(data)
+                    if not data:
+                        continue
+                    data = ''.join(body)
+                    del body[:]
+                    if not sent:
+                        head, chunked = self._head(conn, version, started)
+                        sent.append(True)
+                        self._post(conn, head)
+                    conn.wait_writable()
+                    self._post(conn, "{0:x}\r\n{1}\r\n".format(len(data), data) if chunked else data)
+                if not sent:
+                    head, chunked = self._head(conn, version, started, ''.join(body))
+                    sent.append(True)
+                    return self._post(conn, head, last=True)
+                self._post(conn, '0\r\n\r\n' if chunked else '', last=True)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+        except Closed:
+            return
+        except Exception:
+            traceback.print_exc(file=environ['wsgi.errors'])
+            conn.keep_alive = False
+            if not sent:
+                error = "A server error occurred."
+                self._post(conn, "HTTP/1.1 500 Internal Server Error\r\n"
+                           "Content-Type: text/plain\r\nContent-Length: {0}\r\n"
+                           "Connection: close\r\n\r\n{1}".format(len(error), error), last=True)
+            else:
+                self._post(conn, '', last=True)
+
+    def _head(self, conn, version, started, body=None):
+        """
+        The status line and headers of a response, followed by `body` if we
+        have all of it.
+
+        Responses of unknown length are chunked for HTTP/1.1 clients, and
+        end by closing the connection for others.
+
+        Return: a tuple of (head, chunked)
+        """
+        if not started:
+            raise ValueError("The application did not call start_response")
+        status, headers = started
+        chunked = False
+        names = set(name.lower() for name, value in headers)
+        lines = ["HTTP/1.1 " + status]
+        lines.extend("{0}: {1}".format(name, value) for name, value in headers)
+        if 'content-length' not in names:
+            if body is not None:
+                lines.append("Content-Length: {0}".format(len(body)))
+            elif version == 'HTTP/1.1':
+                lines.append("Transfer-Encoding: chunked")
+                chunked = True
+            else:
+                conn.keep_alive = False
+        if not conn.keep_alive:
+            lines.append("Connection: close")
+        elif version != 'HTTP/1.1':
+            lines.append("Connection: keep-alive")
+        return '\r\n'.join(lines) + '\r\n\r\n' + (body or ''), chunked
+
+    # Control
+
+    def shutdown(self):
+        """
+        Stop the loop, from any thread.
+        """
+        self._stopping = True
+        try:
+            os.write(self._waker, 'x')
+        except OSError:
+            pass
+        return
+
+    def server_close(self):
+        """
+        Close the listening socket, every connection, and our workers.
+        """
+        for conn in self._connections.values():
+            self._close(conn)
+        self.socket.close()
+        self._poller.close()
+        self._executor.shutdown()
+        os.close(self._wakeup)
+        os.close(self._waker)
+        return
@@ -23,3 +23,18 @@ class InvalidIniError(Error):
 
 class IndecipherableResponseError(Error):
     "A remote server returned a response which is indecipherable using the current protocol"
+
+class TimeoutError(Error):
+    "We gave up waiting for a result"
+
+class CancelledError(Error):
+    "The call was cancelled before it was made"
+
+class CircuitOpenError(Error):
+    "The circuit breaker for this endpoint is open, so we failed fast"
+
+class OverloadedError(Error):
+    "The server is too busy to take the call, so we shed it"
+
+class TooLargeError(Error):
+    "The body is larger than we are willing to handle"
@@ -0,0 +1,246 @@
+"""
+rpc.futures
+
+Placeholders for the results of remote calls which have not yet completed.
+"""
+import Queue
+import threading
+
+from rpc import exceptions
+
+class Future(object):
+    """
+    The eventual result of a remote call.
+
+    Whoever makes the call resolves the Future with either `set_result` or
+    `set_exception`, callers wait for that with `result`.
+
+    >>> future.result(timeout=2)
+    {'result': 'pong!', 'error': None}
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._result = None
+        self._exception = None
+        self._running = False
+        self._callbacks = []
+
+    def __repr__(self):
+        state = "finished" if self.done() else "pending"
+        return "<Future {0}>".format(state)
+
+    def done(self):
+        """
+        Predicate function to determine whether the call has completed.
+        """
+        return self._event.is_set()
+
+    def cancelled(self):
+        """
+        Predicate function to determine whether the call was cancelled.
+        """
+        return isinstance(self._exception, exceptions.CancelledError)
+
+    def cancel(self):
+        """
+        Cancel the call if it has not yet started.
+
+        Return: True if the call was cancelled
+        """
+        return self._resolve(exception=exceptions.CancelledError("Call cancelled"),
+                             cancelling=True)
+
+    def start(self):
+        """
+        Mark the call as running, unless it has been cancelled.
+
+        Return: True if the call should go ahead
+        """
+        with self._lock:
+            if self.done():
+                return False
+            self._running = True
+            return True
+
+    def add_done_callback(self, fn):
+        """
+        Call `fn` with this Future once the call completes, or immediately
+        if it already has.
+
+        Arguments:
+        - `fn`: callable
+        """
+        with self._lock:
+            if not self.done():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def result(self, timeout=None):
+        """
+        Return the result of the call, waiting up to `timeout` seconds for it.
+
+        If the call raised, we re-raise that exception here.
+
+        Arguments:
+        - `timeout`: number of seconds or None to wait forever
+        """
+        self.exception(timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """
+        Return the exception raised by the call, or None if it succeeded,
+        waiting up to `timeout` seconds for the call to complete.
+
+        Arguments:
+        - `timeout`: number of seconds or None to wait forever
+        """
+        if not self._event.wait(timeout):
+            raise exceptions.TimeoutError("Call did not complete in {0}s".format(timeout))
+        return self._exception
+
+    def set_result(self, result):
+        """
+        Resolve this Future successfully, unless it is already resolved.
+
+        Arguments:
+        - `result`: the value of the call
+        """
+        self._resolve(result=result)
+        return
+
+    def set_exception(self, exception):
+        """
+        Resolve this Future unsuccessfully, unless it is already resolved.
+
+        Arguments:
+        - `exception`: Exception instance
+        """
+        self._resolve(exception=exception)
+        return
+
+    def _resolve(self, result=None, exception=None, cancelling=False):
+        """
+        Settle on `result` or `exception`, wake anyone waiting on us, and
+        run our callbacks. Only the first resolution counts, and when
+        `cancelling`, only if the call hasn't started.
+
+        Return: True if we were resolved
+        """
+        with self._lock:
+            if self.done() or (cancelling and self._running):
+                return False
+            self._result = result
+            self._exception = exception
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            fn(self)
+        return True
+
+
+def first(fs, timeout=None):
+    """
+    Wait up to `timeout` seconds for the first of `fs` to complete.
+
+    Arguments:
+    - `fs`: list of Futures
+    - `timeout`: number of seconds or None to wait forever
+
+    Return: the first completed Future, or None if none completed in time
+    """
+    event = threading.Event()
+    for future in fs:
+        future.add_done_callback(lambda f: event.set())
+    event.wait(timeout)
+    for future in fs:
+        if future.done():
+            return future
+    return None
+
+
+class Executor(object):
+    """
+    A bounded pool of worker threads to make calls on.
+
+    At most `workers` calls run at once, the rest wait their turn in order of
+    submission. Threads are started as they are needed.
+
+    >>> executor = Executor(workers=4)
+    >>> future = executor.submit(client.sayhi, "Larry")
+    >>> future.result()
+    """
+
+    def __init__(self, workers=10):
+        """
+        Arguments:
+        - `workers`: int
+        """
+        self.workers = workers
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._shutdown = False
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<Executor with {0} workers>".format(self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc, type, stack):
+        self.shutdown()
+        return
+
+    def _work(self):
+        """
+        Worker thread loop - run calls until told to stop.
+        """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            future, fn, args, kwargs = item
+            if not future.start():
+                continue
+            try:
+                future.set_result(fn(*args, **kwargs))
+            except Exception as err:
+                future.set_exception(err)
+
+    def submit(self, fn, *args, **kwargs):
+        """
+        Schedule `fn(*args, **kwargs)` to be called on a worker thread.
+
+        Return: Future
+
+        Raises: RuntimeError once we have been shut down
+        """
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("Cannot submit calls after shutdown")
+            self._queue.put((future, fn, args, kwargs))
+            if len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work)
+                thread.daemon = True
+                thread.start()
+                self._threads.append(thread)
+        return future
+
+    def shutdown(self):
+        """
+        Stop accepting calls, and stop our worker threads once they have
+        finished any calls already submitted.
+        """
+        with self._lock:
+            self._shutdown = True
+            for thread in self._threads:
+                self._queue.put(None)
+            self._threads = []
+        return
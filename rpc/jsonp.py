@@ -3,8 +3,6 @@ rpc.jsonp
 
 A JSONP server for your handlers!
 """
-import json
-
 from rpc import servers
 
 class Server(servers.HTTPServer):
@@ -13,6 +11,9 @@ class Server(servers.HTTPServer):
 
     >>> with Server('localhost', 8080, object) as server:
     ...     server.serve()
+
+    Responses are serialized with `codec`, which defaults to the fastest JSON
+    encoder installed.
     """
     flavour = "JSONP"
 
@@ -23,7 +24,7 @@ class Server(servers.HTTPServer):
         Deal with the 'callback' paramater!
         """
         resp = "{callback}({data})".format(callback=request.GET['callback'],
-                                           data=json.dumps(response))
+                                           data=self.codec.dumps(response))
         return resp
 
 
@@ -4,12 +4,16 @@ In addition to the normal parameters for Clients/Servers, the JSON RPC versions
 contain a `verb` argument that allows you to specify either POST or GET as the
 HTTP verb.
 """
-import json
-import uuid
+import collections
+import itertools
 
 import requests
 
-from rpc import exceptions, clients, servers, chains, urlhelp
+from rpc import admission, exceptions, clients, codecs, servers, chains, futures, pools, urlhelp
+
+# Results of these types are never streamed, and are much cheaper to rule
+# out than by asking collections.Iterator
+_PLAIN = frozenset([type(None), bool, int, long, float, str, unicode, list, tuple, dict])
 
 """
 Client Implementation
@@ -26,22 +30,78 @@ class Client(clients.RpcProxy):
     `verb` can be one of wither POST or GET, passed as a string and will determine
     which HTTP verb the client will use.
 
+    Connections are kept alive and shared between every Client talking to
+    the same host. `maxconns` bounds the number of connections kept open to
+    that host, and `idle_timeout` is the number of seconds an unused pool
+    will wait before dropping its connections.
+
+    `wire` determines how calls are encoded for POST requests. The default,
+    "form", sends each field of the call as a form parameter. "json" sends
+    the whole call as one application/json request body, which avoids
+    escaping and copying large params several times over, and needs a JSON
+    `codec`. GET requests always use query parameters.
+
+    `codec` is the `rpc.codecs.Codec` (or name of one) used to serialize
+    calls, by default the fastest JSON encoder installed.
+
+    Pass an `rpc.caching.ResponseCache` as `cache` to answer repeated calls
+    from the cache. Results with an error are only cached if the cache
+    caches errors.
+
+    Pass an `rpc.retry.RetryPolicy` as `retry` to retry calls which fail to
+    connect or time out.
+
+    Pass an `rpc.breaker.CircuitBreaker` as `breaker` to fail fast once
+    this endpoint is failing.
+
+    Pass an `rpc.compression.Compression` as `compression` to ask for
+    compressed responses, and to compress JSON request bodies once the
+    server has said it accepts them.
+
     >>> with Client("http://localhost:7890") as c:
     ...     print c.sayhi("Larry")
     "Hi Larry"
     """
     flavour = "JSON RPC"
+    transient = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+    unsent = (exceptions.OverloadedError,)
 
-    def __init__(self, url, timeout=3, verb="POST"):
+    def __init__(self, url, timeout=3, verb="POST", maxconns=pools.MAXCONNS,
+                 idle_timeout=pools.IDLE_TIMEOUT, wire="form", codec="json",
+                 cache=None, retry=None, breaker=None, compression=None):
         """
         Arguments:
         - `url`: string
         - `timeout`: number
         - `verb`: HTTP verb to use
+        - `maxconns`: int
+        - `idle_timeout`: number of seconds
+        - `wire`: either "form" or "json"
+        - `codec`: Codec or string
+        - `cache`: ResponseCache
+        - `retry`: RetryPolicy
+        - `breaker`: CircuitBreaker
+        - `compression`: Compression
         """
+        if wire not in ("form", "json"):
+            raise ValueError("Unsupported wire format {wire}".format(wire=wire))
         self.url = urlhelp.protocolise(url)
         self.timeout = timeout
         self.verb = verb
+        self.wire = wire
+        self.codec = codecs.get(codec)
+        if wire == "json" and self.codec.content_type != 'application/json':
+            raise ValueError("The json wire format needs a JSON codec, not {codec}".format(
+                codec=self.codec.name))
+        self.cache = cache
+        self.retry = retry
+        self.breaker = breaker
+        self.compression = compression
+        self._encoding = None
+        self._ids = itertools.count()
+        self._envelopes = {}
+        self._pool = pools.get_pool(self.url, maxconns=maxconns,
+                                    idle_timeout=idle_timeout)
 
     def __eq__(self, other):
         try:
@@ -53,15 +113,48 @@ class Client(clients.RpcProxy):
         """
         Make the call to a GET JSONRPC SERVER
         """
-        return requests.get(self.url, params=payload, headers=headers,
-                            timeout=self.timeout)
+        return self._pool.session.get(self.url, params=payload, headers=headers,
+                                      timeout=self.timeout)
 
     def _post(self, headers, payload):
         """
         Make the call to a POST JSONRPC SERVER
         """
-        return requests.post(self.url, data=payload, headers=headers,
-                            timeout=self.timeout)
+        return self._pool.session.post(self.url, data=payload, headers=headers,
+                                       timeout=self.timeout)
+
+    def _build_call(self, *args, **kwargs):
+        """
+        Build the JSON RPC call object for our call.
+
+        The first argument should be the method, the rest the arguments to the
+        remote service call.
+
+        Request ids are taken from a counter per Client.
+
+        Return: a tuple of (reqid, call)
+        """
+        if kwargs:
+            raise ValueError("Keyword arguments not supported by JSON RPC try passing a dict.")
+        reqid = next(self._ids)
+        method = args[1]
+        params = args[2:]
+        return reqid, dict(params=params, id=reqid, method=method)
+
+    def _envelope(self, method):
+        """
+        The parts of a call to `method` which never change, computed once
+        per method. The start of the body is only valid JSON as our codec
+        is a JSON codec whenever we send JSON bodies.
+
+        Return: a tuple of (serialized method, start of a JSON request body)
+        """
+        try:
+            return self._envelopes[method]
+        except KeyError:
+            dumped = self.codec.dumps(method)
+            envelope = self._envelopes[method] = (dumped, '{"method": ' + dumped + ', "params": ')
+            return envelope
 
     def _build_payload(self, *args, **kwargs):
         """
@@ -74,11 +167,75 @@ class Client(clients.RpcProxy):
         """
         if kwargs:
             raise ValueError("Keyword arguments not supported by JSON RPC try passing a dict.")
-        reqid = uuid.uuid4().hex
-        method = args[1]
-        params = args[2:]
-        payload = dict(params=params, id=reqid, method=method)
-        return reqid, dict([(k, json.dumps(v)) for k, v in payload.items()])
+        reqid = next(self._ids)
+        method, body = self._envelope(args[1])
+        params = self.codec.dumps(args[2:])
+        if self._json_body:
+            return reqid, body + params + ', "id": ' + str(reqid) + '}'
+        return reqid, dict(method=method, params=params, id=str(reqid))
+
+    @property
+    def _json_body(self):
+        """
+        Predicate to determine whether we send calls as a JSON request body
+        """
+        return self.wire == "json" and self.verb == "POST"
+
+    def _failed(self, result):
+        """
+        JSON RPC reports errors in the result
+        """
+        return result.get('error') is not None
+
+    def _headers(self, payload):
+        """
+        The HTTP headers to send `payload` with.
+        """
+        headers = {'X-flavour': 'JSONRPC'}
+        if isinstance(payload, basestring):
+            headers['Content-Type'] = 'application/json'
+        if self.compression is not None:
+            headers['Accept-Encoding'] = self.compression.accept_encoding
+        return headers
+
+    def _compress(self, headers, payload):
+        """
+        Compress `payload` if it's a request body over our threshold and
+        the server has told us which encoding it accepts, setting the
+        Content-Encoding in `headers`.
+
+        Return: the payload to send
+        """
+        if self.compression is None or self._encoding is None:
+            return payload
+        if not isinstance(payload, basestring) or len(payload) < self.compression.threshold:
+            return payload
+        headers['Content-Encoding'] = self._encoding
+        return self.compression.compress(payload, self._encoding)
+
+    def _negotiate(self, resp):
+        """
+        Note which of our encodings the server accepts for requests, from
+        the Accept-Encoding header of `resp`.
+        """
+        if self.compression is not None:
+            self._encoding = self.compression.negotiate(resp.headers.get('Accept-Encoding'))
+        return resp
+
+    def _send(self, payload):
+        """
+        Send `payload` to the server with our HTTP verb.
+
+        Arguments:
+        - `payload`: dict of form parameters or a JSON string
+        """
+        headers = self._headers(payload)
+        payload = self._compress(headers, payload)
+        if self.verb == "GET":
+            return self._negotiate(self._get(headers, payload))
+        elif self.verb == "POST":
+            return self._negotiate(self._post(headers, payload))
+        raise ValueError("Unsupported HTTP Verb {verb}".format(verb=self.verb))
 
     def _apicall(self, *args, **kwargs):
         """
@@ -88,35 +245,252 @@ class Client(clients.RpcProxy):
         - `data`: string
         """
         reqid, payload = self._build_payload(*args, **kwargs)
-        headers = {'X-flavour': 'JSONRPC'}
-        if self.verb == "GET":
-            resp = self._get(headers, payload)
-        elif self.verb == "POST":
-            resp = self._post(headers, payload)
-        else:
-            raise ValueError("Unsupported HTTP Verb {verb}".format(verb=self.verb))
+        resp = self._send(payload)
         return self._parse_resp(reqid, resp)
 
-    def _parse_resp(self, reqid, resp):
+    def _loads(self, resp):
         """
-        Given a response from the server, let's parse it and check for errors.
+        Deserialize the body of `resp`, raising if it's an error or
+        isn't valid JSON
 
         Arguments:
-        - `reqid`: str
         - `resp`: requests.Response
         """
         if resp.status_code == 500:
             raise exceptions.RemoteError(resp.content)
+        if resp.status_code == 503:
+            raise exceptions.OverloadedError(resp.content)
         try:
-            result = json.loads(resp.text)
+            return self.codec.loads(resp.text)
         except ValueError:
             raise exceptions.IndecipherableResponseError("Unable to load JSON from response")
+
+    def _check_id(self, reqid, result):
+        """
+        Check that `result` is the answer to the call `reqid`.
+
+        Arguments:
+        - `reqid`: str
+        - `result`: dict
+        """
         if reqid != result['id']:
             raise exceptions.IdError("API Endpoint returned with id:{ret}, expecting:{exp}".format(
                 ret=result['id'], exp=reqid))
         del result['id']
         return result
 
+    def _parse_resp(self, reqid, resp):
+        """
+        Given a response from the server, let's parse it and check for errors.
+
+        Arguments:
+        - `reqid`: str
+        - `resp`: requests.Response
+        """
+        return self._check_id(reqid, self._loads(resp))
+
+    def stream(self, method, *params):
+        """
+        Call `method`, iterating over the items of its result as they arrive
+        rather than waiting for, and holding, the whole result.
+
+        Methods which return a generator or other iterator are streamed by
+        the server. Results which aren't streamed are iterated over once they
+        have arrived whole. Errors raised by the server part way through a
+        stream are raised here once we reach them.
+
+        Streamed calls don't go through our cache, retry policy or breaker.
+
+        >>> for row in client.stream("export", "customers"):
+        ...     write(row)
+
+        Arguments:
+        - `method`: string
+        - `params`: the arguments to the remote method
+        """
+        if self.verb not in ("GET", "POST"):
+            raise ValueError("Unsupported HTTP Verb {verb}".format(verb=self.verb))
+        reqid, payload = self._build_payload(self, method, *params)
+        headers = self._headers(payload)
+        headers['Accept'] = servers.Stream.content_type
+        payload = self._compress(headers, payload)
+        field = 'params' if self.verb == "GET" else 'data'
+        resp = self._pool.session.request(self.verb, self.url, headers=headers,
+                                          timeout=self.timeout, stream=True,
+                                          **{field: payload})
+        return self._iter_stream(reqid, self._negotiate(resp))
+
+    def _iter_stream(self, reqid, resp):
+        """
+        Yield the items of the call `reqid` from the response `resp`.
+
+        Streams arrive a line per item, each item in an array of its own,
+        ending with a JSON RPC response object.
+
+        Arguments:
+        - `reqid`: int
+        - `resp`: requests.Response
+        """
+        try:
+            if resp.headers.get('Content-Type') != servers.Stream.content_type:
+                result = self._parse_resp(reqid, resp)
+                if result['error'] is not None:
+                    raise exceptions.RemoteError(result['error'])
+                for item in result['result']:
+                    yield item
+                return
+            loads = self.codec.loads
+            for line in resp.iter_lines(chunk_size=servers.HTTPServer.stream_buffer):
+                if not line:
+                    continue
+                try:
+                    item = loads(line)
+                except ValueError:
+                    raise exceptions.IndecipherableResponseError("Unable to load JSON from stream")
+                if isinstance(item, list):
+                    yield item[0]
+                    continue
+                self._check_id(reqid, item)
+                if item.get('error') is not None:
+                    raise exceptions.RemoteError(item['error'])
+                return
+            raise exceptions.IndecipherableResponseError("Stream ended before it was complete")
+        finally:
+            resp.close()
+
+    def batch(self):
+        """
+        Return a Batch which will queue calls made on it and send them
+        to the server in a single request when the with block exits.
+
+        >>> with client.batch() as b:
+        ...     pong = b.ping()
+        ...     hi = b.sayhi("Larry")
+        >>> hi.result()
+        {'result': 'Hi Larry', 'error': None}
+        """
+        return Batch(self)
+
+
+class Batch(clients.RpcProxy):
+    """
+    Queue calls to a JSON RPC server, sending them all as one JSON RPC batch.
+
+    Each call made on a Batch returns a `rpc.futures.Future` which will hold
+    the result of that call once the batch has been sent.
+
+    Batches are sent when leaving the with block without an exception, or
+    on an explicit call to `send()`.
+    """
+    flavour = "JSON RPC Batch"
+
+    def __init__(self, client):
+        """
+        Arguments:
+        - `client`: jsonrpc.Client
+        """
+        self.client = client
+        self.url = client.url
+        self.results = []
+        self._calls = []
+
+    def __exit__(self, exc, type, stack):
+        if exc is None:
+            self.send()
+        return
+
+    def _apicall(self, *args, **kwargs):
+        """
+        Queue a call for our next batch
+
+        Return: Future
+        """
+        reqid, call = self.client._build_call(*args, **kwargs)
+        future = futures.Future()
+        self._calls.append((reqid, call, future))
+        self.results.append(future)
+        return future
+
+    def send(self):
+        """
+        Send our queued calls to the server in one request, resolving the
+        Futures for each call.
+        """
+        if not self._calls:
+            return
+        calls, self._calls = self._calls, []
+        payload = self.client.codec.dumps([call for reqid, call, future in calls])
+        if not self.client._json_body:
+            payload = dict(batch=payload)
+        try:
+            results = self.client._loads(self.client._send(payload))
+            if not isinstance(results, list):
+                raise exceptions.RemoteError(results.get('error'))
+        except Exception as err:
+            for reqid, call, future in calls:
+                future.set_exception(err)
+            return
+        byid = dict([(result.get('id'), result) for result in results])
+        for reqid, call, future in calls:
+            if reqid not in byid:
+                future.set_exception(exceptions.IdError(
+                        "API Endpoint returned no result for id:{0}".format(reqid)))
+                continue
+            future.set_result(self.client._check_id(reqid, byid[reqid]))
+        return
+
+
+class AsyncClient(Client):
+    """
+    A JSON RPC Client whose calls return immediately with a
+    `rpc.futures.Future` rather than blocking until the server responds.
+
+    At most `concurrency` calls are in flight at any one time, each made over
+    the keep-alive connection pool for this host. Should that pool already
+    exist with fewer connections, calls will wait for a free connection.
+
+    >>> with AsyncClient("http://localhost:7890", concurrency=20) as c:
+    ...     calls = [c.sayhi(name) for name in names]
+    ...     print [call.result() for call in calls]
+    """
+    flavour = "Async JSON RPC"
+
+    def __init__(self, url, timeout=3, verb="POST", concurrency=10,
+                 idle_timeout=pools.IDLE_TIMEOUT, wire="form", codec="json"):
+        """
+        Arguments:
+        - `url`: string
+        - `timeout`: number
+        - `verb`: HTTP verb to use
+        - `concurrency`: maximum number of calls in flight
+        - `idle_timeout`: number of seconds
+        - `wire`: either "form" or "json"
+        - `codec`: Codec or string
+        """
+        Client.__init__(self, url, timeout=timeout, verb=verb, maxconns=concurrency,
+                        idle_timeout=idle_timeout, wire=wire, codec=codec)
+        self.concurrency = concurrency
+        self._executor = futures.Executor(workers=concurrency)
+
+    def __exit__(self, exc, type, stack):
+        self.close()
+        return
+
+    def _apicall(self, *args, **kwargs):
+        """
+        Schedule a JSONRPC call to a JSONRPC server
+
+        Return: Future
+        """
+        return self._executor.submit(Client._apicall, self, *args, **kwargs)
+
+    def close(self):
+        """
+        Stop accepting calls once those in flight have finished.
+        """
+        self._executor.shutdown()
+        return
+
 
 def chain(*args, **kwargs ):
     """
@@ -133,6 +507,31 @@ Server Implementation
 ---------------------
 """
 
+class Memo(object):
+    """
+    The response to a call to a memoized method: the `result`, and `data`,
+    the result serialized when it was cached.
+    """
+    __slots__ = ('reqid', 'result', 'data')
+
+    def __init__(self, reqid, result, data):
+        """
+        Arguments:
+        - `reqid`: the id of the call
+        - `result`: the result
+        - `data`: string
+        """
+        self.reqid = reqid
+        self.result = result
+        self.data = data
+
+    def response(self):
+        """
+        The JSON RPC response object
+        """
+        return dict(id=self.reqid, result=self.result, error=None)
+
+
 class Server(servers.HTTPServer):
     """
     A JSONRPC server
@@ -144,6 +543,17 @@ class Server(servers.HTTPServer):
     >>> with Server("localhost", 7890, Handler) as server:
     ...     server.serve()
 
+    Calls are deserialized and responses serialized with `codec`, which
+    defaults to the fastest JSON encoder installed.
+
+    Results of methods decorated with `servers.memoize` are cached along
+    with their serialization, so repeated calls skip both the handler and
+    the codec. See `servers.HTTPServer`.
+
+    Methods may return a generator or other iterator, which is streamed to
+    clients which accept newline delimited JSON while it is being produced.
+    See `Client.stream`. For other clients, and within batches, such results
+    are gathered into a list.
     """
     flavour = "JSON RPC"
 
@@ -155,33 +565,185 @@ class Server(servers.HTTPServer):
         the procedure() method of HTTP Servers should return
         status, headers, content
 
-        The request argument is a Web-Ob'ified WSGI request.
+        Calls arrive either as form parameters, or as a single JSON RPC object
+        in an application/json request body.
+
+        Batches of calls arrive as a JSON array, either as the request body or
+        in the `batch` parameter, and are answered with an array of results.
+
+        The request argument is a `servers.Request`.
         """
         status = '200 OK'
         headers = [('Content-Type', 'application/json')]
-        result, error = None, None
+        if request.method == 'POST' and request.content_type == 'application/json':
+            try:
+                calls = self.codec.loads(request.body)
+            except ValueError:
+                return status, headers, dict(id=None, result=None, error="Invalid JSON")
+            if isinstance(calls, list):
+                return status, headers, self._batch(calls)
+            return status, headers, self._unstream(request, self._call(calls))
         data = getattr(request, request.method)
-        method, params, reqid = [json.loads(v) for v in [data.get('method', 'null'),
+        if 'batch' in data:
+            return status, headers, self._batch(self.codec.loads(data['batch']))
+        loads = self.codec.loads
+        method, params, reqid = [loads(v) for v in [data.get('method', 'null'),
                                                          data.get('params', '[]'),
                                                          data.get('id', 'null')]]
+        return status, headers, self._unstream(request, self._dispatch(method, params, reqid))
+
+    def _unstream(self, request, response):
+        """
+        Gather a Stream `response` into a list unless the client asked for
+        a stream, by accepting newline delimited JSON.
+        """
+        if not isinstance(response, servers.Stream):
+            return response
+        if servers.Stream.content_type in (request.headers.get('Accept') or ''):
+            return response
+        return self._gather(response)
+
+    def _batch(self, calls):
+        """
+        Dispatch each call in a batch, returning the list of results.
+
+        Once any call has run, calls admission control sheds get an error
+        of their own, as the client mustn't resend the batch and repeat
+        the calls which ran. If the first call is shed nothing has run, so
+        the whole batch is.
+
+        Arguments:
+        - `calls`: list of JSON RPC call objects
+
+        Raises: OverloadedError if the first call is shed
+        """
+        if not isinstance(calls, list) or not calls:
+            return dict(id=None, result=None, error="Invalid batch")
+        results = [self._gather(self._call(calls[0]))]
+        for call in calls[1:]:
+            try:
+                results.append(self._gather(self._call(call)))
+            except admission._Shed as err:
+                reqid = call.get('id') if isinstance(call, dict) else None
+                error = 'OverloadedError: {0}'.format(err.message)
+                results.append(dict(id=reqid, result=None, error=error))
+        return results
+
+    def _gather(self, response):
+        """
+        Turn `response` into a JSON RPC response object if it's a Stream or
+        a Memo.
+        """
+        if isinstance(response, Memo):
+            return response.response()
+        if not isinstance(response, servers.Stream):
+            return response
+        try:
+            return dict(id=response.reqid, result=list(response), error=None)
+        except Exception as err:
+            return dict(id=response.reqid, result=None, error=self._error(err))
+
+    def _error(self, err):
+        """
+        Describe the exception `err` for the client
+        """
+        return '{error}: {msg}'.format(error=err.__class__.__name__, msg=err.message)
+
+    def _call(self, call):
+        """
+        Dispatch a single JSON RPC call object.
+
+        Arguments:
+        - `call`: dict
+        """
+        if not isinstance(call, dict):
+            return dict(id=None, result=None, error="Invalid call")
+        return self._dispatch(call.get('method'), call.get('params', []), call.get('id'))
+
+    def _dispatch(self, method, params, reqid):
+        """
+        Call `method` on our handler with `params`.
+
+        Return: the JSON RPC response object, or a Stream of the results of
+        methods which return iterators
+        """
+        result, error = None, None
         if not method:
             error = "No Method specified"
-            return status, headers, dict(id=reqid, result=None, error=error)
-        if not hasattr(self.handler, method):
+            return dict(id=reqid, result=None, error=error)
+        fn = self.table.get(method)
+        if fn is None:
             error = 'Method "{0}"" Not Found... '.format(method)
+        else:
+            error = fn.check(params)
         if error:
-            return status, headers, dict(id=id, result=result, error=error)
+            return dict(id=reqid, result=result, error=error)
+        if fn.memoized:
+            return self._memoized(fn, params, reqid)
+        try:
+            result = self.invoke(fn, params)
+        except admission._Shed:
+            raise
+        except Exception as err:
+            error = self._error(err)
+        else:
+            for name in fn.invalidates:
+                self.invalidate(name)
+        if type(result) not in _PLAIN and isinstance(result, collections.Iterator):
+            return servers.Stream(result, reqid=reqid)
+        return dict(id=reqid, result=result, error=error)
+
+    def _memoized(self, fn, params, reqid):
+        """
+        Call the memoized method `fn` with `params`, or find the result in
+        our cache. Errors and streams aren't cached.
+
+        Return: a Memo, or the response for errors and streams
+        """
+        key = self.cache.key(fn.name, tuple(params), None)
+        found, entry = self.cache.get(key)
+        if found:
+            value, exception = entry
+            return Memo(reqid, *value)
+        generation = self.cache.generation(fn.name)
+        try:
+            result = self.invoke(fn, params)
+            if type(result) not in _PLAIN and isinstance(result, collections.Iterator):
+                return servers.Stream(result, reqid=reqid)
+            value = result, self.codec.dumps(result)
+        except admission._Shed:
+            raise
+        except Exception as err:
+            return dict(id=reqid, result=None, error=self._error(err))
+        self.cache.put(key, fn.name, value=value, generation=generation)
+        return Memo(reqid, *value)
+
+    def stream_lines(self, request, stream):
+        """
+        Each item of `stream` goes on a line of its own in a one item array.
+        The final line is a JSON RPC response object, holding any error
+        raised while producing the items.
+        """
+        dumps = self.codec.dumps
+        error = None
         try:
-            result = getattr(self.handler, method)(*params)
+            for item in stream:
+                yield dumps([item]) + "\n"
         except Exception as err:
-            error = '{error}: {msg}'.format(
-                error=err.__class__.__name__, msg=err.message)
-        return status, headers, dict(id=reqid, result=result, error=error)
+            error = self._error(err)
+        yield dumps(dict(id=stream.reqid, result=None, error=error)) + "\n"
 
     def parse_response(self, request, response):
         """
         Format the response:
 
-        Just json.dump it
+        Just serialize it with our codec. The results of Memos were
+        serialized when they were cached, so JSON codecs need only wrap
+        them in the rest of the response.
         """
-        return json.dumps(response)
+        if isinstance(response, Memo):
+            if self.codec.content_type != 'application/json':
+                return self.codec.dumps(response.response())
+            return '{{"error": null, "id": {0}, "result": {1}}}'.format(
+                self.codec.dumps(response.reqid), response.data)
+        return self.codec.dumps(response)
@@ -0,0 +1,251 @@
+"""
+rpc.metrics
+
+Per-method call counts and latency histograms, in the Prometheus text
+format.
+
+Servers time each request in three phases: decoding the request, calling
+the handler, and encoding the response. Handler time is recorded per
+method. Time calls spend waiting for admission, or for an identical
+coalesced call, is recorded apart from the handler's. Observations are
+cheap - a bisect and two additions into shared memory, without locks. The
+price is that under contention the odd observation may be lost.
+
+The counts live in shared memory allocated when the server starts, so the
+workers of a pre-fork server (or a Thrift process pool) all count into the
+same histograms, whichever of them is asked for the metrics.
+"""
+import bisect
+import BaseHTTPServer
+import multiprocessing
+import threading
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+class Counter(object):
+    """
+    A count which only goes up.
+    """
+    __slots__ = ('_value',)
+
+    def __init__(self):
+        self._value = multiprocessing.RawArray('d', 1)
+
+    def __repr__(self):
+        return "<Counter {0:g}>".format(self.value)
+
+    @property
+    def value(self):
+        return self._value[0]
+
+    def inc(self, amount=1):
+        """
+        Count `amount` more
+        """
+        self._value[0] += amount
+
+
+class Histogram(object):
+    """
+    Counts of observations falling into fixed buckets, each bucket being
+    the observations up to and including its upper bound, and their sum.
+
+    `counts` holds the count for each bucket (not cumulative) followed by
+    the sum, so that hot paths can record an observation inline:
+
+    >>> counts[bisect.bisect_left(histogram.bounds, value)] += 1
+    >>> counts[-1] += value
+
+    >>> histogram = Histogram(bounds=(0.01, 0.1, 1))
+    >>> histogram.observe(0.05)
+    >>> histogram.buckets()
+    [(0.01, 0), (0.1, 1), (1, 1), ('+Inf', 1)]
+    """
+    __slots__ = ('bounds', 'counts', '_sum')
+
+    def __init__(self, bounds=BUCKETS):
+        """
+        Arguments:
+        - `bounds`: ascending sequence of numbers
+        """
+        self.bounds = list(bounds)
+        # A count for each bound and one for +Inf, then the sum
+        self.counts = multiprocessing.RawArray('d', len(self.bounds) + 2)
+        self._sum = len(self.bounds) + 1
+
+    def __repr__(self):
+        return "<Histogram of {0:g} observations>".format(self.count)
+
+    @property
+    def count(self):
+        return sum(self.counts[:self._sum])
+
+    @property
+    def sum(self):
+        return self.counts[self._sum]
+
+    def observe(self, value):
+        """
+        Record the observation `value`
+        """
+        counts = self.counts
+        counts[bisect.bisect_left(self.bounds, value)] += 1
+        counts[-1] += value
+
+    def buckets(self):
+        """
+        The cumulative count of observations up to each bound.
+
+        Return: a list of (bound, count) tuples, ending with '+Inf'
+        """
+        total, buckets = 0, []
+        for bound, count in zip(self.bounds + ['+Inf'], self.counts[:self._sum]):
+            total += count
+            buckets.append((bound, int(total)))
+        return buckets
+
+
+def _labels(**labels):
+    """
+    Format `labels` for the text format, escaping their values.
+    """
+    pairs = []
+    for name, value in sorted(labels.items()):
+        value = str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+        pairs.append('{0}="{1}"'.format(name, value))
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Metrics(object):
+    """
+    The metrics of a server: histograms of the time spent decoding
+    requests (`decode`), encoding responses (`encode`) and waiting for
+    admission or coalesced calls (`queue`), and for each method, a
+    histogram of the time spent in the handler and a count of the calls
+    which raised.
+
+    Metric names begin with `prefix`.
+
+    >>> metrics = Metrics()
+    >>> server = jsonrpc.Server("localhost", 7890, Handler, metrics=metrics)
+    >>> print metrics.exposition()
+    """
+
+    def __init__(self, buckets=BUCKETS, prefix="rpc"):
+        """
+        Arguments:
+        - `buckets`: ascending sequence of numbers of seconds
+        - `prefix`: string
+        """
+        self.buckets = buckets
+        self.prefix = prefix
+        self.decode = Histogram(buckets)
+        self.encode = Histogram(buckets)
+        self.queue = Histogram(buckets)
+        self.handlers = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<Metrics for {0} methods>".format(len(self.handlers))
+
+    def method(self, name):
+        """
+        The handler Histogram and error Counter for the method `name`,
+        made if we don't have them yet.
+
+        As they are shared between processes, make them before forking.
+
+        Return: a tuple of (Histogram, Counter)
+        """
+        with self._lock:
+            if name not in self.handlers:
+                self.handlers[name] = Histogram(self.buckets)
+                self.errors[name] = Counter()
+            return self.handlers[name], self.errors[name]
+
+    def _histogram(self, lines, name, help, histograms):
+        """
+        Add the text format of `histograms`, a list of (labels, Histogram)
+        tuples, to `lines`.
+        """
+        name = "{0}_{1}".format(self.prefix, name)
+        lines.append("# HELP {0} {1}".format(name, help))
+        lines.append("# TYPE {0} histogram".format(name))
+        for labels, histogram in histograms:
+            for bound, count in histogram.buckets():
+                lines.append("{0}_bucket{1} {2}".format(name, _labels(le=bound, **labels), count))
+            lines.append("{0}_sum{1} {2!r}".format(name, _labels(**labels), histogram.sum))
+            lines.append("{0}_count{1} {2}".format(name, _labels(**labels), int(histogram.count)))
+        return
+
+    def exposition(self):
+        """
+        Our metrics in the Prometheus text format
+        """
+        lines = []
+        methods = sorted(self.handlers)
+        self._histogram(lines, "decode_seconds", "Time spent decoding requests.",
+                        [({}, self.decode)])
+        self._histogram(lines, "queue_seconds",
+                        "Time calls waited for admission or for coalesced calls.",
+                        [({}, self.queue)])
+        self._histogram(lines, "handler_seconds", "Time spent in handler methods.",
+                        [(dict(method=name), self.handlers[name]) for name in methods])
+        self._histogram(lines, "encode_seconds", "Time spent encoding responses.",
+                        [({}, self.encode)])
+        name = "{0}_handler_errors_total".format(self.prefix)
+        lines.append("# HELP {0} Calls to handler methods which raised.".format(name))
+        lines.append("# TYPE {0} counter".format(name))
+        for method in methods:
+            count = int(self.errors[method].value)
+            lines.append("{0}{1} {2}".format(name, _labels(method=method), count))
+        return "\n".join(lines) + "\n"
+
+
+def respond(request, metrics, path):
+    """
+    Answer the GET request being handled by the BaseHTTPRequestHandler
+    `request` with `metrics` if it's for `path`, or a 404 if it isn't.
+    """
+    if request.path.split('?', 1)[0] != path:
+        request.send_error(404)
+        return
+    body = metrics.exposition()
+    request.send_response(200)
+    request.send_header("Content-Type", CONTENT_TYPE)
+    request.send_header("Content-Length", str(len(body)))
+    request.end_headers()
+    request.wfile.write(body)
+    return
+
+
+class _MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Answer GET requests for the server's `path` with its `metrics`.
+    """
+
+    def do_GET(self):
+        respond(self, self.server.metrics, self.server.path)
+
+    def log_message(self, *args):
+        return
+
+
+def serve(metrics, host, port, path="/metrics"):
+    """
+    Serve `metrics` over HTTP at `path` on `host`:`port` from a background
+    thread, for servers which don't speak HTTP themselves.
+
+    Return: the BaseHTTPServer.HTTPServer, which the caller should
+    `shutdown`
+    """
+    httpd = BaseHTTPServer.HTTPServer((host, port), _MetricsHandler)
+    httpd.metrics = metrics
+    httpd.path = path
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return httpd
@@ -0,0 +1,230 @@
+"""
+rpc.msgpackrpc
+
+MessagePack-RPC over HTTP.
+
+Calls and responses are MessagePack-RPC messages, sent as compact binary
+application/x-msgpack request and response bodies::
+
+    request:  [0, msgid, method, params]
+    response: [1, msgid, error, result]
+
+Clients and Servers otherwise behave exactly like those in `rpc.jsonrpc`.
+"""
+import itertools
+
+import requests
+
+from rpc import admission, chains, clients, codecs, exceptions, pools, servers, urlhelp
+
+REQUEST = 0
+RESPONSE = 1
+
+"""
+Client Implementation
+---------------------
+"""
+
+class Client(clients.RpcProxy):
+    """
+    This Proxy class implements a MessagePack-RPC API.
+
+    The timeout parameter will specify the ammount of time to wait for a call before
+    raising an error.
+
+    Connections are kept alive and shared between every Client talking to
+    the same host, as for `rpc.jsonrpc.Client`.
+
+    Pass an `rpc.caching.ResponseCache` as `cache` to answer repeated calls
+    from the cache, and an `rpc.retry.RetryPolicy` as `retry` to retry calls
+    which fail to connect or time out.
+
+    Pass an `rpc.breaker.CircuitBreaker` as `breaker` to fail fast once
+    this endpoint is failing.
+
+    >>> with Client("http://localhost:7890") as c:
+    ...     print c.sayhi("Larry")
+    {'result': 'Hi Larry', 'error': None}
+    """
+    flavour = "MessagePack RPC"
+    transient = (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+    unsent = (exceptions.OverloadedError,)
+
+    def __init__(self, url, timeout=3, maxconns=pools.MAXCONNS,
+                 idle_timeout=pools.IDLE_TIMEOUT, cache=None, retry=None,
+                 breaker=None):
+        """
+        Arguments:
+        - `url`: string
+        - `timeout`: number
+        - `maxconns`: int
+        - `idle_timeout`: number of seconds
+        - `cache`: ResponseCache
+        - `retry`: RetryPolicy
+        - `breaker`: CircuitBreaker
+        """
+        self.url = urlhelp.protocolise(url)
+        self.timeout = timeout
+        self.codec = codecs.get("msgpack")
+        self.cache = cache
+        self.retry = retry
+        self.breaker = breaker
+        self._ids = itertools.count()
+        self._pool = pools.get_pool(self.url, maxconns=maxconns,
+                                    idle_timeout=idle_timeout)
+
+    def __eq__(self, other):
+        try:
+            return self.url == other.url
+        except AttributeError:
+            return False
+
+    def _build_payload(self, *args, **kwargs):
+        """
+        Build the MessagePack-RPC request for our call.
+
+        The first argument should be the method, the rest the arguments to the
+        remote service call.
+
+        Return: a tuple of (msgid, payload)
+        """
+        if kwargs:
+            raise ValueError("Keyword arguments not supported by MessagePack RPC try passing a dict.")
+        msgid = next(self._ids)
+        return msgid, self.codec.dumps([REQUEST, msgid, args[1], list(args[2:])])
+
+    def _failed(self, result):
+        """
+        MessagePack RPC reports errors in the result
+        """
+        return result.get('error') is not None
+
+    def _apicall(self, *args, **kwargs):
+        """
+        Make a MessagePack-RPC call to a MessagePack-RPC server
+        """
+        msgid, payload = self._build_payload(*args, **kwargs)
+        headers = {'X-flavour': 'MSGPACKRPC', 'Content-Type': self.codec.content_type}
+        resp = self._pool.session.post(self.url, data=payload, headers=headers,
+                                       timeout=self.timeout)
+        return self._parse_resp(msgid, resp)
+
+    def _parse_resp(self, msgid, resp):
+        """
+        Given a response from the server, let's parse it and check for errors.
+
+        Arguments:
+        - `msgid`: int
+        - `resp`: requests.Response
+        """
+        if resp.status_code == 500:
+            raise exceptions.RemoteError(resp.content)
+        if resp.status_code == 503:
+            raise exceptions.OverloadedError(resp.content)
+        try:
+            message = self.codec.loads(resp.content)
+        except ValueError:
+            raise exceptions.IndecipherableResponseError("Unable to load MessagePack from response")
+        if not isinstance(message, list) or len(message) != 4 or message[0] != RESPONSE:
+            raise exceptions.IndecipherableResponseError("Response is not a MessagePack-RPC response")
+        kind, retid, error, result = message
+        if msgid != retid:
+            raise exceptions.IdError("API Endpoint returned with id:{ret}, expecting:{exp}".format(
+                ret=retid, exp=msgid))
+        return dict(result=result, error=error)
+
+
+def chain(*args, **kwargs ):
+    """
+    Will return an iterable which can be .chain()'ed as much as you
+    like to create multiple Clients.
+
+    >>> chain("localhost").chain("example.com")
+    ... [<MessagePack RPC Client for localhost>, <MessagePack RPC Client for example.com>]
+    """
+    return chains.client_chain(Client, *args, **kwargs)
+
+"""
+Server Implementation
+---------------------
+"""
+
+class Server(servers.HTTPServer):
+    """
+    A MessagePack-RPC server
+
+    >>> class Handler(object):
+    ...     def sayhi(self, person):
+    ...         return "Hi {0}".format(person)
+    ...
+    >>> with Server("localhost", 7890, Handler) as server:
+    ...     server.serve()
+
+    """
+    flavour = "MessagePack RPC"
+    default_codec = "msgpack"
+
+    def procedure(self, request):
+        """
+        MessagePack-RPC procedure call - parse the request body, call the
+        procedure, and return the appropriate values.
+
+        the procedure() method of HTTP Servers should return
+        status, headers, content
+
+        The request argument is a `servers.Request`.
+        """
+        status = '200 OK'
+        headers = [('Content-Type', self.codec.content_type)]
+        if request.method != 'POST':
+            return status, headers, [RESPONSE, None, "MessagePack RPC calls must be POSTed", None]
+        try:
+            message = self.codec.loads(request.body)
+        except ValueError:
+            return status, headers, [RESPONSE, None, "Invalid MessagePack", None]
+        if not isinstance(message, list) or len(message) != 4 or message[0] != REQUEST:
+            return status, headers, [RESPONSE, None, "Invalid request", None]
+        kind, msgid, method, params = message
+        return status, headers, self._dispatch(method, params, msgid)
+
+    def _dispatch(self, method, params, msgid):
+        """
+        Call `method` on our handler with `params`.
+
+        Return: the MessagePack-RPC response message
+        """
+        if not method:
+            return [RESPONSE, msgid, "No Method specified", None]
+        fn = self.table.get(method)
+        if fn is None:
+            return [RESPONSE, msgid, 'Method "{0}" Not Found... '.format(method), None]
+        error = fn.check(params)
+        if error:
+            return [RESPONSE, msgid, error, None]
+        if fn.memoized:
+            key = self.cache.key(fn.name, tuple(params), None)
+            found, entry = self.cache.get(key)
+            if found:
+                return [RESPONSE, msgid, None, entry[0]]
+            generation = self.cache.generation(fn.name)
+        try:
+            result = self.invoke(fn, params)
+        except admission._Shed:
+            raise
+        except Exception as err:
+            error = '{error}: {msg}'.format(
+                error=err.__class__.__name__, msg=err)
+            return [RESPONSE, msgid, error, None]
+        if fn.memoized:
+            self.cache.put(key, fn.name, value=result, generation=generation)
+        for name in fn.invalidates:
+            self.invalidate(name)
+        return [RESPONSE, msgid, None, result]
+
+    def parse_response(self, request, response):
+        """
+        Format the response:
+
+        Just pack it
+        """
+        return self.codec.dumps(response)
@@ -0,0 +1,131 @@
+"""
+rpc.pools
+
+Keep-alive HTTP connection pools for our HTTP based clients.
+
+Every client pointing at the same scheme://host:port shares a single
+pool, so that connections (and their TCP handshakes) are reused across
+calls and across Client instances.
+"""
+import threading
+import time
+import urlparse
+
+import requests
+from requests import adapters
+
+MAXCONNS = 10
+IDLE_TIMEOUT = 60
+
+_pools = {}
+_lock = threading.Lock()
+
+class ConnectionPool(object):
+    """
+    A bounded pool of keep-alive HTTP connections to a single host.
+
+    At most `maxconns` connections are kept open at any one time, callers
+    beyond that block until a connection is returned to the pool.
+
+    If the pool goes unused for longer than `idle_timeout` seconds, the open
+    connections are dropped and fresh ones made on the next call.
+
+    >>> pool = ConnectionPool(maxconns=4, idle_timeout=30)
+    >>> pool.session.post("http://localhost:7890", data={})
+    """
+
+    def __init__(self, maxconns=MAXCONNS, idle_timeout=IDLE_TIMEOUT):
+        """
+        Arguments:
+        - `maxconns`: int
+        - `idle_timeout`: number of seconds
+        """
+        self.maxconns = maxconns
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        self._session = None
+        self._last_used = 0
+
+    def __repr__(self):
+        return "<ConnectionPool of {0} connections>".format(self.maxconns)
+
+    def _build(self):
+        """
+        Create a requests Session which will keep at most `self.maxconns`
+        connections alive.
+        """
+        session = requests.Session()
+        adapter = adapters.HTTPAdapter(pool_connections=1,
+                                       pool_maxsize=self.maxconns,
+                                       pool_block=True)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @property
+    def session(self):
+        """
+        The pooled requests Session to make calls with.
+
+        Stale sessions are closed and replaced here.
+        """
+        with self._lock:
+            now = time.time()
+            if self._session is not None and now - self._last_used > self.idle_timeout:
+                self._session.close()
+                self._session = None
+            if self._session is None:
+                self._session = self._build()
+            self._last_used = now
+            return self._session
+
+    def close(self):
+        """
+        Close all the connections currently held by this pool.
+        """
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+        return
+
+
+def _hostkey(url):
+    """
+    The key we share pools by - scheme and network location of `url`.
+
+    Arguments:
+    - `url`: string
+    """
+    parsed = urlparse.urlparse(url)
+    return parsed.scheme, parsed.netloc
+
+
+def get_pool(url, maxconns=MAXCONNS, idle_timeout=IDLE_TIMEOUT):
+    """
+    Return the shared ConnectionPool for the host `url` points at, creating
+    it if need be.
+
+    The pool settings are those given by the first caller for a host.
+
+    Arguments:
+    - `url`: string
+    - `maxconns`: int
+    - `idle_timeout`: number of seconds
+    """
+    key = _hostkey(url)
+    with _lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(maxconns=maxconns, idle_timeout=idle_timeout)
+        return _pools[key]
+
+
+def close_all():
+    """
+    Close and forget every pool we know about.
+    """
+    with _lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+    return
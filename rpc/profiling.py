@@ -0,0 +1,175 @@
+"""
+rpc.profiling
+
+Profiling running servers on demand, without restarting them under a
+profiler.
+
+`rpctl profile` writes what to profile to a spec file next to the server's
+pidfile, then sends the server SIGUSR1. The server profiles the requests it
+handles for the next `seconds`, or the next `requests` of them, whichever
+comes first, and writes the stats next to the pidfile for `pstats`:
+
+    $ rpctl profile myproject.conf --seconds 30
+    $ python -m pstats /tmp/rpc/localhost:4567.1234.20121018-143000.pstats
+"""
+import cProfile
+import json
+import os
+import pstats
+import threading
+import time
+
+def spec_path(pidfile):
+    """
+    The path of the profiling spec file for the server with `pidfile`
+    """
+    return pidfile + ".profile"
+
+
+def write_spec(pidfile, seconds=None, requests=None):
+    """
+    Ask the server with `pidfile` to profile the next `seconds` or the
+    next `requests`, once it is signalled.
+    """
+    with open(spec_path(pidfile), 'w') as fh:
+        json.dump(dict(seconds=seconds, requests=requests), fh)
+    return
+
+
+def read_spec(pidfile):
+    """
+    What the server with `pidfile` has been asked to profile.
+
+    Return: a dict of `seconds` and `requests`
+
+    Raises: IOError or ValueError if there's no valid spec file
+    """
+    with open(spec_path(pidfile)) as fh:
+        spec = json.load(fh)
+    return dict(seconds=spec.get('seconds'), requests=spec.get('requests'))
+
+
+def stats_path(pidfile):
+    """
+    A path next to `pidfile` for this process to write its stats to now
+    """
+    base = os.path.splitext(pidfile)[0]
+    return "{0}.{1}.{2}.pstats".format(base, os.getpid(), time.strftime("%Y%m%d-%H%M%S"))
+
+
+class Profiler(object):
+    """
+    Profile calls made through `call` for the next `seconds`, or the next
+    `requests` calls, whichever comes first, then write the stats to
+    `path`.
+
+    Calls may be made from many threads at once, each thread having a
+    cProfile.Profile of its own. The stats are written once the last call
+    in flight has finished.
+
+    >>> profiler = Profiler("/tmp/server.pstats", seconds=30)
+    >>> profiler.call(app, environ, start_response)
+    """
+
+    def __init__(self, path, seconds=None, requests=None):
+        """
+        Arguments:
+        - `path`: string
+        - `seconds`: number of seconds, or None
+        - `requests`: number of calls, or None
+
+        Raises: ValueError if neither `seconds` nor `requests` is given
+        """
+        if seconds is None and requests is None:
+            raise ValueError("Profile for a number of seconds or requests")
+        self.path = path
+        self.seconds = seconds
+        self.requests = requests
+        self.profiled = 0
+        self.running = 0
+        self.done = False
+        self.written = False
+        self._deadline = None if seconds is None else time.time() + seconds
+        self._profiles = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._timer = None
+        if seconds is not None:
+            self._timer = threading.Timer(seconds, self.stop)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def __repr__(self):
+        return "<Profiler of {0} calls writing to {1}>".format(self.profiled, self.path)
+
+    def _profile(self):
+        """
+        This thread's cProfile.Profile
+        """
+        profile = getattr(self._local, 'profile', None)
+        if profile is None:
+            profile = self._local.profile = cProfile.Profile()
+            with self._lock:
+                self._profiles.append(profile)
+        return profile
+
+    def call(self, fn, *args):
+        """
+        Call `fn` with `args`, profiling it if we're not yet done.
+        """
+        with self._lock:
+            profiling = not self.done
+            if profiling:
+                self.running += 1
+        if not profiling:
+            return fn(*args)
+        try:
+            return self._profile().runcall(fn, *args)
+        finally:
+            with self._lock:
+                self.running -= 1
+                self.profiled += 1
+                if self.requests is not None and self.profiled >= self.requests:
+                    self.done = True
+                elif self._deadline is not None and time.time() >= self._deadline:
+                    self.done = True
+                write = self._finished()
+            if write:
+                self.write()
+
+    def _finished(self):
+        """
+        Whether the stats are ours to write now, under our lock.
+        """
+        if self.done and not self.running and not self.written:
+            self.written = True
+            return True
+        return False
+
+    def stop(self):
+        """
+        Stop profiling, writing the stats once calls in flight finish.
+        """
+        with self._lock:
+            self.done = True
+            write = self._finished()
+        if write:
+            self.write()
+        return
+
+    def write(self):
+        """
+        Merge each thread's profile and write the stats to our `path`, if
+        we profiled anything.
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+        profiles = [profile for profile in self._profiles if profile.getstats()]
+        if not profiles:
+            # pstats can neither make nor read stats of nothing
+            return
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            stats.add(profile)
+        stats.dump_stats(self.path)
+        return
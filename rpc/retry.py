@@ -0,0 +1,175 @@
+"""
+rpc.retry
+
+Retrying failed calls without turning an outage into a retry storm.
+
+A RetryPolicy can be passed to any of our clients as `retry`. Share one
+policy between clients to give them a common retry budget.
+"""
+import random
+import threading
+import time
+
+class RetryBudget(object):
+    """
+    Limit retries to a `ratio` of calls.
+
+    Every call deposits `ratio` of a token, every retry withdraws a whole
+    one. We start with, and never hold more than, `reserve` tokens, so short
+    bursts of failures can still be retried.
+
+    >>> budget = RetryBudget(ratio=0.1, reserve=10)
+    """
+
+    def __init__(self, ratio=0.1, reserve=10):
+        """
+        Arguments:
+        - `ratio`: retries allowed per call
+        - `reserve`: number of retries we can save up
+        """
+        self.ratio = ratio
+        self.reserve = reserve
+        self._tokens = float(reserve)
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<RetryBudget {0:.1f}/{1} retries>".format(self._tokens, self.reserve)
+
+    def deposit(self):
+        """
+        Record a call
+        """
+        with self._lock:
+            self._tokens = min(self.reserve, self._tokens + self.ratio)
+        return
+
+    def withdraw(self):
+        """
+        Spend a retry, if we can afford one.
+
+        Return: True if the retry may go ahead
+        """
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class RetryPolicy(object):
+    """
+    Retry calls which fail with transient errors.
+
+    Clients declare which of their errors are transient. Some of those
+    (e.g. failing to connect) mean the call was never made and are always
+    retried. Others (e.g. timeouts) may mean the call was made, so are only
+    retried for the methods declared `idempotent` - none by default - or for
+    every method if `idempotent` is None.
+
+    Between attempts we sleep for a random time of up to `backoff` seconds,
+    doubling with each attempt up to `max_backoff`. Every retry must be paid
+    for from the `budget`.
+
+    The counters `calls`, `attempts`, `retries`, `giveups` and
+    `budget_exhausted` record what we've done, for every client and thread
+    sharing the policy.
+
+    >>> policy = RetryPolicy(attempts=3, idempotent=['lookup', 'ping'])
+    >>> client = jsonrpc.Client("localhost:7890", retry=policy)
+    """
+
+    def __init__(self, attempts=3, backoff=0.05, max_backoff=2, idempotent=(),
+                 budget=None):
+        """
+        Arguments:
+        - `attempts`: maximum number of attempts per call
+        - `backoff`: number of seconds
+        - `max_backoff`: number of seconds
+        - `idempotent`: collection of method names, or None for all methods
+        - `budget`: RetryBudget
+        """
+        self.max_attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.idempotent = None if idempotent is None else frozenset(idempotent)
+        self.budget = budget or RetryBudget()
+        self.calls = 0
+        self.attempts = 0
+        self.retries = 0
+        self.giveups = 0
+        self.budget_exhausted = 0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return "<RetryPolicy of {0} attempts>".format(self.max_attempts)
+
+    def stats(self):
+        """
+        Return our counters as a dict
+        """
+        with self._lock:
+            return dict(calls=self.calls, attempts=self.attempts, retries=self.retries,
+                        giveups=self.giveups, budget_exhausted=self.budget_exhausted)
+
+    def delay(self, attempt):
+        """
+        The number of seconds to wait before retrying after `attempt`
+        """
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+
+    def retryable(self, method, err, transient=(), unsent=()):
+        """
+        Predicate function to determine whether a call to `method` that
+        failed with `err` may be retried.
+
+        Arguments:
+        - `method`: string
+        - `err`: Exception instance
+        - `transient`: tuple of exception classes
+        - `unsent`: tuple of exception classes meaning the call was never made
+        """
+        if unsent and isinstance(err, unsent):
+            return True
+        if not transient or not isinstance(err, transient):
+            return False
+        return self.idempotent is None or method in self.idempotent
+
+    def call(self, fn, method, args, kwargs=None, transient=(), unsent=()):
+        """
+        Return the result of `fn(method, *args, **kwargs)`, retrying if
+        it fails with a retryable error.
+
+        Arguments:
+        - `fn`: callable
+        - `method`: string
+        - `args`: tuple
+        - `kwargs`: dict
+        - `transient`: tuple of exception classes
+        - `unsent`: tuple of exception classes meaning the call was never made
+        """
+        kwargs = kwargs or {}
+        with self._lock:
+            self.calls += 1
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            attempt += 1
+            with self._lock:
+                self.attempts += 1
+            try:
+                return fn(method, *args, **kwargs)
+            except Exception as err:
+                if not self.retryable(method, err, transient, unsent):
+                    raise
+                if attempt >= self.max_attempts:
+                    with self._lock:
+                        self.giveups += 1
+                    raise
+                if not self.budget.withdraw():
+                    with self._lock:
+                        self.giveups += 1
+                        self.budget_exhausted += 1
+                    raise
+            with self._lock:
+                self.retries += 1
+            time.sleep(self.delay(attempt))
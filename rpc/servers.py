@@ -4,14 +4,29 @@ rpc.servers
 Base class for server implementations
 
 """
+import bisect
+import collections
+import ctypes
+import ctypes.util
+import errno
 import functools
+import inspect
+import multiprocessing
+import os
+import Queue
+import signal
 import socket
+import threading
+import time
+import traceback
+import urlparse
 from wsgiref import simple_server
 
 import doublefork
 import webob
 
-from rpc import exceptions
+from rpc import admission, caching, codecs, eventloop, exceptions, profiling
+from rpc import metrics as metering
 
 def webobify(fn):
     """
@@ -25,6 +40,789 @@ def webobify(fn):
 
     return munger
 
+class ThreadPoolWSGIServer(simple_server.WSGIServer):
+    """
+    A WSGI server which handles requests on a pool of `workers` threads.
+
+    Accepted connections wait for a worker in a queue of at most
+    `queue_size`. While that is full we stop accepting, leaving new
+    connections in the listen backlog of `backlog` connections.
+    """
+
+    def __init__(self, address, handler=simple_server.WSGIRequestHandler, workers=10,
+                 backlog=128, queue_size=64):
+        """
+        Arguments:
+        - `address`: tuple of (host, port)
+        - `handler`: request handler class
+        - `workers`: int
+        - `backlog`: int
+        - `queue_size`: int
+        """
+        self.request_queue_size = backlog
+        self.workers = workers
+        self._requests = Queue.Queue(maxsize=queue_size)
+        self._threads = []
+        simple_server.WSGIServer.__init__(self, address, handler)
+        for i in range(workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        """
+        Worker thread loop - handle connections until told to stop.
+        """
+        while True:
+            item = self._requests.get()
+            if item is None:
+                return
+            request, client_address = item
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        """
+        Queue the connection for a worker, blocking while the queue is full.
+        """
+        self._requests.put((request, client_address))
+
+    def server_close(self):
+        """
+        Stop listening, and stop our workers once they have handled the
+        connections already queued.
+        """
+        simple_server.WSGIServer.server_close(self)
+        for thread in self._threads:
+            self._requests.put(None)
+        self._threads = []
+
+
+SO_REUSEPORT = getattr(socket, 'SO_REUSEPORT', 15 if os.uname()[0] == 'Linux' else None)
+
+def _reuseport_socket(address):
+    """
+    Return a TCP socket bound to `address` with SO_REUSEPORT set, so that
+    several processes may each listen on the same port.
+
+    Raises: ValueError if the platform doesn't support SO_REUSEPORT
+    """
+    if SO_REUSEPORT is None:
+        raise ValueError("SO_REUSEPORT is not supported on this platform")
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, SO_REUSEPORT, 1)
+    try:
+        sock.bind(address)
+    except socket.error:
+        sock.close()
+        raise
+    return sock
+
+
+def pin_cpu(cpu):
+    """
+    Restrict the current process to run on `cpu` only.
+
+    Linux only - elsewhere we do nothing.
+
+    Arguments:
+    - `cpu`: int
+
+    Return: True if we pinned the process
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        setaffinity = libc.sched_setaffinity
+    except (OSError, AttributeError):
+        return False
+    bits = ctypes.sizeof(ctypes.c_ulong) * 8
+    mask = (ctypes.c_ulong * (1024 // bits))()
+    mask[cpu // bits] = 1 << (cpu % bits)
+    if setaffinity(0, ctypes.sizeof(mask), ctypes.byref(mask)) != 0:
+        err = ctypes.get_errno()
+        raise OSError(err, os.strerror(err))
+    return True
+
+
+class ReusePortWSGIServer(simple_server.WSGIServer):
+    """
+    A WSGI server which binds with SO_REUSEPORT, so that the kernel
+    balances connections between it and other such servers on the same
+    port.
+
+    While `serving`, requests are handled one at a time. Clearing
+    `serving` stops the server once any request in hand has been answered.
+    """
+    timeout = 0.5
+
+    def __init__(self, address, handler=simple_server.WSGIRequestHandler, backlog=128):
+        """
+        Arguments:
+        - `address`: tuple of (host, port)
+        - `handler`: request handler class
+        - `backlog`: int
+        """
+        self.request_queue_size = backlog
+        self.serving = True
+        simple_server.WSGIServer.__init__(self, address, handler)
+
+    def server_bind(self):
+        if SO_REUSEPORT is None:
+            raise ValueError("SO_REUSEPORT is not supported on this platform")
+        self.socket.setsockopt(socket.SOL_SOCKET, SO_REUSEPORT, 1)
+        simple_server.WSGIServer.server_bind(self)
+
+    def serve_until_stopped(self):
+        """
+        Handle requests until `serving` is cleared.
+        """
+        while self.serving:
+            self.handle_request()
+
+
+class PreforkServer(object):
+    """
+    The master of a pool of `workers` forked processes, each serving `app`
+    with a `ReusePortWSGIServer` bound to `address`.
+
+    The master binds `address` itself (without listening) to claim the port,
+    then supervises the workers, replacing any that exit. On SIGTERM or
+    SIGINT it stops the workers, giving them `graceful_timeout` seconds to
+    finish the requests in hand, and returns. SIGUSR1 is passed on to the
+    workers, which handle it as the master would have.
+
+    If `pin` is set, each worker is pinned to a CPU of its own (modulo the
+    number of CPUs).
+    """
+    respawn_delay = 1
+
+    def __init__(self, address, app, workers=None, pin=False, backlog=128,
+                 graceful_timeout=10):
+        """
+        Arguments:
+        - `address`: tuple of (host, port)
+        - `app`: WSGI application
+        - `workers`: int, by default the number of CPUs
+        - `pin`: bool
+        - `backlog`: int
+        - `graceful_timeout`: number of seconds
+        """
+        self.app = app
+        self.workers = workers or multiprocessing.cpu_count()
+        self.pin = pin
+        self.backlog = backlog
+        self.graceful_timeout = graceful_timeout
+        self.socket = _reuseport_socket(address)
+        self.server_address = self.socket.getsockname()
+        self.running = False
+        self._pids = {}
+        self._usr1 = signal.SIG_DFL
+
+    def __repr__(self):
+        return "<PreforkServer of {0} workers on {1}:{2}>".format(
+            self.workers, *self.server_address)
+
+    def _work(self, index):
+        """
+        Run in a freshly forked worker - serve until SIGTERM.
+        """
+        self.socket.close()
+        if self.pin:
+            pin_cpu(index % multiprocessing.cpu_count())
+        httpd = ReusePortWSGIServer(self.server_address, backlog=self.backlog)
+        httpd.set_app(self.app)
+        def stop(signum, frame):
+            httpd.serving = False
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGUSR1, self._usr1)
+        # A SIGTERM before our handler was in place went to the master's
+        httpd.serving = httpd.serving and self.running
+        httpd.serve_until_stopped()
+        httpd.server_close()
+
+    def _spawn(self, index):
+        """
+        Fork worker number `index`.
+        """
+        pid = os.fork()
+        if pid:
+            self._pids[pid] = index, time.time()
+            return pid
+        status = 1
+        try:
+            self._work(index)
+            status = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            os._exit(status)
+
+    def _stop(self, signum, frame):
+        self.running = False
+
+    def _forward(self, signum, frame):
+        """
+        Pass SIGUSR1 on to our workers, who handle it as we would have.
+        """
+        if not callable(self._usr1):
+            return
+        for pid in self._pids:
+            try:
+                os.kill(pid, signum)
+            except OSError:
+                pass
+        return
+
+    def _reap(self):
+        """
+        Stop our workers, killing any which outlast our graceful timeout.
+        """
+        for pid in self._pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        deadline = time.time() + self.graceful_timeout
+        while self._pids:
+            for pid in self._pids.keys():
+                try:
+                    done, status = os.waitpid(pid, os.WNOHANG)
+                except OSError:
+                    done = pid
+                if done:
+                    del self._pids[pid]
+                elif time.time() > deadline:
+                    os.kill(pid, signal.SIGKILL)
+            time.sleep(0.05)
+        return
+
+    def serve_forever(self):
+        """
+        Start our workers, and keep them running until told to stop.
+        """
+        self.running = True
+        handlers = [(signum, signal.signal(signum, self._stop))
+                    for signum in (signal.SIGTERM, signal.SIGINT)]
+        self._usr1 = signal.signal(signal.SIGUSR1, self._forward) or signal.SIG_DFL
+        handlers.append((signal.SIGUSR1, self._usr1))
+        try:
+            for index in range(self.workers):
+                self._spawn(index)
+            while self.running:
+                try:
+                    pid, status = os.wait()
+                except OSError as err:
+                    if err.errno == errno.EINTR:
+                        continue
+                    raise
+                if pid not in self._pids:
+                    continue
+                index, started = self._pids.pop(pid)
+                if not self.running:
+                    break
+                if time.time() - started < self.respawn_delay:
+                    time.sleep(self.respawn_delay)
+                if self.running:
+                    self._spawn(index)
+        finally:
+            self.running = False
+            self._reap()
+            for signum, handler in handlers:
+                signal.signal(signum, handler)
+        return
+
+    def shutdown(self):
+        """
+        Stop serving, as on SIGTERM.
+        """
+        self.running = False
+        return
+
+    def server_close(self):
+        self.socket.close()
+        return
+
+
+class Backend(object):
+    """
+    Base class for the ways an HTTPServer can serve its WSGI app.
+
+    Subclasses should define `make_server`.
+    """
+    name = "Base"
+
+    def __repr__(self):
+        return "<{0} Backend>".format(self.name)
+
+    def make_server(self, host, port, app):
+        """
+        Return a server for `app` bound to `host` and `port`, with a
+        `serve_forever` method and a `socket`.
+        """
+        raise NotImplementedError()
+
+
+class SimpleBackend(Backend):
+    """
+    The standard library's wsgiref simple_server, which handles one
+    request at a time. Fine for development.
+    """
+    name = "simple"
+
+    def make_server(self, host, port, app):
+        return simple_server.make_server(host, port, app)
+
+
+class ThreadedBackend(Backend):
+    """
+    Handle requests concurrently on a pool of `workers` threads, with a
+    listen `backlog` and at most `queue_size` accepted connections waiting
+    for a worker. See `ThreadPoolWSGIServer`.
+
+    Handlers are then called from several threads at once, and should be
+    thread safe.
+
+    >>> server = jsonrpc.Server("localhost", 7890, Handler,
+    ...                         backend=ThreadedBackend(workers=16))
+    """
+    name = "threaded"
+
+    def __init__(self, workers=10, backlog=128, queue_size=64):
+        """
+        Arguments:
+        - `workers`: int
+        - `backlog`: int
+        - `queue_size`: int
+        """
+        self.workers = workers
+        self.backlog = backlog
+        self.queue_size = queue_size
+
+    def __repr__(self):
+        return "<{0} Backend with {1} workers>".format(self.name, self.workers)
+
+    def make_server(self, host, port, app):
+        server = ThreadPoolWSGIServer((host, port), workers=self.workers,
+                                      backlog=self.backlog, queue_size=self.queue_size)
+        server.set_app(app)
+        return server
+
+
+class PreforkBackend(Backend):
+    """
+    Serve on `workers` forked processes, by default one per CPU, optionally
+    pinned to a CPU each. The kernel balances connections between the
+    workers, which each listen on the port with SO_REUSEPORT and handle one
+    request at a time. See `PreforkServer`.
+
+    As each worker is a process of its own, CPU bound handlers are not held
+    back by the GIL. Handlers are created before forking, and so should not
+    open sockets or files they expect to keep to themselves.
+
+    >>> server = jsonrpc.Server("0.0.0.0", 7890, Handler,
+    ...                         backend=PreforkBackend(pin=True))
+    """
+    name = "prefork"
+
+    def __init__(self, workers=None, pin=False, backlog=128, graceful_timeout=10):
+        """
+        Arguments:
+        - `workers`: int, by default the number of CPUs
+        - `pin`: bool
+        - `backlog`: int
+        - `graceful_timeout`: number of seconds
+        """
+        self.workers = workers or multiprocessing.cpu_count()
+        self.pin = pin
+        self.backlog = backlog
+        self.graceful_timeout = graceful_timeout
+
+    def __repr__(self):
+        return "<{0} Backend with {1} workers>".format(self.name, self.workers)
+
+    def make_server(self, host, port, app):
+        return PreforkServer((host, port), app, workers=self.workers, pin=self.pin,
+                             backlog=self.backlog, graceful_timeout=self.graceful_timeout)
+
+
+class EventLoopBackend(Backend):
+    """
+    Serve every connection from a single event loop thread, calling the
+    WSGI app on a pool of `workers` threads. See
+    `rpc.eventloop.EventLoopWSGIServer`.
+
+    Connections are kept alive, without a thread each, until idle for
+    `idle_timeout` seconds - so many clients may hold connections open and
+    make the odd call. At most `queue_size` requests wait for a worker,
+    the rest being answered with a 503.
+
+    >>> server = jsonrpc.Server("0.0.0.0", 7890, Handler,
+    ...                         backend=EventLoopBackend(workers=16))
+    """
+    name = "eventloop"
+
+    def __init__(self, workers=10, backlog=1024, idle_timeout=75, queue_size=64):
+        """
+        Arguments:
+        - `workers`: int
+        - `backlog`: int
+        - `idle_timeout`: number of seconds
+        - `queue_size`: int
+        """
+        self.workers = workers
+        self.backlog = backlog
+        self.idle_timeout = idle_timeout
+        self.queue_size = queue_size
+
+    def __repr__(self):
+        return "<{0} Backend with {1} workers>".format(self.name, self.workers)
+
+    def make_server(self, host, port, app):
+        # Bodies an HTTPServer's app would refuse needn't be buffered
+        max_body = getattr(getattr(app, '__self__', None), 'max_body', eventloop.MAX_BODY)
+        return eventloop.EventLoopWSGIServer((host, port), app, workers=self.workers,
+                                             backlog=self.backlog,
+                                             idle_timeout=self.idle_timeout,
+                                             max_body=max_body, queue_size=self.queue_size)
+
+
+BACKENDS = dict(simple=SimpleBackend, threaded=ThreadedBackend, prefork=PreforkBackend,
+                eventloop=EventLoopBackend)
+
+def get_backend(backend, **options):
+    """
+    Return a Backend instance for `backend`.
+
+    Arguments:
+    - `backend`: a Backend instance, or the name of a backend
+    - `options`: passed to the named backend's constructor
+
+    Raises: ValueError for unknown backends
+    """
+    if not isinstance(backend, basestring):
+        return backend
+    if backend not in BACKENDS:
+        raise ValueError("Unknown backend {0}".format(backend))
+    return BACKENDS[backend](**options)
+
+
+_time = time.time
+_bisect = bisect.bisect_left
+
+class _RequestLocal(threading.local):
+    """
+    The seconds the request this thread is handling has spent in the
+    handler so far.
+    """
+    handled = 0.0
+
+def expose(fn):
+    """
+    Decorator marking a handler method as callable by clients.
+
+    Once any method of a handler is exposed, only its exposed methods may
+    be called.
+    """
+    fn.exposed = True
+    return fn
+
+def memoize(fn):
+    """
+    Decorator marking a handler method as a pure function of its arguments,
+    whose results the server may cache.
+    """
+    fn.memoized = True
+    return fn
+
+def coalesce(fn):
+    """
+    Decorator for handler methods whose identical concurrent calls should
+    share one call's result. Results which are iterators are gathered into
+    lists, so that each call may have them.
+    """
+    fn.coalesced = True
+    return fn
+
+def invalidates(*methods):
+    """
+    Decorator for handler methods which change the results of `methods`,
+    dropping their cached results once it has been called.
+
+    >>> class Handler(object):
+    ...     @memoize
+    ...     def lookup(self, key):
+    ...         return DB[key]
+    ...
+    ...     @invalidates('lookup')
+    ...     def store(self, key, value):
+    ...         DB[key] = value
+    """
+    def decorator(fn):
+        fn.invalidates = methods
+        return fn
+    return decorator
+
+def _arity(fn):
+    """
+    The least and greatest number of positional arguments `fn` accepts,
+    the greatest being None if there is no limit.
+
+    Callables we can't introspect accept any number.
+    """
+    target, bound = fn, inspect.ismethod(fn)
+    if not (inspect.isfunction(fn) or bound):
+        target, bound = getattr(fn, '__call__', None), True
+    try:
+        args, varargs, keywords, defaults = inspect.getargspec(target)
+    except TypeError:
+        return 0, None
+    if bound and getattr(target, '__self__', None) is not None:
+        args = args[1:]
+    least = len(args) - len(defaults or ())
+    return least, None if varargs else len(args)
+
+
+def _call(method, params):
+    """
+    Call the Method `method` with `params`, gathering any iterator a
+    coalesced method returns into a list.
+    """
+    result = method.fn(*params)
+    if method.coalesced and isinstance(result, collections.Iterator):
+        return list(result)
+    return result
+
+
+class Method(object):
+    """
+    An entry in a server's dispatch table - the callable `fn` that answers
+    calls to `name`, and the number of arguments it takes.
+    """
+
+    def __init__(self, name, fn):
+        """
+        Arguments:
+        - `name`: string
+        - `fn`: callable
+        """
+        self.name = name
+        self.fn = fn
+        self.least, self.most = _arity(fn)
+        self.accepts = frozenset(range(self.least, (self.most or self.least) + 1))
+        self.memoized = getattr(fn, 'memoized', False) is True
+        self.coalesced = getattr(fn, 'coalesced', False) is True
+        self.invalidates = getattr(fn, 'invalidates', ())
+        if not isinstance(self.invalidates, tuple):
+            self.invalidates = ()
+
+    def __repr__(self):
+        return "<Method {0}>".format(self.name)
+
+    def meter(self, timing, errors):
+        """
+        Record our calls' durations in the Histogram `timing`, and those
+        which raise in the Counter `errors`.
+        """
+        self.timing, self.errors = timing, errors
+        self.bounds, self.counts = timing.bounds, timing.counts
+        return
+
+    def __call__(self, *args):
+        return self.fn(*args)
+
+    def check(self, params):
+        """
+        Describe why we can't be called with `params`, or return None if
+        we can.
+
+        Arguments:
+        - `params`: sequence of arguments
+        """
+        try:
+            given = len(params)
+        except TypeError:
+            return None
+        if given in self.accepts or (self.most is None and given >= self.least):
+            return None
+        if self.least == self.most:
+            qualifier, expected = "exactly", self.least
+        elif given < self.least:
+            qualifier, expected = "at least", self.least
+        else:
+            qualifier, expected = "at most", self.most
+        return "TypeError: {0}() takes {1} {2} argument{3} ({4} given)".format(
+            self.name, qualifier, expected, "" if expected == 1 else "s", given)
+
+
+def dispatch_table(handler, methods=None):
+    """
+    Build the dispatch table for `handler`: a dict of Methods by name.
+
+    We include the handler's callables named in `methods`. Without
+    `methods`, we include those decorated with `expose`, or if there are
+    none every public callable.
+
+    Arguments:
+    - `handler`: object
+    - `methods`: collection of method names
+
+    Raises: ValueError if `methods` names something the handler can't do
+    """
+    if methods is None:
+        public = [name for name in dir(handler) if not name.startswith('_')]
+        callables = [name for name in public if callable(getattr(handler, name, None))]
+        methods = [name for name in callables
+                   if getattr(getattr(handler, name), 'exposed', False) is True] or callables
+    table = {}
+    for name in methods:
+        fn = getattr(handler, name, None)
+        if not callable(fn):
+            raise ValueError("Handler has no method {0}".format(name))
+        table[name] = Method(name, fn)
+    return table
+
+
+class Stream(object):
+    """
+    A response to be sent to the client an item at a time, as the items are
+    produced, rather than serialized whole.
+
+    `items` is any iterable, `reqid` the id of the call it answers for those
+    protocols which have one.
+    """
+    content_type = 'application/x-ndjson'
+
+    def __init__(self, items, reqid=None):
+        """
+        Arguments:
+        - `items`: iterable
+        - `reqid`: the id of the call
+        """
+        self.items = items
+        self.reqid = reqid
+
+    def __iter__(self):
+        return iter(self.items)
+
+
+class _Headers(object):
+    """
+    The request headers in a WSGI environ, looked up by header name.
+    """
+    __slots__ = ('environ',)
+
+    def __init__(self, environ):
+        self.environ = environ
+
+    @staticmethod
+    def _key(name):
+        key = name.upper().replace('-', '_')
+        if key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            return key
+        return 'HTTP_' + key
+
+    def __getitem__(self, name):
+        return self.environ[self._key(name)]
+
+    def __setitem__(self, name, value):
+        self.environ[self._key(name)] = value
+
+    def __delitem__(self, name):
+        del self.environ[self._key(name)]
+
+    def __contains__(self, name):
+        return self._key(name) in self.environ
+
+    def get(self, name, default=None):
+        return self.environ.get(self._key(name), default)
+
+
+class Request(object):
+    """
+    A lightweight request for a WSGI `environ`, with just the parts of the
+    webob.Request interface our servers use.
+
+    Nothing is parsed until it's asked for: the `body` is read from
+    wsgi.input, and the query string (`GET`) and form (`POST`) parsed into
+    plain dicts, on first access.
+    """
+    __slots__ = ('environ', '_body', '_GET', '_POST')
+
+    def __init__(self, environ):
+        """
+        Arguments:
+        - `environ`: dict
+        """
+        self.environ = environ
+        self._body = self._GET = self._POST = None
+
+    @property
+    def method(self):
+        return self.environ.get('REQUEST_METHOD', 'GET')
+
+    @property
+    def headers(self):
+        return _Headers(self.environ)
+
+    @property
+    def content_type(self):
+        """
+        The media type of the body, without parameters such as charset
+        """
+        return self.environ.get('CONTENT_TYPE', '').split(';', 1)[0].strip().lower()
+
+    @property
+    def content_length(self):
+        """
+        The length of the body in bytes, or None if we weren't told.
+
+        Raises: ValueError if we were told nonsense
+        """
+        length = self.environ.get('CONTENT_LENGTH')
+        if not length:
+            return None
+        length = int(length)
+        if length < 0:
+            raise ValueError("Negative Content-Length")
+        return length
+
+    def _get_body(self):
+        if self._body is None:
+            length = self.content_length
+            self._body = self.environ['wsgi.input'].read(length) if length else ''
+        return self._body
+
+    def _set_body(self, body):
+        self._body = body
+        self._POST = None
+        self.environ['CONTENT_LENGTH'] = str(len(body))
+
+    body = property(_get_body, _set_body)
+
+    @property
+    def GET(self):
+        if self._GET is None:
+            self._GET = dict(urlparse.parse_qsl(self.environ.get('QUERY_STRING', ''),
+                                                keep_blank_values=True))
+        return self._GET
+
+    @property
+    def POST(self):
+        if self._POST is None:
+            form = self.method == 'POST' and \
+              self.content_type in ('', 'application/x-www-form-urlencoded')
+            self._POST = dict(urlparse.parse_qsl(self.body, keep_blank_values=True)) \
+              if form else {}
+        return self._POST
+
+
 class Server(object):
     """
     Base class for servers.
@@ -110,6 +908,16 @@ class Server(object):
         """
         raise NotImplementedError()
 
+    def profile(self, path, seconds=None, requests=None):
+        """
+        This hook function is called to profile the requests we handle in
+        the next `seconds`, or the next `requests` of them, writing the
+        stats to `path`.
+
+        Servers which can be profiled should override it.
+        """
+        raise NotImplementedError()
+
     def serve(self):
         """
         This hook function is intended for Subclasses to
@@ -124,16 +932,184 @@ class HTTPServer(Server):
     A WSGI based HTTP Server class.
 
     Subclasses of HTTPServer should define two methods, `procedure` and `parse_response`.
+
+    The `codec` they should use to (de)serialize is available as `self.codec`,
+    users may pass either a `rpc.codecs.Codec` or the name of one.
+
+    Should `procedure` return a `Stream`, its items are serialized one per
+    line by `stream_lines` and sent as they are produced, gathered into
+    writes of around `stream_buffer` bytes.
+
+    Pass an `rpc.compression.Compression` as `compression` to accept
+    compressed requests and compress responses for clients which accept it.
+
+    `backend` determines how `serve` serves requests - a `Backend` or the
+    name of one. By default we use wsgiref's simple_server, one request at a
+    time. "threaded" handles requests on a pool of threads, "prefork" on a
+    pool of processes, and "eventloop" holds connections open on an event
+    loop, handling their requests on a pool of threads.
+
+    Requests are wrapped in a lightweight `Request`, which reads at most
+    `max_body` bytes of body - larger requests are refused. Set
+    `request_class` to `webob.Request` if your `procedure` or
+    `parse_response` needs the rest of WebOb.
+
+    Pass an `rpc.caching.ResponseCache` as `cache` to cache the results of
+    handler methods decorated with `memoize`, or named in the cache's
+    `ttls`. Servers with memoized methods and no `cache` get a default one.
+    Cached results are dropped when methods decorated with `invalidates`
+    are called, or by calling `invalidate`. The JSON RPC and MessagePack
+    RPC servers do so. Subclasses dispatching calls in a `procedure` of
+    their own must check each Method's `memoized` and `invalidates`.
+
+    While a call to a method decorated with `coalesce` is running, identical
+    calls wait for its result rather than calling the handler themselves.
+    This works across the threads of the threaded and eventloop backends,
+    and within each process of the prefork backend.
+
+    Pass an `rpc.admission.AdmissionControl` as `admission` to limit how
+    many calls to the handler run at once, shedding the excess with a 503.
+
+    We count calls to each method and time them, serving these metrics in
+    the Prometheus text format to GET requests for `metrics_path`. Pass an
+    `rpc.metrics.Metrics` as `metrics` to share them between servers.
+
+    While a `profiler` is set by `profile`, requests are run under it.
+
+    Clients may call the public methods of our handler, or only those
+    decorated with `expose` if it has any, or only those named in `methods`.
+    We look these up once, in `scaffold`, as `self.table`. The method
+    "system.listMethods" lists them.
     """
     flavour = "HTTP Server"
+    default_codec = "json"
+    default_backend = "simple"
+    stream_buffer = 16384
+    max_body = 16 * 1024 * 1024
+    metrics_path = '/metrics'
+    profiler = None
+    request_class = Request
+
+    def __init__(self, host=None, port=None, handler=None, codec=None, compression=None,
+                 backend=None, methods=None, cache=None, admission=None, metrics=None):
+        """
+        Arguments:
+        - `host`: string
+        - `port`: int
+        - `handler`: callable
+        - `codec`: Codec or string
+        - `compression`: Compression
+        - `backend`: Backend or string
+        - `methods`: collection of method names
+        - `cache`: ResponseCache
+        - `admission`: AdmissionControl
+        - `metrics`: Metrics
+        """
+        self.codec = codecs.get(codec or self.default_codec)
+        self.compression = compression
+        self.backend = get_backend(backend or self.default_backend)
+        self.methods = methods
+        self.cache = cache
+        self.flights = caching.SingleFlight()
+        self.admission = admission
+        self.metrics = metrics or metering.Metrics()
+        self._local = _RequestLocal()
+        super(HTTPServer, self).__init__(host=host, port=port, handler=handler)
+
+    def scaffold(self):
+        """
+        Build our dispatch table, and our cache if we need one
+        """
+        self.table = dispatch_table(self.handler, self.methods)
+        listing = sorted(list(self.table) + ['system.listMethods'])
+        self.table['system.listMethods'] = Method('system.listMethods', lambda: listing)
+        for name, method in self.table.items():
+            method.meter(*self.metrics.method(name))
+        if self.cache is not None:
+            for name in self.cache.ttls:
+                if name in self.table:
+                    self.table[name].memoized = True
+        elif any(method.memoized for method in self.table.values()):
+            self.cache = caching.ResponseCache()
+        return
+
+    def invoke(self, method, params):
+        """
+        Call the Method `method` with `params`, sharing the result of any
+        identical call already running if it's coalesced.
+
+        Time spent waiting for admission, or for the identical call, is
+        recorded in our queue histogram rather than the method's.
+
+        Raises: OverloadedError if admission control sheds the call
+        """
+        if not method.coalesced and self.admission is None:
+            return self._timed(method, params)
+        local = self._local
+        handled, start = local.handled, _time()
+        try:
+            if method.coalesced:
+                return self.flights.call(self.flights.key(method.name, params), self._admit,
+                                         method, params)
+            return self._admit(method, params)
+        finally:
+            waited = _time() - start - (local.handled - handled)
+            self.metrics.queue.observe(waited)
+            local.handled += waited
+
+    def _admit(self, method, params):
+        """
+        Call the Method `method` with `params` once admission control lets
+        us.
+        """
+        if self.admission is None:
+            return self._timed(method, params)
+        with self.admission.admit(method.name):
+            return self._timed(method, params)
+
+    def _timed(self, method, params):
+        """
+        Call the Method `method` with `params`, timing it into its
+        histogram.
+        """
+        start = _time()
+        try:
+            result = _call(method, params)
+        except Exception:
+            elapsed = _time() - start
+            method.errors.inc()
+            method.timing.observe(elapsed)
+            self._local.handled += elapsed
+            raise
+        # Inlined Histogram.observe, as this is every call's hot path
+        elapsed = _time() - start
+        counts = method.counts
+        counts[_bisect(method.bounds, elapsed)] += 1
+        counts[-1] += elapsed
+        self._local.handled += elapsed
+        return result
+
+    def invalidate(self, method=None):
+        """
+        Drop every cached result, or only those for `method`.
+
+        Arguments:
+        - `method`: string
+        """
+        if self.cache is not None:
+            self.cache.invalidate(method)
+        return
 
     def close(self):
         """
-        Close our active port binding
+        Close our active port binding, and stop our backend's workers.
+        We only do so once, as we're also closed on deletion.
         """
         if hasattr(self, 'httpd'):
             print 'closes!'
-            self.httpd.socket.close()
+            httpd = self.httpd
+            del self.httpd
+            httpd.server_close()
 
     def parse_response(self, request, response):
         """
@@ -141,28 +1117,185 @@ class HTTPServer(Server):
         """
         return response
 
-    @webobify
-    def app(self, request, start_response):
+    def stream_lines(self, request, stream):
+        """
+        Serialize each item of `stream` as a line of its own.
+
+        Subclasses may override this to frame their streams.
+        """
+        for item in stream:
+            yield self.parse_response(request, item) + "\n"
+
+    def stream_response(self, request, stream):
+        """
+        Yield the lines of `stream` in chunks of around `self.stream_buffer`
+        bytes, so that large streams are neither held in memory nor written
+        a line at a time.
+        """
+        chunk, size = [], 0
+        for line in self.stream_lines(request, stream):
+            chunk.append(line)
+            size += len(line)
+            if size >= self.stream_buffer:
+                yield ''.join(chunk)
+                chunk, size = [], 0
+        if chunk:
+            yield ''.join(chunk)
+
+    def check_length(self, environ):
+        """
+        Check the Content-Length of the request in `environ` before we read
+        its body.
+
+        Return: an error status if it's invalid or over `max_body`,
+        otherwise None
+        """
+        length = environ.get('CONTENT_LENGTH')
+        if not length:
+            return None
+        try:
+            length = int(length)
+        except ValueError:
+            return '400 Bad Request'
+        if length < 0:
+            return '400 Bad Request'
+        if length > self.max_body:
+            return '413 Request Entity Too Large'
+        return None
+
+    def decode_request(self, request):
+        """
+        Decompress the body of `request` if it has a Content-Encoding.
+
+        Return: an error status if we can't, otherwise None
+        """
+        encoding = request.headers.get('Content-Encoding', 'identity').lower()
+        if encoding == 'identity':
+            return None
+        if encoding not in self.compression.encodings:
+            return '415 Unsupported Media Type'
+        try:
+            request.body = self.compression.decompress(request.body, encoding,
+                                                       limit=self.max_body)
+        except exceptions.TooLargeError:
+            return '413 Request Entity Too Large'
+        except ValueError:
+            return '400 Bad Request'
+        del request.headers['Content-Encoding']
+        return None
+
+    def encode_response(self, request, headers, body):
+        """
+        Compress `body`, an iterable of strings, with the encoding `request`
+        prefers. Bodies which are lists are only compressed if they are
+        over our threshold, others (streams) always are.
+
+        Return: a tuple of (headers, body)
+        """
+        headers = headers + [('Accept-Encoding', self.compression.accept_encoding),
+                             ('Vary', 'Accept-Encoding')]
+        encoding = self.compression.negotiate(request.headers.get('Accept-Encoding'))
+        if encoding is None:
+            return headers, body
+        if isinstance(body, list):
+            data = ''.join(body)
+            if len(data) < self.compression.threshold:
+                return headers, body
+            body = [self.compression.compress(data, encoding)]
+        else:
+            body = self.compression.iter_compress(body, encoding)
+        return headers + [('Content-Encoding', encoding)], body
+
+    def app(self, environ, start_response):
         """
         Our HTTP based WSGI RPC application
 
         Decode and deserialize the POST data, locate the handler method,
         ascertain the result and then return our response.
         """
+        # A finished profiler is left for `profile` to replace, as clearing
+        # it here could race with `profile` installing a new one
+        profiler = self.profiler
+        if profiler is not None and not profiler.done:
+            return profiler.call(self._app, environ, start_response)
+        return self._app(environ, start_response)
+
+    def _app(self, environ, start_response):
+        if environ.get('PATH_INFO') == self.metrics_path:
+            return self.serve_metrics(start_response)
+        start = _time()
+        self._local.handled = 0.0
+        request = self.request_class(environ)
         if request.method not in ['GET', 'POST']:
             return ["Invalid HTTP Verb {verb}".format(verb=request.method)]
-        status, headers, response = self.procedure(request)
+        error = self.check_length(environ)
+        if error is not None:
+            start_response(error, [('Content-Type', 'text/plain')])
+            return [error]
+        if self.compression is not None:
+            error = self.decode_request(request)
+            if error is not None:
+                start_response(error, [('Content-Type', 'text/plain'),
+                                       ('Accept-Encoding', self.compression.accept_encoding)])
+                return [error]
+        try:
+            status, headers, response = self.procedure(request)
+        except admission._Shed as err:
+            status = '503 Service Unavailable'
+            start_response(status, [('Content-Type', 'text/plain'),
+                                    ('Retry-After', str(err.retry_after))])
+            return [status]
+        decoded = _time()
+        self.metrics.decode.observe(decoded - start - self._local.handled)
+        if isinstance(response, Stream):
+            headers = [(k, v) for k, v in headers if k.lower() != 'content-type']
+            headers = headers + [('Content-Type', response.content_type)]
+            body = self.stream_response(request, response)
+        else:
+            body = [self.parse_response(request, response)]
+        if self.compression is not None:
+            headers, body = self.encode_response(request, headers, body)
+        if isinstance(body, list):
+            self.metrics.encode.observe(_time() - decoded)
         start_response(status, headers)
-        return [self.parse_response(request, response)]
+        return body
+
+    def profile(self, path, seconds=None, requests=None):
+        """
+        Profile the requests we handle in the next `seconds`, or the next
+        `requests` of them, writing the stats to `path`. If we're already
+        profiling, carry on with that instead.
+
+        Only the work done until the app returns is profiled, so the
+        items of a streamed response, produced as its body is iterated,
+        aren't.
+
+        Return: the Profiler
+        """
+        profiler = self.profiler
+        if profiler is None or profiler.done:
+            profiler = self.profiler = profiling.Profiler(path, seconds=seconds,
+                                                          requests=requests)
+        return profiler
+
+    def serve_metrics(self, start_response):
+        """
+        Answer a request for our metrics
+        """
+        body = self.metrics.exposition()
+        start_response('200 OK', [('Content-Type', metering.CONTENT_TYPE),
+                                  ('Content-Length', str(len(body)))])
+        return [body]
 
     def serve(self):
         """
-        Start handling requests.
+        Start handling requests with our backend.
 
-        It a Sub-Optimal idea to use this in any kind of production setting.
+        It a Sub-Optimal idea to use the default simple backend in any kind of
+        production setting.
         """
         try:
-            self.httpd = simple_server.make_server(self.host, self.port, self.app)
+            self.httpd = self.backend.make_server(self.host, self.port, self.app)
         except socket.error as err:
             if err.errno == 98:
                 raise exceptions.PortInUseError("Port {0} is already in use on {1}".format(
@@ -177,8 +1310,8 @@ class HTTPServer(Server):
         This hook function is called in order to dispatch the incoming call into
         it's target method.
 
-        It is called with a single argument, which is a WebOb Request onject compriing a WSGI
-        environ.
+        It is called with a single argument, an instance of our `request_class`
+        wrapping the WSGI environ.
         """
         raise NotImplementedError()
 
@@ -200,7 +1333,23 @@ class ServerDaemon(doublefork.Daemon):
         """
         Implement the final hook of our Daemon class - actually serving
         requests with the server!
+
+        SIGUSR1 asks us to profile, as described in the spec file that
+        `rpctl profile` writes next to our pidfile.
         """
+        signal.signal(signal.SIGUSR1, self.profile)
         self.server.serve()
 
+    def profile(self, signum, frame):
+        """
+        Start profiling as our spec file asks, writing the stats next to
+        our pidfile. Being a signal handler, we mustn't raise.
+        """
+        try:
+            spec = profiling.read_spec(self.pidfile)
+            self.server.profile(profiling.stats_path(self.pidfile), **spec)
+        except (IOError, ValueError, NotImplementedError):
+            traceback.print_exc()
+        return
+
 
@@ -2,6 +2,8 @@
 rpc.thrifty
 
 """
+import functools
+import time
 
 from thrift.protocol import TBinaryProtocol
 from thrift.server import TProcessPoolServer
@@ -9,6 +11,7 @@ from thrift.transport import TSocket
 from thrift.transport import TTransport
 
 from rpc import clients, exceptions, servers
+from rpc import metrics as metering
 
 def _clientmaker(service, host, port, framed=False, timeout=1):
     "Return client instance and transport for `service'"
@@ -29,10 +32,25 @@ class Client(clients.RpcProxy):
     to remove the need to worry about transports & protocols etc.
 
     >>> client = thrifty.Client("localhost", 8888)
+
+    Methods may also be called on the Client itself, which opens the
+    transport for the duration of the call if it isn't already open.
+    Such calls are answered from `cache`, an `rpc.caching.ResponseCache`,
+    if one is passed, and retried according to `retry`, an
+    `rpc.retry.RetryPolicy`. Failing to open the transport is always
+    retryable, other transport errors only for idempotent methods.
+
+    Each attempt goes through `breaker`, an `rpc.breaker.CircuitBreaker`,
+    if one is passed.
+
+    >>> thrifty.Client("localhost:8888", Service).ping()
     """
     flavour = "Thrift"
+    transient = (TTransport.TTransportException,)
+    unsent = (exceptions.ConnectionError,)
 
-    def __init__(self, url, service, timeout=1, framed=False):
+    def __init__(self, url, service, timeout=1, framed=False, cache=None, retry=None,
+                 breaker=None):
         """
         We Allow either a URI we can parse a port number from,
         or a specific port keyword argument.
@@ -41,6 +59,9 @@ class Client(clients.RpcProxy):
         self.url, port = url.split(':')
         self.port = int(port)
         self.timeout = timeout
+        self.cache = cache
+        self.retry = retry
+        self.breaker = breaker
         self._client, self._transport = _clientmaker(service, self.url, self.port,
                                                      timeout=timeout, framed=framed)
 
@@ -65,6 +86,42 @@ class Client(clients.RpcProxy):
         self._transport.close()
         return
 
+    def _apicall(self, *args, **kwargs):
+        """
+        Call a method of our Thrift client, opening the transport if need be.
+        """
+        method = args[1]
+        if self._transport.isOpen():
+            return getattr(self._client, method)(*args[2:], **kwargs)
+        with self as client:
+            return getattr(client, method)(*args[2:], **kwargs)
+
+
+def _timed(method, *args):
+    """
+    Call the Method `method` with `args`, timing it into its histogram.
+    """
+    start = time.time()
+    try:
+        return method.fn(*args)
+    except Exception:
+        method.errors.inc()
+        raise
+    finally:
+        method.timing.observe(time.time() - start)
+
+
+class _MeteredHandler(object):
+    """
+    Stands in for `handler` in the Thrift processor, timing calls to each
+    of its methods into `metrics`.
+    """
+
+    def __init__(self, handler, metrics):
+        for name, method in servers.dispatch_table(handler).items():
+            method.meter(*metrics.method(name))
+            setattr(self, name, functools.partial(_timed, method))
+
 
 class Server(servers.Server):
     """
@@ -76,17 +133,28 @@ class Server(servers.Server):
     >>> with Server('localhost', 666, Handler, service=Service) as s:
     ...     s.serve()
 
+    We count calls to each method and time them, serving these metrics in
+    the Prometheus text format over HTTP on `metrics_port` if it is given.
+    Thrift decodes and encodes inside its processor, so only the time spent
+    in the handler is recorded. The histograms are shared by the worker
+    processes.
     """
     flavour = "Thrift"
+    metrics_path = '/metrics'
 
-    def __init__(self, service, **kwargs):
+    def __init__(self, service, metrics=None, metrics_port=None, **kwargs):
         """
 
         Arguments:
         - `service`:
+        - `metrics`: Metrics
+        - `metrics_port`: int
         - `**kwargs`:
         """
         self.service = service
+        self.metrics = metrics or metering.Metrics()
+        self.metrics_port = metrics_port
+        self._metrics_server = None
         super(Server, self).__init__(**kwargs)
         pass
 
@@ -94,7 +162,7 @@ class Server(servers.Server):
         """
         This function is called at the end of the base class' init.
         """
-        processor = self.service.Processor(self.handler)
+        processor = self.service.Processor(_MeteredHandler(self.handler, self.metrics))
         sockargs = {}
         if self.host:
             sockargs['port'] = self.host
@@ -106,10 +174,23 @@ class Server(servers.Server):
         self._server = TProcessPoolServer.TProcessPoolServer(processor, transport, tfactory, pfactory)
         return
 
+    def close(self):
+        """
+        Stop serving our metrics, if we are.
+        """
+        if getattr(self, '_metrics_server', None) is not None:
+            self._metrics_server.shutdown()
+            self._metrics_server.server_close()
+            self._metrics_server = None
+        return
+
     def serve(self):
         """
         Start processing incoming requests to this server
         """
         print("Serving {flavour} on {host}:{port}".format(
                 flavour=self.flavour, host=self.host, port=self.port))
+        if self.metrics_port is not None and self._metrics_server is None:
+            self._metrics_server = metering.serve(self.metrics, self.host or '',
+                                                  self.metrics_port, self.metrics_path)
         self._server.serve()
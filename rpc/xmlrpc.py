@@ -3,10 +3,52 @@ This module acts as a wrapper around the standard library's xmlrpc module(s)
 
 
 """
+import httplib
 import SimpleXMLRPCServer
+import socket
+import time
 import xmlrpclib
 
-from rpc import chains, clients, servers, urlhelp
+from rpc import chains, clients, compression as compressing, servers, urlhelp
+from rpc import metrics as metering
+
+class _Compressing:
+    """
+    Mixin for xmlrpclib Transports to gzip request bodies over the
+    threshold of our `compression`.
+
+    xmlrpclib (and SimpleXMLRPCServer) only speak gzip. The Transports are
+    old style classes, as this must be to leave their __init__ be.
+    """
+    compression = None
+
+    def send_content(self, connection, request_body):
+        connection.putheader("Content-Type", "text/xml")
+        if len(request_body) >= self.compression.threshold:
+            connection.putheader("Content-Encoding", compressing.GZIP)
+            request_body = self.compression.compress(request_body, compressing.GZIP)
+        connection.putheader("Content-Length", str(len(request_body)))
+        connection.endheaders(request_body)
+
+
+class _Transport(_Compressing, xmlrpclib.Transport):
+    pass
+
+
+class _SafeTransport(_Compressing, xmlrpclib.SafeTransport):
+    pass
+
+
+def _transport(url, compression):
+    """
+    The xmlrpclib Transport for `url` which compresses with `compression`,
+    or None for the default if `compression` is None or doesn't do gzip.
+    """
+    if compression is None or compressing.GZIP not in compression.encodings:
+        return None
+    transport = _SafeTransport() if url.startswith('https') else _Transport()
+    transport.compression = compression
+    return transport
 
 class Client(clients.RpcProxy):
     """
@@ -18,19 +60,40 @@ class Client(clients.RpcProxy):
 
     The `timeout` keyword argument specifies the per-call timeout in
     seconds.
+
+    Pass an `rpc.caching.ResponseCache` as `cache` to answer repeated calls
+    from the cache, and an `rpc.retry.RetryPolicy` as `retry` to retry calls
+    which fail with socket or HTTP errors.
+
+    Pass an `rpc.breaker.CircuitBreaker` as `breaker` to fail fast once
+    this endpoint is failing.
+
+    Pass an `rpc.compression.Compression` as `compression` to gzip request
+    bodies over its threshold. Gzipped responses are always accepted.
     """
     flavour = "XML RPC"
+    transient = (socket.error, httplib.HTTPException)
 
-    def __init__(self, url, timeout=3):
+    def __init__(self, url, timeout=3, cache=None, retry=None, breaker=None,
+                 compression=None):
         """
 
         Arguments:
         - `url`:
         - `timeout`:
+        - `cache`: ResponseCache
+        - `retry`: RetryPolicy
+        - `breaker`: CircuitBreaker
+        - `compression`: Compression
         """
         self.url = urlhelp.protocolise(url)
         self.timeout = timeout
-        self._proxy = xmlrpclib.ServerProxy(self.url)
+        self.cache = cache
+        self.retry = retry
+        self.breaker = breaker
+        self.compression = compression
+        self._proxy = xmlrpclib.ServerProxy(self.url,
+                                            transport=_transport(self.url, compression))
 
     def _apicall(self, *args, **kwargs):
         """
@@ -53,6 +116,69 @@ def chain(*args, **kwargs ):
 Server Implementation
 ----------------------
 """
+INTROSPECTION = ('system.listMethods', 'system.methodHelp', 'system.methodSignature')
+
+class _MeteredRequestHandler(SimpleXMLRPCServer.SimpleXMLRPCRequestHandler):
+    """
+    Answer GET requests for the server's `metrics_path` with its metrics.
+    """
+
+    def do_GET(self):
+        metering.respond(self, self.server.metrics, self.server.metrics_path)
+
+
+class _MeteredServer(SimpleXMLRPCServer.SimpleXMLRPCServer):
+    """
+    A SimpleXMLRPCServer which times decoding each request, calling the
+    handler, and encoding the response, into `metrics`.
+
+    Only calls to the methods named in `methods` are timed per method, so
+    that clients can't fill our metrics with made up names.
+    """
+
+    def __init__(self, addr, metrics, metrics_path, methods):
+        SimpleXMLRPCServer.SimpleXMLRPCServer.__init__(self, addr,
+                                                       requestHandler=_MeteredRequestHandler)
+        self.metrics = metrics
+        self.metrics_path = metrics_path
+        self.meters = dict((name, metrics.method(name)) for name in methods)
+        self._called = None
+
+    def _marshaled_dispatch(self, data, dispatch_method=None, path=None):
+        """
+        The stdlib decodes, dispatches and encodes in one go, so we note
+        when `_dispatch` is called and returns to tell the phases apart.
+        """
+        self._called = None
+        start = time.time()
+        response = SimpleXMLRPCServer.SimpleXMLRPCServer._marshaled_dispatch(
+            self, data, dispatch_method, path)
+        end = time.time()
+        if self._called is None:
+            self.metrics.decode.observe(end - start)
+        else:
+            called, returned = self._called
+            self.metrics.decode.observe(called - start)
+            self.metrics.encode.observe(end - returned)
+        return response
+
+    def _dispatch(self, method, params):
+        meters = self.meters.get(method)
+        if meters is None:
+            return SimpleXMLRPCServer.SimpleXMLRPCServer._dispatch(self, method, params)
+        timing, errors = meters
+        start = time.time()
+        try:
+            return SimpleXMLRPCServer.SimpleXMLRPCServer._dispatch(self, method, params)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            end = time.time()
+            timing.observe(end - start)
+            self._called = (start, end)
+
+
 class Server(servers.Server):
     """
     An XML RPC server
@@ -60,8 +186,23 @@ class Server(servers.Server):
     >>> with Server('localhost', 666, Handler, service=Service) as s:
     ...     s.serve()
 
+    We count calls to each method and time them, serving these metrics in
+    the Prometheus text format to GET requests for `metrics_path`. Pass an
+    `rpc.metrics.Metrics` as `metrics` to share them between servers.
     """
     flavour = "XML RPC"
+    metrics_path = '/metrics'
+
+    def __init__(self, host=None, port=None, handler=None, metrics=None):
+        """
+        Arguments:
+        - `host`: string
+        - `port`: int
+        - `handler`: callable
+        - `metrics`: Metrics
+        """
+        self.metrics = metrics or metering.Metrics()
+        super(Server, self).__init__(host=host, port=port, handler=handler)
 
     def scaffold(self):
         """
@@ -70,7 +211,9 @@ class Server(servers.Server):
         As this method is implicitly called by the parent's constructor,
         there is little need for the user to call it themselves.
         """
-        self._server = SimpleXMLRPCServer.SimpleXMLRPCServer((self.host, self.port))
+        methods = list(servers.dispatch_table(self.handler)) + list(INTROSPECTION)
+        self._server = _MeteredServer((self.host, self.port), self.metrics, self.metrics_path,
+                                      methods)
         self._server.register_introspection_functions()
         self._server.register_instance(self.handler)
         return
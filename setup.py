@@ -35,6 +35,7 @@ setup(
         "argparse",
         "doublefork",
         "thrift==0.8.0",
+        "msgpack",
         "WebOb==1.2b3",
-        "requests==0.10.6"]
+        "requests>=1.0"]
     )
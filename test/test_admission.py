@@ -0,0 +1,156 @@
+"""
+Unittests for the rpc.admission module
+"""
+import sys
+import threading
+import time
+import unittest
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+
+from mock import patch
+
+from rpc import admission, exceptions
+
+class AdmissionControlTestCase(unittest.TestCase):
+    def setUp(self):
+        self.admission = admission.AdmissionControl(
+            limit=1, queue=1, queue_timeout=5,
+            priorities=dict(health=admission.CRITICAL, report=admission.SHEDDABLE))
+        self.outcomes = []
+
+    def wait(self, method):
+        """
+        Start a call to `method` in a thread, returning once it's queued.
+        """
+        def call():
+            try:
+                self.admission._acquire(method)
+                self.outcomes.append(method)
+            except exceptions.OverloadedError:
+                self.outcomes.append("shed " + method)
+        queued = self.admission.queued
+        thread = threading.Thread(target=call)
+        thread.start()
+        while self.admission.queued == queued:
+            time.sleep(0.001)
+        return thread
+
+    def test_repr(self):
+        """ Stringify nicely """
+        self.assertEqual("<AdmissionControl 0/1 running, 0 waiting>", str(self.admission))
+
+    def test_limit(self):
+        """ Admit up to the limit, queue then shed the rest """
+        self.admission._acquire("ping")
+        thread = self.wait("ping")
+        with self.assertRaises(exceptions.OverloadedError):
+            self.admission._acquire("ping")
+        self.admission._release(0.01)
+        thread.join(5)
+        self.assertEqual(["ping"], self.outcomes)
+        self.assertEqual(dict(limit=1, running=1, waiting=0, admitted=2, queued=1, shed=1),
+                         self.admission.stats())
+
+    def test_no_queue(self):
+        """ Shed at once without a queue """
+        self.admission.queue = 0
+        self.admission._acquire("ping")
+        with self.assertRaises(exceptions.OverloadedError):
+            self.admission._acquire("health")
+
+    def test_priority_shedding(self):
+        """ Push out waiting calls of lower classes when the queue is full """
+        self.admission._acquire("ping")
+        report = self.wait("report")
+        with self.assertRaises(exceptions.OverloadedError):
+            self.admission._acquire("report")
+        health = self.wait("health")
+        report.join(5)
+        self.assertEqual(["shed report"], self.outcomes)
+        self.admission._release(0.01)
+        health.join(5)
+        self.assertEqual(["shed report", "health"], self.outcomes)
+
+    def test_priority_order(self):
+        """ Admit waiting calls of higher classes first """
+        self.admission.queue = 2
+        self.admission._acquire("ping")
+        report = self.wait("report")
+        health = self.wait("health")
+        self.admission._release(0.01)
+        health.join(5)
+        self.admission._release(0.01)
+        report.join(5)
+        self.assertEqual(["health", "report"], self.outcomes)
+
+    def test_queue_timeout(self):
+        """ Shed calls which have waited too long when a call finishes """
+        self.admission.queue_timeout = 0.01
+        self.admission._acquire("ping")
+        thread = self.wait("ping")
+        time.sleep(0.02)
+        self.admission._release(0.03)
+        thread.join(5)
+        self.assertEqual(["shed ping"], self.outcomes)
+        self.assertEqual(0, self.admission.stats()['running'])
+
+    def test_queue_timeout_idle(self):
+        """ Shed calls which have waited too long though no call comes or goes """
+        self.admission.queue_timeout = 0.01
+        self.admission._acquire("ping")
+        thread = self.wait("ping")
+        thread.join(5)
+        self.assertEqual(["shed ping"], self.outcomes)
+        self.assertEqual(dict(limit=1, running=1, waiting=0, admitted=1, queued=1, shed=1),
+                         self.admission.stats())
+
+    def test_queue_timeout_arrival(self):
+        """ Shed calls which have waited too long when a call arrives """
+        self.admission.queue_timeout = 0.01
+        self.admission._acquire("ping")
+        thread = self.wait("ping")
+        time.sleep(0.02)
+        self.admission.queue_timeout = 5
+        late = self.wait("report")
+        thread.join(5)
+        self.assertEqual(["shed ping"], self.outcomes)
+        self.admission._release(0.03)
+        late.join(5)
+        self.assertEqual(["shed ping", "report"], self.outcomes)
+
+    def test_admit(self):
+        """ Hold a place while the call runs """
+        with self.admission.admit("ping"):
+            self.assertEqual(1, self.admission.running)
+        self.assertEqual(0, self.admission.running)
+        with self.assertRaises(ValueError):
+            with self.admission.admit("ping"):
+                raise ValueError()
+        self.assertEqual(0, self.admission.running)
+
+    def test_adaptive(self):
+        """ Grow the limit while calls are fast, shrink it when they're slow """
+        adaptive = admission.AdmissionControl(limit=4, latency_target=0.1, min_limit=2)
+        for i in range(6):
+            adaptive._acquire("ping")
+            adaptive._release(0.05)
+        self.assertEqual(5, int(adaptive.limit))
+        limit = adaptive.limit
+        with patch.object(admission.time, 'time', return_value=1000):
+            adaptive._acquire("ping")
+            adaptive._release(0.5)
+            self.assertEqual(limit * 0.9, adaptive.limit)
+            # Once per slow call's duration
+            adaptive._acquire("ping")
+            adaptive._release(0.5)
+            self.assertEqual(limit * 0.9, adaptive.limit)
+        for i in range(20):
+            with patch.object(admission.time, 'time', return_value=2000 + i):
+                adaptive._acquire("ping")
+                adaptive._release(0.5)
+        self.assertEqual(2, adaptive.limit)
+
+
+if __name__ == '__main__':
+    unittest.main()
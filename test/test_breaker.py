@@ -0,0 +1,99 @@
+"""
+Unittests for the rpc.breaker module
+"""
+import sys
+import unittest
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+
+from mock import patch, Mock
+
+from rpc import breaker, exceptions
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.breaker = breaker.CircuitBreaker(error_rate=0.5, window=4, min_calls=4,
+                                              reset_timeout=10)
+        self.time = patch.object(breaker.time, "time")
+        self.Ptime = self.time.start()
+        self.Ptime.return_value = 100
+
+    def trip(self):
+        for i in range(4):
+            self.breaker.record(i % 2 == 0)
+
+    def test_repr(self):
+        """ Stringify nicely """
+        self.assertEqual("<CircuitBreaker closed>", str(self.breaker))
+
+    def test_min_calls(self):
+        """ Don't open on too few calls """
+        for i in range(3):
+            self.breaker.record(False)
+        self.assertEqual(breaker.CLOSED, self.breaker.state)
+        self.breaker.record(False)
+        self.assertEqual(breaker.OPEN, self.breaker.state)
+        self.assertEqual(1, self.breaker.opened)
+
+    def test_error_rate(self):
+        """ Open once enough of the window fails """
+        for i in range(4):
+            self.breaker.record(i == 0)
+        self.assertEqual(breaker.OPEN, self.breaker.state)
+
+    def test_window(self):
+        """ Old outcomes drop out of the window """
+        self.breaker.record(False)
+        for i in range(10):
+            self.breaker.record(True)
+        self.breaker.record(False)
+        self.assertEqual(breaker.CLOSED, self.breaker.state)
+
+    def test_slow_calls(self):
+        """ Slow calls count as failures """
+        self.breaker.slow_call = 1
+        for i in range(4):
+            self.breaker.record(True, latency=2)
+        self.assertEqual(breaker.OPEN, self.breaker.state)
+
+    def test_open(self):
+        """ Fail fast while open """
+        self.trip()
+        fn = Mock()
+        with self.assertRaises(exceptions.CircuitOpenError):
+            self.breaker.call(fn, "ping", ())
+        self.assertFalse(fn.called)
+
+    def test_half_open(self):
+        """ Let a probe through once the reset timeout passes """
+        self.trip()
+        self.Ptime.return_value = 110
+        self.assertEqual(breaker.HALF_OPEN, self.breaker.state)
+        self.assertTrue(self.breaker.allow())
+        self.assertFalse(self.breaker.allow())
+
+    def test_probe_succeeds(self):
+        """ Close again after a good probe """
+        self.trip()
+        self.Ptime.return_value = 110
+        fn = Mock(return_value="pong!")
+        self.assertEqual("pong!", self.breaker.call(fn, "ping", (1,), {'b': 2}))
+        fn.assert_called_once_with("ping", 1, b=2)
+        self.assertEqual(breaker.CLOSED, self.breaker.state)
+
+    def test_probe_fails(self):
+        """ Open again after a bad probe """
+        self.trip()
+        self.Ptime.return_value = 110
+        fn = Mock(side_effect=ValueError())
+        with self.assertRaises(ValueError):
+            self.breaker.call(fn, "ping", ())
+        self.assertEqual(breaker.OPEN, self.breaker.state)
+        self.assertEqual(2, self.breaker.opened)
+
+    def tearDown(self):
+        self.time.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,204 @@
+"""
+Unittests for the rpc.caching module
+"""
+import sys
+import threading
+import time
+import unittest
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+
+from mock import patch, Mock
+
+from rpc import caching
+
+class ResponseCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache = caching.ResponseCache(maxsize=2, ttl=10)
+        self.fn = Mock(name="Mock Call", side_effect=lambda method, *a: (method, a))
+
+    def test_repr(self):
+        """ Stringify nicely """
+        self.assertEqual("<ResponseCache 0/2 entries>", str(self.cache))
+
+    def test_hit(self):
+        """ Repeated calls come from the cache """
+        self.assertEqual(("ping", (1,)), self.cache.call(self.fn, "ping", (1,)))
+        self.assertEqual(("ping", (1,)), self.cache.call(self.fn, "ping", (1,)))
+        self.assertEqual(1, self.fn.call_count)
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+    def test_copies(self):
+        """ Changing a result doesn't change the cached one """
+        fn = Mock(name="Mock Call", side_effect=lambda method: {'rows': [1]})
+        self.cache.call(fn, "lookup", ())['rows'].append(2)
+        result = self.cache.call(fn, "lookup", ())
+        self.assertEqual({'rows': [1]}, result)
+        result['rows'].append(3)
+        self.assertEqual({'rows': [1]}, self.cache.call(fn, "lookup", ()))
+        self.assertEqual(1, fn.call_count)
+
+    def test_key(self):
+        """ Different arguments are different calls """
+        self.cache.call(self.fn, "ping", (1,))
+        self.cache.call(self.fn, "ping", (2,))
+        self.cache.call(self.fn, "pong", (1,))
+        self.assertEqual(3, self.fn.call_count)
+        self.assertNotEqual(self.cache.key("a", (), {}), self.cache.key("a", (), {'b': 1}))
+
+    def test_ttl(self):
+        """ Entries expire """
+        with patch.object(caching.time, "time") as Ptime:
+            Ptime.return_value = 100
+            self.cache.call(self.fn, "ping", ())
+            Ptime.return_value = 109
+            self.cache.call(self.fn, "ping", ())
+            self.assertEqual(1, self.fn.call_count)
+            Ptime.return_value = 111
+            self.cache.call(self.fn, "ping", ())
+            self.assertEqual(2, self.fn.call_count)
+
+    def test_ttls(self):
+        """ Only cache the methods we have ttls for """
+        cache = caching.ResponseCache(ttls={'ping': None})
+        self.assertTrue(cache.cached("ping"))
+        self.assertFalse(cache.cached("pong"))
+        for i in range(2):
+            cache.call(self.fn, "ping", ())
+            cache.call(self.fn, "pong", ())
+        self.assertEqual(3, self.fn.call_count)
+
+    def test_lru(self):
+        """ Evict the least recently used entry """
+        for method in ["one", "two", "one", "three"]:
+            self.cache.call(self.fn, method, ())
+        self.assertEqual(1, self.cache.evictions)
+        self.assertEqual(2, len(self.cache))
+        self.cache.call(self.fn, "one", ())
+        self.assertEqual(3, self.fn.call_count)
+        self.cache.call(self.fn, "two", ())
+        self.assertEqual(4, self.fn.call_count)
+
+    def test_errors(self):
+        """ Don't cache errors by default """
+        self.fn.side_effect = ValueError()
+        for i in range(2):
+            with self.assertRaises(ValueError):
+                self.cache.call(self.fn, "ping", ())
+        self.assertEqual(2, self.fn.call_count)
+
+    def test_cache_errors(self):
+        """ Negative caching """
+        cache = caching.ResponseCache(cache_errors=True)
+        self.fn.side_effect = ValueError()
+        for i in range(2):
+            with self.assertRaises(ValueError):
+                cache.call(self.fn, "ping", ())
+        self.assertEqual(1, self.fn.call_count)
+
+    def test_failed(self):
+        """ Don't cache results the client says failed """
+        failed = lambda result: True
+        self.cache.call(self.fn, "ping", (), failed=failed)
+        self.cache.call(self.fn, "ping", (), failed=failed)
+        self.assertEqual(2, self.fn.call_count)
+
+    def test_invalidate(self):
+        """ Drop entries by method or all at once """
+        self.cache.call(self.fn, "one", ())
+        self.cache.call(self.fn, "two", ())
+        self.cache.invalidate("one")
+        self.assertEqual(1, len(self.cache))
+        self.cache.invalidate()
+        self.assertEqual(0, len(self.cache))
+
+    def test_invalidated_while_running(self):
+        """ Don't store results of calls invalidated while they ran """
+        def invalidating(method, *args):
+            self.cache.invalidate(method)
+            return "stale"
+        self.cache.call(invalidating, "one", ())
+        self.cache.call(lambda method: self.cache.invalidate(), "two", ())
+        self.assertEqual(0, len(self.cache))
+        generation = self.cache.generation("one")
+        self.cache.invalidate("two")
+        self.cache.put("key", "one", value="fresh", generation=generation)
+        self.assertEqual((True, ("fresh", None)), self.cache.get("key"))
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    def setUp(self):
+        self.flights = caching.SingleFlight()
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def slow(self, result):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+    def concurrently(self, key, result, n=5):
+        """
+        Make `n` calls for `key` while the first is held up.
+
+        Return: a list of (result, exception) tuples
+        """
+        outcomes = []
+        def call():
+            try:
+                outcomes.append((self.flights.call(key, self.slow, result), None))
+            except BaseException as err:
+                outcomes.append((None, err))
+        threads = [threading.Thread(target=call) for i in range(n)]
+        threads[0].start()
+        self.started.wait(5)
+        for thread in threads[1:]:
+            thread.start()
+        while self.flights.calls < n:
+            time.sleep(0.001)
+        self.release.set()
+        for thread in threads:
+            thread.join(5)
+        return outcomes
+
+    def test_coalesce(self):
+        """ Share the result of a running call """
+        self.assertEqual([("pong!", None)] * 5, self.concurrently("ping", "pong!"))
+        self.assertEqual(1, self.calls)
+        self.assertEqual(4, self.flights.coalesced)
+        self.assertEqual(0, len(self.flights))
+
+    def test_exception(self):
+        """ Share the exception of a running call """
+        err = ValueError("Nope")
+        self.assertEqual([(None, err)] * 5, self.concurrently("ping", err))
+        self.assertEqual(1, self.calls)
+        self.assertEqual(0, len(self.flights))
+
+    def test_base_exception(self):
+        """ Share exceptions which aren't Exceptions, and let calls go on """
+        err = SystemExit(1)
+        self.assertEqual([(None, err)] * 5, self.concurrently("ping", err))
+        self.assertEqual(0, len(self.flights))
+        self.assertEqual("pong!", self.flights.call("ping", lambda: "pong!"))
+
+    def test_sequential(self):
+        """ Calls once the first has finished are made afresh """
+        self.release.set()
+        self.flights.call("ping", self.slow, 1)
+        self.flights.call("ping", self.slow, 1)
+        self.assertEqual(2, self.calls)
+        self.assertEqual(0, self.flights.coalesced)
+
+    def test_key(self):
+        """ Key calls by method and arguments """
+        self.assertEqual(self.flights.key("ping", [1, 2]), self.flights.key("ping", (1, 2)))
+        self.assertNotEqual(self.flights.key("ping", [1]), self.flights.key("pong", [1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,11 +2,14 @@
 Unittests for the rpc.chain module
 """
 import sys
+import time
 import unittest
 if sys.version_info < (2, 7):
     import unittest2 as unittest
 
-from rpc import chains
+from mock import patch, Mock
+
+from rpc import breaker, chains
 
 class ChainListTestCase(unittest.TestCase):
     def setUp(self):
@@ -29,10 +32,231 @@ class ChainListTestCase(unittest.TestCase):
         self.assertEqual({'boo': 'coo', 'doo': 'foo'}, clist[0])
         self.assertEqual({'goo': 'hoo'}, clist[1])
 
+    def test_map_call(self):
+        """ Call every member, gathering results and exceptions """
+        one, two = Mock(name="One"), Mock(name="Two")
+        one.ping.return_value = "pong!"
+        two.ping.side_effect = ValueError()
+        clist = chains.ChainList()
+        clist += [one, two]
+        first, second = clist.map_call("ping", 1, b=2)
+        one.ping.assert_called_once_with(1, b=2)
+        two.ping.assert_called_once_with(1, b=2)
+        self.assertEqual("pong!", first.result())
+        self.assertIsInstance(second.exception(), ValueError)
+
+    def test_map_call_parallel(self):
+        """ Members are called at the same time """
+        def slow():
+            time.sleep(0.1)
+            return "pong!"
+        clist = chains.ChainList()
+        clist += [Mock(ping=slow) for i in range(5)]
+        start = time.time()
+        calls = clist.map_call("ping")
+        self.assertTrue(time.time() - start < 0.3)
+        self.assertEqual(["pong!"] * 5, [call.result() for call in calls])
+
+    def test_map_call_workers(self):
+        """ Bound the number of members called at once """
+        def slow():
+            time.sleep(0.05)
+        clist = chains.ChainList(workers=1)
+        clist += [Mock(ping=slow) for i in range(3)]
+        start = time.time()
+        clist.map_call("ping")
+        self.assertTrue(time.time() - start >= 0.15)
+
+    def test_map_call_empty(self):
+        """ Nothing to call """
+        self.assertEqual([], chains.ChainList().map_call("ping"))
+
+    def test_eject(self):
+        """ Ejected members aren't available until their time is up """
+        one, two = Mock(name="One"), Mock(name="Two")
+        clist = chains.ChainList()
+        clist += [one, two]
+        with patch.object(chains.time, "time") as Ptime:
+            Ptime.return_value = 100
+            clist.eject(one, 10)
+            self.assertTrue(clist.ejected(one))
+            self.assertEqual([two], clist.available())
+            Ptime.return_value = 110
+            self.assertEqual([one, two], clist.available())
+
+    def test_available_breakers(self):
+        """ Members whose breakers are open aren't available """
+        one, two = Mock(name="One"), Mock(name="Two")
+        one.breaker = breaker.CircuitBreaker(min_calls=1)
+        one.breaker.record(False)
+        clist = chains.ChainList()
+        clist += [one, two]
+        self.assertEqual([two], clist.available())
+
+    def test_available_panic(self):
+        """ Rather every member than none """
+        one = Mock(name="One")
+        clist = chains.ChainList()
+        clist.append(one)
+        clist.eject(one, 10)
+        self.assertEqual([one], clist.available())
 
     def tearDown(self):
         pass
 
+class BalancerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.members = chains.ChainList()
+        self.members += [Mock(name="One"), Mock(name="Two"), Mock(name="Three")]
+        for member in self.members:
+            member.ping.return_value = member
+
+    def test_policy(self):
+        """ Only known policies """
+        with self.assertRaises(ValueError):
+            chains.Balancer(self.members, policy="random")
+        balancer = self.members.balancer(chains.LEAST_OUTSTANDING)
+        self.assertIsInstance(balancer, chains.Balancer)
+        self.assertEqual(chains.LEAST_OUTSTANDING, balancer.policy)
+
+    def test_round_robin(self):
+        """ Each member in turn """
+        balancer = chains.Balancer(self.members)
+        picked = [balancer.ping() for i in range(6)]
+        self.assertEqual(list(self.members) * 2, picked)
+
+    def test_arguments(self):
+        """ Pass the call through """
+        balancer = chains.Balancer(self.members)
+        balancer.ping(1, b=2)
+        self.members[0].ping.assert_called_once_with(1, b=2)
+
+    def test_least_outstanding(self):
+        """ Pick the member with fewest calls in flight """
+        balancer = chains.Balancer(self.members, policy=chains.LEAST_OUTSTANDING)
+        balancer._outstanding[id(self.members[0])] = 2
+        balancer._outstanding[id(self.members[2])] = 1
+        self.assertTrue(balancer.ping() is self.members[1])
+        self.assertEqual(0, balancer.outstanding(self.members[1]))
+
+    def test_power_of_two(self):
+        """ Pick the better of two members, weighted by latency """
+        balancer = chains.Balancer(self.members, policy=chains.POWER_OF_TWO)
+        balancer._latency[id(self.members[0])] = 0.5
+        balancer._latency[id(self.members[1])] = 0.1
+        balancer._latency[id(self.members[2])] = 0.2
+        balancer._outstanding[id(self.members[1])] = 3
+        with patch.object(chains.random, "sample") as Psample:
+            Psample.return_value = [self.members[0], self.members[1]]
+            self.assertTrue(balancer._pick() is self.members[1])
+            Psample.return_value = [self.members[1], self.members[2]]
+            self.assertTrue(balancer._pick() is self.members[2])
+
+    def test_latency(self):
+        """ Track a moving average latency """
+        balancer = chains.Balancer(self.members, alpha=0.5)
+        self.assertEqual(None, balancer.latency(self.members[0]))
+        with patch.object(chains.time, "time") as Ptime:
+            Ptime.side_effect = [0, 1, 0, 0, 0, 0, 0, 3]
+            for i in range(4):
+                balancer.ping()
+        self.assertEqual(2.0, balancer.latency(self.members[0]))
+
+    def test_errors(self):
+        """ Calls which raise are no longer in flight """
+        self.members[0].ping.side_effect = ValueError()
+        balancer = chains.Balancer(self.members)
+        with self.assertRaises(ValueError):
+            balancer.ping()
+        self.assertEqual(0, balancer.outstanding(self.members[0]))
+
+    def test_consecutive_errors(self):
+        """ Eject members which keep failing """
+        self.members[0].ping.side_effect = ValueError()
+        balancer = chains.Balancer(self.members, consecutive_errors=2)
+        with self.assertRaises(ValueError):
+            balancer.ping()
+        balancer.ping()
+        balancer.ping()
+        self.assertFalse(self.members.ejected(self.members[0]))
+        with self.assertRaises(ValueError):
+            balancer.ping()
+        self.assertTrue(self.members.ejected(self.members[0]))
+        picked = [balancer.ping() for i in range(4)]
+        self.assertFalse(self.members[0] in picked)
+
+    def test_empty(self):
+        """ Nobody to call """
+        with self.assertRaises(IndexError):
+            chains.Balancer(chains.ChainList()).ping()
+
+
+class HedgedTestCase(unittest.TestCase):
+    def setUp(self):
+        self.members = chains.ChainList()
+        self.members += [Mock(name="One"), Mock(name="Two")]
+        for member in self.members:
+            member.ping.return_value = member
+
+    def slow(self, member, seconds):
+        def ping(*args):
+            time.sleep(seconds)
+            return member
+        member.ping.side_effect = ping
+
+    def test_fast(self):
+        """ Don't hedge fast calls """
+        with self.members.hedged(delay=0.5) as client:
+            self.assertTrue(client.ping() is self.members[0])
+            self.assertEqual(0, client.hedges)
+            self.assertEqual(0, self.members[1].ping.call_count)
+
+    def test_turns(self):
+        """ Replicas take turns at being first """
+        with chains.Hedged(self.members) as client:
+            self.assertEqual(list(self.members), [client.ping(), client.ping()])
+
+    def test_hedge(self):
+        """ Hedge slow calls, taking the first answer """
+        self.slow(self.members[0], 0.5)
+        with chains.Hedged(self.members, delay=0.01) as client:
+            start = time.time()
+            self.assertTrue(client.ping(1) is self.members[1])
+            self.assertTrue(time.time() - start < 0.4)
+            self.members[1].ping.assert_called_once_with(1)
+            self.assertEqual((1, 1), (client.hedges, client.hedge_wins))
+
+    def test_hedge_error(self):
+        """ Prefer an answer to an error """
+        self.slow(self.members[0], 0.05)
+        self.members[1].ping.side_effect = ValueError()
+        with chains.Hedged(self.members, delay=0.01) as client:
+            self.assertTrue(client.ping() is self.members[0])
+            self.assertEqual((1, 0), (client.hedges, client.hedge_wins))
+
+    def test_all_errors(self):
+        """ Raise if every replica fails """
+        for member in self.members:
+            member.ping.side_effect = ValueError()
+        with chains.Hedged(self.members, delay=0) as client:
+            with self.assertRaises(ValueError):
+                client.ping()
+
+    def test_threshold(self):
+        """ Hedge at a percentile once we have enough samples """
+        client = chains.Hedged(self.members, delay=1, percentile=90, min_samples=10)
+        client._latencies.extend(range(9))
+        self.assertEqual(1, client.threshold())
+        client._latencies.extend([9, 10])
+        self.assertEqual(9, client.threshold())
+        client.close()
+
+    def test_empty(self):
+        """ Nobody to call """
+        with self.assertRaises(IndexError):
+            chains.Hedged(chains.ChainList()).ping()
+
+
 class ClientChainTestCase(unittest.TestCase):
     def setUp(self):
         pass
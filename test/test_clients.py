@@ -6,7 +6,9 @@ import unittest
 if sys.version_info < (2, 7):
     import unittest2 as unittest
 
-from rpc import clients
+from mock import patch
+
+from rpc import breaker, caching, clients, exceptions, retry
 
 
 class ClientTestCase(unittest.TestCase):
@@ -29,12 +31,59 @@ class ClientTestCase(unittest.TestCase):
         with self.assertRaises(NotImplementedError):
             client.callit(True)
 
+    def test_getattr_stub(self):
+        """ Reuse the stub for each method once it's been called """
+        client = clients.RpcProxy()
+        self.assertFalse(hasattr(client, 'missing') and 'missing' in client.__dict__)
+        with patch.object(client, "_call"):
+            client.callit()
+            client._callit()
+        self.assertTrue(client.callit is client.callit)
+        self.assertFalse(client._callit is client._callit)
+
     def test_apicall_nimp(self):
         """ Base apicall should raise """
         client = clients.RpcProxy()
         with self.assertRaises(NotImplementedError):
             client._apicall(False)
 
+    def test_cache(self):
+        """ Calls go through the cache """
+        client = clients.RpcProxy()
+        client.cache = caching.ResponseCache()
+        with patch.object(client, "_apicall") as Papi:
+            Papi.return_value = "pong!"
+            self.assertEqual("pong!", client.ping(1))
+            self.assertEqual("pong!", client.ping(1))
+            Papi.assert_called_once_with(client, "ping", 1)
+        self.assertEqual(1, client.cache.hits)
+
+    def test_retry(self):
+        """ Calls are retried with our policy """
+        client = clients.RpcProxy()
+        client.retry = retry.RetryPolicy(backoff=0, idempotent=["ping"])
+        client.transient = (IOError,)
+        with patch.object(client, "_apicall") as Papi:
+            Papi.side_effect = [IOError(), "pong!"]
+            self.assertEqual("pong!", client.ping(1))
+            Papi.assert_called_with(client, "ping", 1)
+        self.assertEqual(1, client.retry.retries)
+
+    def test_breaker(self):
+        """ Fail fast once the breaker opens, without retrying """
+        client = clients.RpcProxy()
+        client.breaker = breaker.CircuitBreaker(window=2, min_calls=2)
+        client.retry = retry.RetryPolicy(backoff=0, idempotent=["ping"])
+        client.transient = (IOError,)
+        with patch.object(client, "_apicall") as Papi:
+            Papi.side_effect = IOError()
+            with self.assertRaises(exceptions.CircuitOpenError):
+                client.ping(1)
+            self.assertEqual(2, Papi.call_count)
+            with self.assertRaises(exceptions.CircuitOpenError):
+                client.ping(1)
+            self.assertEqual(2, Papi.call_count)
+
 
 if __name__ == '__main__':
     unittest.main()
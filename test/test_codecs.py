@@ -0,0 +1,70 @@
+"""
+Unittests for the rpc.codecs module
+"""
+import json
+import sys
+import unittest
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+
+from mock import patch
+
+from rpc import codecs
+
+class JSONCodecTestCase(unittest.TestCase):
+    def setUp(self):
+        self.codec = codecs.JSONCodec()
+
+    def test_repr(self):
+        """ Stringify nicely """
+        self.assertEqual("<stdlib Codec>", str(self.codec))
+
+    def test_roundtrip(self):
+        """ Serialize and deserialize """
+        data = dict(id=1, params=["Larry", 2.5, None])
+        self.assertEqual(data, self.codec.loads(self.codec.dumps(data)))
+
+    def test_invalid(self):
+        """ Bad data raises ValueError """
+        with self.assertRaises(ValueError):
+            self.codec.loads('{"id": ')
+
+    def test_module(self):
+        """ Use any json-alike module """
+        codec = codecs.JSONCodec("fake", json)
+        self.assertEqual("fake", codec.name)
+        self.assertEqual('[1]', codec.dumps([1]))
+
+
+class GetTestCase(unittest.TestCase):
+
+    def test_instance(self):
+        """ Pass through codec instances """
+        codec = codecs.JSONCodec()
+        self.assertTrue(codec is codecs.get(codec))
+
+    def test_name(self):
+        """ Look up codecs by name """
+        self.assertEqual("stdlib", codecs.get("stdlib").name)
+        self.assertTrue(codecs.get("stdlib") is codecs.get("stdlib"))
+        self.assertTrue(codecs.get("json") is codecs.json_codec())
+
+    def test_unknown(self):
+        """ Raise for unknown names """
+        with self.assertRaises(ValueError):
+            codecs.get("yaml")
+
+    def test_fastest(self):
+        """ Prefer faster encoders, falling back to stdlib """
+        def missing():
+            raise ImportError()
+        fake = codecs.JSONCodec("fake", json)
+        with patch.object(codecs, "_cache", {}):
+            with patch.object(codecs, "_JSON", [("orjson", missing),
+                                                ("fake", lambda: fake),
+                                                ("stdlib", codecs._stdlib)]):
+                self.assertTrue(fake is codecs.json_codec())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+"""
+Unittests for the rpc.compression module
+"""
+import gzip
+import StringIO
+import sys
+import unittest
+import zlib
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+
+from rpc import compression, exceptions
+
+class ParseAcceptTestCase(unittest.TestCase):
+
+    def test_order(self):
+        """ Most preferred first, ties in the order given """
+        accepted = compression.parse_accept("deflate;q=0.5, gzip, br;q=0.9, identity")
+        self.assertEqual(["gzip", "identity", "br", "deflate"], accepted)
+
+    def test_refused(self):
+        """ Leave out encodings with q=0 """
+        self.assertEqual(["deflate"], compression.parse_accept("gzip;q=0, deflate"))
+
+    def test_empty(self):
+        """ Nothing accepted """
+        self.assertEqual([], compression.parse_accept(None))
+        self.assertEqual([], compression.parse_accept(""))
+
+
+class CompressionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.compression = compression.Compression(threshold=10, level=1)
+        self.data = '{"rows": [' + ', '.join(['"row"'] * 100) + ']}'
+
+    def test_repr(self):
+        """ Stringify nicely """
+        self.assertEqual("<Compression gzip/deflate over 10 bytes>", str(self.compression))
+
+    def test_encodings(self):
+        """ Only encodings we know """
+        with self.assertRaises(ValueError):
+            compression.Compression(encodings=["br"])
+        self.assertEqual("gzip, deflate", self.compression.accept_encoding)
+
+    def test_negotiate(self):
+        """ Pick the client's favourite of our encodings """
+        self.assertEqual("deflate", self.compression.negotiate("br, deflate, gzip"))
+        self.assertEqual("gzip", self.compression.negotiate("*"))
+        self.assertEqual(None, self.compression.negotiate("br"))
+        self.assertEqual(None, self.compression.negotiate(None))
+
+    def test_gzip(self):
+        """ Readable by gzip """
+        compressed = self.compression.compress(self.data, compression.GZIP)
+        self.assertTrue(len(compressed) < len(self.data))
+        self.assertEqual(self.data, gzip.GzipFile(fileobj=StringIO.StringIO(compressed)).read())
+        self.assertEqual(self.data, self.compression.decompress(compressed, compression.GZIP))
+
+    def test_deflate(self):
+        """ zlib wrapped deflate, also accepting raw deflate """
+        compressed = self.compression.compress(self.data, compression.DEFLATE)
+        self.assertEqual(self.data, zlib.decompress(compressed))
+        self.assertEqual(self.data, self.compression.decompress(compressed, compression.DEFLATE))
+        raw = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+        raw = raw.compress(self.data) + raw.flush()
+        self.assertEqual(self.data, self.compression.decompress(raw, compression.DEFLATE))
+
+    def test_iter_compress(self):
+        """ Each chunk can be decompressed as it arrives """
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        chunks = self.compression.iter_compress(iter(["one\n", "two\n"]), compression.GZIP)
+        self.assertEqual("one\n", decompressor.decompress(next(chunks)))
+        self.assertEqual("two\n", decompressor.decompress(next(chunks)))
+        self.assertEqual("", decompressor.decompress(next(chunks)))
+
+    def test_decompress_limit(self):
+        """ Refuse to decompress past the limit """
+        for encoding in compression.ENCODINGS:
+            compressed = self.compression.compress(self.data, encoding)
+            self.assertEqual(self.data, self.compression.decompress(
+                compressed, encoding, limit=len(self.data)))
+            with self.assertRaises(exceptions.TooLargeError):
+                self.compression.decompress(compressed, encoding, limit=len(self.data) - 1)
+
+    def test_decompress_invalid(self):
+        """ Raise ValueError for data or encodings we can't read """
+        with self.assertRaises(ValueError):
+            self.compression.decompress("rubbish", compression.GZIP)
+        with self.assertRaises(ValueError):
+            self.compression.decompress("rubbish", "br")
+
+
+if __name__ == '__main__':
+    unittest.main()
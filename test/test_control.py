@@ -11,7 +11,7 @@ if sys.version_info < (2, 7):
 
 from mock import patch
 
-from rpc import control, exceptions, ini, jsonrpc, servers
+from rpc import control, exceptions, ini, jsonrpc, profiling, servers
 
 SERVERCONF = """
 [rpctl]
@@ -21,11 +21,23 @@ handler = ConfigParser.ConfigParser
 server = rpc.jsonrpc.Server
 """
 
+THREADEDCONF = SERVERCONF + """
+backend = threaded
+workers = 4
+queue_size = 8
+
+[admission]
+limit = 16
+queue_timeout = 0.5
+priorities = health:critical, report:sheddable
+"""
+
 BADCONF = """
 hehehehehe
 """
 
 CONFFILE = None
+THREADEDFILE = None
 BADFILE = None
 
 def setup_module(module):
@@ -34,6 +46,10 @@ def setup_module(module):
     with open(tempconf.name, "wb") as fh:
         fh.write(SERVERCONF)
     tempconf = tempfile.NamedTemporaryFile(delete=False)
+    module.THREADEDFILE = tempconf.name
+    with open(tempconf.name, "wb") as fh:
+        fh.write(THREADEDCONF)
+    tempconf = tempfile.NamedTemporaryFile(delete=False)
     module.BADFILE = tempconf.name
     with open(tempconf.name, "wb") as fh:
         fh.write(BADCONF)
@@ -43,6 +59,7 @@ def setUpModule():
 
 def teardown_module(module):
     os.remove(module.CONFFILE)
+    os.remove(module.THREADEDFILE)
     os.remove(module.BADFILE)
 
 def tearDownModule():
@@ -84,6 +101,47 @@ class ControllerTestCase(unittest.TestCase):
         serv = jsonrpc.Server("0.0.0.0", 4567, ConfigParser.ConfigParser)
         self.assertEqual(serv, self.cont.server)
 
+    def test_server_backend(self):
+        "Serve with the backend from the config"
+        self.assertIsInstance(self.cont.server.backend, servers.SimpleBackend)
+        cont = control.Controller(THREADEDFILE)
+        self.assertIsInstance(cont.server.backend, servers.ThreadedBackend)
+        self.assertEqual(4, cont.server.backend.workers)
+        self.assertEqual(8, cont.server.backend.queue_size)
+        self.assertEqual(128, cont.server.backend.backlog)
+
+    def test_server_admission(self):
+        "Control admission as the config says"
+        self.assertEqual(None, self.cont.server.admission)
+        admission = control.Controller(THREADEDFILE).server.admission
+        self.assertEqual(16, admission.limit)
+        self.assertEqual(0.5, admission.queue_timeout)
+        self.assertEqual(128, admission.queue)
+        self.assertEqual(dict(health=2, report=0), admission.priorities)
+
+    def test_server_options_http_only(self):
+        "Refuse HTTP server options for other servers"
+        xmlconf = tempfile.NamedTemporaryFile(suffix=".conf")
+        xmlconf.write(THREADEDCONF.replace("rpc.jsonrpc.Server", "rpc.xmlrpc.Server"))
+        xmlconf.flush()
+        with self.assertRaises(exceptions.InvalidIniError) as cm:
+            control.Controller(xmlconf.name)
+        self.assertEqual("rpc.xmlrpc.Server is not an HTTP server, so takes no admission or backend",
+                         str(cm.exception))
+
+    def test_priorities(self):
+        "Read priority classes by name"
+        self.assertEqual(dict(a=2), control._priorities("a:CRITICAL"))
+        with self.assertRaises(ValueError):
+            control._priorities("a:urgent")
+
+    def test_boolean_options(self):
+        "Read booleans as ConfigParser does"
+        self.assertTrue(control._boolean("Yes"))
+        self.assertFalse(control._boolean("off"))
+        with self.assertRaises(ValueError):
+            control._boolean("perhaps")
+
     def test_daemon(self):
         "Have we made us a Daemon?"
         self.assertIsInstance(self.cont.daemon, servers.ServerDaemon)
@@ -106,6 +164,30 @@ class ControllerTestCase(unittest.TestCase):
             self.cont.restart()
             Prestart.assert_called_once_with()
 
+    def test_profile(self):
+        """ Write the spec and signal the server to profile """
+        pidfile = tempfile.NamedTemporaryFile()
+        with patch.object(control.Controller, 'pidpath', pidfile.name):
+            cont = control.Controller(CONFFILE)
+            with patch.object(control.os, 'kill') as Pkill:
+                with patch.object(cont.daemon, 'running', return_value=False):
+                    cont.profile(seconds=5)
+                self.assertFalse(Pkill.called)
+                with patch.object(cont.daemon, 'running', return_value=True):
+                    with patch.object(servers.ServerDaemon, 'pid', 1234):
+                        cont.profile(seconds=5, requests=100)
+                Pkill.assert_called_once_with(1234, control.signal.SIGUSR1)
+        self.assertEqual(dict(seconds=5, requests=100), profiling.read_spec(pidfile.name))
+        os.remove(profiling.spec_path(pidfile.name))
+
+    def test_profile_args(self):
+        """ Parse the profile command """
+        args = control.ui().parse_args(["profile", CONFFILE, "--requests", "50"])
+        self.assertEqual((30, 50), (args.seconds, args.requests))
+        with patch.object(control.Controller, 'profile') as Pprofile:
+            args.func(args)
+            Pprofile.assert_called_once_with(seconds=30, requests=50)
+
 
 
 
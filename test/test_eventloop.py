@@ -0,0 +1,185 @@
+"""
+Unittests for the rpc.eventloop module
+"""
+import socket
+import sys
+import threading
+import time
+import unittest
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+
+from rpc import eventloop
+
+release = threading.Event()
+
+def app(environ, start_response):
+    if environ['PATH_INFO'] == '/block':
+        release.wait(5)
+    if environ['PATH_INFO'] == '/stream':
+        start_response('200 OK', [('Content-Type', 'text/plain')])
+        return iter(["one\n", "", "two\n"])
+    if environ['PATH_INFO'] == '/error':
+        raise ValueError("Oops")
+    body = environ['wsgi.input'].read()
+    start_response('200 OK', [('Content-Type', 'text/plain')])
+    return ["{0} {1} {2}".format(environ['REQUEST_METHOD'], environ['QUERY_STRING'], body)]
+
+
+class ParseHeadTestCase(unittest.TestCase):
+
+    def test_parse(self):
+        """ Request line and headers, names lowercased """
+        method, target, version, headers = eventloop._parse_head(
+            "POST /a?b=c HTTP/1.1\r\nHost: x\r\nX-Thing: 1\r\nx-thing: 2")
+        self.assertEqual(("POST", "/a?b=c", "HTTP/1.1"), (method, target, version))
+        self.assertEqual({'host': 'x', 'x-thing': '1,2'}, headers)
+
+    def test_invalid(self):
+        """ Raise ValueError for rubbish """
+        with self.assertRaises(ValueError):
+            eventloop._parse_head("rubbish")
+        with self.assertRaises(ValueError):
+            eventloop._parse_head("GET / HTTP/1.1\r\nno colon")
+
+
+class EventLoopWSGIServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.httpd = eventloop.EventLoopWSGIServer(('127.0.0.1', 0), app, workers=2)
+        self.thread = threading.Thread(target=self.httpd.serve_forever,
+                                       kwargs=dict(poll_interval=0.05))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def connect(self):
+        sock = socket.create_connection(self.httpd.server_address)
+        sock.settimeout(2)
+        return sock
+
+    def read(self, sock, until):
+        data = ''
+        while until not in data:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    def request(self, path="/", body="", version="HTTP/1.1", headers=""):
+        return "POST {0} {1}\r\nContent-Length: {2}\r\n{3}\r\n{4}".format(
+            path, version, len(body), headers, body)
+
+    def test_repr(self):
+        """ Stringify nicely """
+        self.assertTrue(str(self.httpd).startswith("<EventLoopWSGIServer on 127.0.0.1:"))
+
+    def test_keep_alive(self):
+        """ Answer several requests on one connection """
+        sock = self.connect()
+        for body in ["one", "two"]:
+            sock.sendall(self.request("/?q=1", body))
+            response = self.read(sock, "POST q=1 " + body)
+            self.assertTrue(response.startswith("HTTP/1.1 200 OK\r\n"))
+            self.assertTrue("Content-Length: 12\r\n" in response)
+            self.assertFalse("Connection: close" in response)
+
+    def test_pipelined(self):
+        """ Answer pipelined requests in order """
+        sock = self.connect()
+        sock.sendall(self.request(body="one") + self.request(body="two"))
+        response = self.read(sock, "POST  two")
+        self.assertTrue(response.index("POST  one") < response.index("POST  two"))
+
+    def test_http10(self):
+        """ Close HTTP/1.0 connections unless asked to keep them alive """
+        sock = self.connect()
+        sock.sendall(self.request(version="HTTP/1.0"))
+        response = self.read(sock, "\r\n\r\nPOST")
+        self.assertTrue("Connection: close\r\n" in response)
+        self.assertEqual('', sock.recv(10))
+        sock = self.connect()
+        sock.sendall(self.request(version="HTTP/1.0", headers="Connection: keep-alive\r\n"))
+        self.assertTrue("Connection: keep-alive\r\n" in self.read(sock, "POST"))
+
+    def test_chunked(self):
+        """ Stream responses of unknown length """
+        sock = self.connect()
+        sock.sendall(self.request("/stream"))
+        response = self.read(sock, "0\r\n\r\n")
+        head, body = response.split("\r\n\r\n", 1)
+        self.assertTrue("Transfer-Encoding: chunked" in head)
+        self.assertEqual("4\r\none\n\r\n4\r\ntwo\n\r\n0\r\n\r\n", body)
+
+    def test_bad_request(self):
+        """ Reject requests we can't parse """
+        sock = self.connect()
+        sock.sendall("rubbish\r\n\r\n")
+        self.assertTrue(self.read(sock, "\r\n\r\n").startswith("HTTP/1.1 400 Bad Request"))
+        sock = self.connect()
+        sock.sendall("POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n")
+        self.assertTrue(self.read(sock, "\r\n\r\n").startswith("HTTP/1.1 411"))
+
+    def test_bad_length(self):
+        """ Reject invalid lengths, and bodies over max_body before reading them """
+        for length, status in [("-5", "400"), ("ten", "400"), ("", "400"),
+                               (str(16 * 1024 * 1024 + 1), "413")]:
+            sock = self.connect()
+            sock.sendall("POST / HTTP/1.1\r\nContent-Length: {0}\r\n\r\n".format(length))
+            response = self.read(sock, "\r\n\r\n")
+            self.assertTrue(response.startswith("HTTP/1.1 " + status), response)
+
+    def test_large_body(self):
+        """ Read bodies arriving over many reads """
+        sock = self.connect()
+        body = "x" * (1024 * 1024)
+        sock.sendall(self.request(body=body))
+        response = self.read(sock, "POST  " + body)
+        self.assertTrue(response.startswith("HTTP/1.1 200 OK\r\n"))
+        self.assertTrue(response.endswith("POST  " + body))
+
+    def test_queue_size(self):
+        """ Answer requests beyond those workers and the queue can take with a 503 """
+        self.httpd.queue_size = 0
+        release.clear()
+        blocked = [self.connect() for i in range(2)]
+        for sock in blocked:
+            sock.sendall(self.request("/block"))
+        while self.httpd.outstanding < 2:
+            time.sleep(0.001)
+        sock = self.connect()
+        sock.sendall(self.request())
+        self.assertTrue(self.read(sock, "\r\n\r\n").startswith("HTTP/1.1 503 Service Unavailable"))
+        release.set()
+        for sock in blocked:
+            self.assertTrue(self.read(sock, "POST").startswith("HTTP/1.1 200 OK"))
+        while self.httpd.outstanding:
+            time.sleep(0.001)
+
+    def test_app_error(self):
+        """ 500 if the app raises """
+        sock = self.connect()
+        stderr, sys.stderr = sys.stderr, open('/dev/null', 'w')
+        try:
+            sock.sendall(self.request("/error"))
+            response = self.read(sock, "occurred.")
+        finally:
+            sys.stderr = stderr
+        self.assertTrue(response.startswith("HTTP/1.1 500 Internal Server Error"))
+
+    def test_idle_timeout(self):
+        """ Close idle connections """
+        sock = self.connect()
+        sock.sendall(self.request())
+        self.read(sock, "POST")
+        self.httpd.idle_timeout = 0
+        time.sleep(1.1)
+        self.assertEqual('', sock.recv(10))
+
+    def tearDown(self):
+        self.httpd.shutdown()
+        self.thread.join()
+        self.httpd.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,169 @@
+"""
+Unittests for the rpc.futures module
+"""
+import sys
+import threading
+import time
+import unittest
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+
+from rpc import exceptions, futures
+
+class FutureTestCase(unittest.TestCase):
+    def setUp(self):
+        self.f = futures.Future()
+
+    def test_repr(self):
+        """ Stringify nicely """
+        self.assertEqual("<Future pending>", str(self.f))
+        self.f.set_result(1)
+        self.assertEqual("<Future finished>", str(self.f))
+
+    def test_result(self):
+        """ Resolve successfully """
+        self.assertFalse(self.f.done())
+        self.f.set_result("pong!")
+        self.assertTrue(self.f.done())
+        self.assertEqual("pong!", self.f.result())
+        self.assertEqual(None, self.f.exception())
+
+    def test_exception(self):
+        """ Resolve with an error """
+        err = ValueError("Nope")
+        self.f.set_exception(err)
+        self.assertTrue(self.f.exception() is err)
+        with self.assertRaises(ValueError):
+            self.f.result()
+
+    def test_timeout(self):
+        """ Don't wait forever """
+        with self.assertRaises(exceptions.TimeoutError):
+            self.f.result(timeout=0.01)
+
+    def test_cancel(self):
+        """ Cancel calls which haven't started """
+        self.assertTrue(self.f.cancel())
+        self.assertTrue(self.f.cancelled())
+        self.assertFalse(self.f.start())
+        with self.assertRaises(exceptions.CancelledError):
+            self.f.result()
+
+    def test_cancel_running(self):
+        """ Can't cancel calls once they've started """
+        self.assertTrue(self.f.start())
+        self.assertFalse(self.f.cancel())
+        self.assertFalse(self.f.cancelled())
+
+    def test_resolve_once(self):
+        """ Only the first resolution counts """
+        called = []
+        self.f.add_done_callback(called.append)
+        self.f.set_result(1)
+        self.f.set_result(2)
+        self.f.set_exception(ValueError())
+        self.assertFalse(self.f.cancel())
+        self.assertEqual(1, self.f.result())
+        self.assertEqual([self.f], called)
+
+    def test_cancel_start_race(self):
+        """ A call is either cancelled or started, never both """
+        for i in range(200):
+            future = futures.Future()
+            started = []
+            thread = threading.Thread(target=lambda: started.append(future.start()))
+            thread.start()
+            cancelled = future.cancel()
+            thread.join(1)
+            self.assertNotEqual(cancelled, started[0])
+
+    def test_callbacks(self):
+        """ Run callbacks on completion """
+        called = []
+        self.f.add_done_callback(called.append)
+        self.assertEqual([], called)
+        self.f.set_result(1)
+        self.assertEqual([self.f], called)
+        self.f.add_done_callback(called.append)
+        self.assertEqual([self.f, self.f], called)
+
+
+class FirstTestCase(unittest.TestCase):
+
+    def test_first(self):
+        """ Return the first to complete """
+        one, two = futures.Future(), futures.Future()
+        threading.Timer(0.01, two.set_result, [2]).start()
+        self.assertTrue(two is futures.first([one, two], timeout=1))
+
+    def test_timeout(self):
+        """ None if nothing completes in time """
+        self.assertEqual(None, futures.first([futures.Future()], timeout=0.01))
+
+
+class ExecutorTestCase(unittest.TestCase):
+    def setUp(self):
+        self.e = futures.Executor(workers=2)
+
+    def test_repr(self):
+        """ Stringify nicely """
+        self.assertEqual("<Executor with 2 workers>", str(self.e))
+
+    def test_submit(self):
+        """ Run calls on workers """
+        future = self.e.submit(lambda x, y=1: x + y, 1, y=2)
+        self.assertEqual(3, future.result(timeout=1))
+
+    def test_submit_raises(self):
+        """ Exceptions end up on the Future """
+        def boom():
+            raise ValueError()
+        with self.assertRaises(ValueError):
+            self.e.submit(boom).result(timeout=1)
+
+    def test_bounded(self):
+        """ No more than `workers` calls at once """
+        lock = threading.Lock()
+        running = [0, 0]
+        def call():
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+        fs = [self.e.submit(call) for i in range(8)]
+        [f.result(timeout=1) for f in fs]
+        self.assertEqual(2, running[1])
+        self.assertEqual(2, len(self.e._threads))
+
+    def test_cancelled(self):
+        """ Skip cancelled calls """
+        called = []
+        future = futures.Future()
+        future.cancel()
+        self.e._queue.put((future, called.append, (1,), {}))
+        self.e.submit(called.append, 2).result(timeout=1)
+        self.assertEqual([2], called)
+
+    def test_contextmanager(self):
+        """ Shut down on exit """
+        with futures.Executor(workers=1) as e:
+            e.submit(int).result(timeout=1)
+            thread = e._threads[0]
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+
+    def test_submit_after_shutdown(self):
+        """ Refuse calls once shut down, without starting threads """
+        self.e.shutdown()
+        with self.assertRaises(RuntimeError):
+            self.e.submit(int)
+        self.assertEqual([], self.e._threads)
+
+    def tearDown(self):
+        self.e.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,7 +19,7 @@ class Handler(object):
 
 class ServerTestCase(unittest.TestCase):
     def setUp(self):
-        self.s = jsonp.Server('localhost', 55543, Handler)
+        self.s = jsonp.Server('localhost', 55543, Handler, codec="stdlib")
 
         self.mock_get = get = Mock(name="Mock GET")
         get.method = "GET"
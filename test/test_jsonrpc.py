@@ -1,14 +1,18 @@
 """
 Unittests for the rpc.jsonrpc module
 """
+import json
 import sys
+import threading
+import time
 import unittest
+import zlib
 if sys.version_info < (2, 7):
     import unittest2 as unittest
 
 from mock import patch, Mock
 
-from rpc import exceptions, jsonrpc
+from rpc import admission, caching, codecs, compression, exceptions, jsonrpc, servers
 
 class Handler(object):
     def ping(self):
@@ -17,6 +21,17 @@ class Handler(object):
     def sayhi(self, person):
         return "Hi " + person
 
+    def count(self, n):
+        for i in range(n):
+            yield i
+
+    def broken(self):
+        yield 1
+        raise ValueError("Oops")
+
+    def _secret(self):
+        return "Nope"
+
 class ClientTestCase(unittest.TestCase):
     def setUp(self):
         self.c = jsonrpc.Client("http://example.com")
@@ -39,16 +54,24 @@ class ClientTestCase(unittest.TestCase):
         c2 = jsonrpc.Client("http://example.com")
         self.assertEqual(True, c1==c2)
 
+    def test_pool(self):
+        """ Clients for the same host share a connection pool """
+        c1 = jsonrpc.Client("http://example.com/one")
+        c2 = jsonrpc.Client("http://example.com/two")
+        c3 = jsonrpc.Client("http://localhost/one")
+        self.assertTrue(c1._pool is c2._pool)
+        self.assertFalse(c1._pool is c3._pool)
+
     def test_get(self):
         """ Make a GET request """
-        with patch.object(jsonrpc.requests, "get") as Pget:
+        with patch.object(self.c._pool.session, "get") as Pget:
             self.c._get({}, "PAYLOAD")
             Pget.assert_called_with(self.c.url, params="PAYLOAD",
                                     headers={}, timeout=self.c.timeout)
 
     def test_post(self):
         """ Make a GET request """
-        with patch.object(jsonrpc.requests, "post") as Pget:
+        with patch.object(self.c._pool.session, "post") as Pget:
             self.c._post({}, "PAYLOAD")
             Pget.assert_called_with(self.c.url, data="PAYLOAD",
                                     headers={}, timeout=self.c.timeout)
@@ -61,15 +84,71 @@ class ClientTestCase(unittest.TestCase):
     def test_build_payload(self):
         """ Should return JSON payload """
         cases = [
-            (('ping', ), {'params': '[]', 'method': '"ping"', 'id': '"HAI"'}),
-            (('sayhi', "David"), {'params': '["David"]', 'method': '"sayhi"', 'id': '"HAI"'})
+            (('ping', ), {'params': '[]', 'method': '"ping"', 'id': '0'}),
+            (('sayhi', "David"), {'params': '["David"]', 'method': '"sayhi"', 'id': '1'}),
+            (('ping', ), {'params': '[]', 'method': '"ping"', 'id': '2'})
             ]
-        with patch.object(jsonrpc.uuid, "uuid4") as Puid:
-            Puid.return_value.hex = "HAI"
-            for args, resp in cases:
-                reqid, payload = self.c._build_payload(self.c, *args)
-                self.assertEqual("HAI", reqid)
-                self.assertEqual(resp, payload)
+        for i, (args, resp) in enumerate(cases):
+            reqid, payload = self.c._build_payload(self.c, *args)
+            self.assertEqual(i, reqid)
+            self.assertEqual(resp, payload)
+
+    def test_envelope(self):
+        """ Compute the constant parts of a call once """
+        with patch.object(self.c.codec, "dumps") as Pdumps:
+            Pdumps.return_value = '"ping"'
+            self.assertEqual(('"ping"', '{"method": "ping", "params": '),
+                             self.c._envelope("ping"))
+            self.c._envelope("ping")
+            Pdumps.assert_called_once_with("ping")
+
+    def test_wire(self):
+        """ Only form and json wire formats """
+        self.assertEqual("form", self.c.wire)
+        self.assertEqual("json", jsonrpc.Client("localhost", wire="json").wire)
+        with self.assertRaises(ValueError):
+            jsonrpc.Client("localhost", wire="xml")
+        with self.assertRaises(ValueError):
+            jsonrpc.Client("localhost", wire="json", codec="msgpack")
+
+    def test_build_payload_json(self):
+        """ Should return one JSON body """
+        c = jsonrpc.Client("http://example.com", wire="json")
+        for reqid in range(2):
+            self.assertEqual((reqid, '{"method": "sayhi", "params": ["David"], "id": %d}' % reqid),
+                             c._build_payload(c, "sayhi", "David"))
+
+    def test_build_payload_json_get(self):
+        """ GET requests can't have bodies """
+        c = jsonrpc.Client("http://example.com", wire="json", verb="GET")
+        reqid, payload = c._build_payload(c, "ping")
+        self.assertEqual('"ping"', payload['method'])
+
+    def test_send_json(self):
+        """ Set the content type for JSON bodies """
+        with patch.object(self.c, "_post") as Ppost:
+            self.c._send('{}')
+            Ppost.assert_called_once_with(
+                {'X-flavour': 'JSONRPC', 'Content-Type': 'application/json'}, '{}')
+
+    def test_send_compressed(self):
+        """ Compress JSON bodies once the server accepts them """
+        c = jsonrpc.Client("http://example.com", wire="json",
+                           compression=compression.Compression(threshold=5))
+        with patch.object(c, "_post") as Ppost:
+            Ppost.return_value.headers = {'Accept-Encoding': 'deflate'}
+            c._send('{"id": 1}')
+            headers, payload = Ppost.call_args[0]
+            self.assertEqual('{"id": 1}', payload)
+            self.assertEqual('gzip, deflate', headers['Accept-Encoding'])
+            self.assertEqual('deflate', c._encoding)
+            c._send('{"id": 2}')
+            headers, payload = Ppost.call_args[0]
+            self.assertEqual('deflate', headers['Content-Encoding'])
+            self.assertEqual('{"id": 2}', zlib.decompress(payload))
+            c._send('{}')
+            headers, payload = Ppost.call_args[0]
+            self.assertEqual('{}', payload)
 
     # !!! apicall
 
@@ -89,6 +168,15 @@ class ClientTestCase(unittest.TestCase):
         with self.assertRaises(exceptions.RemoteError):
             self.c._parse_resp("FOO", resp)
 
+    def test_parse_response_503(self):
+        """ Raise OverloadedError when the server sheds our call """
+        resp = Mock(name="Mock Response")
+        resp.content = '503 Service Unavailable'
+        resp.status_code = 503
+        with self.assertRaises(exceptions.OverloadedError):
+            self.c._parse_resp("FOO", resp)
+        self.assertIn(exceptions.OverloadedError, self.c.unsent)
+
     def test_parse_response_invalid_json(self):
         """ Deal gracefully with an invaldi JSON response """
         resp = Mock(name="Mock Response")
@@ -105,12 +193,186 @@ class ClientTestCase(unittest.TestCase):
         with self.assertRaises(exceptions.IdError):
             self.c._parse_resp("FOO2", resp)
 
+    def test_codec(self):
+        """ Serialize with our codec """
+        c = jsonrpc.Client("http://example.com", codec=codecs.JSONCodec())
+        self.assertEqual(codecs.JSONCodec(), c.codec)
+        self.assertEqual(codecs.json_codec(), self.c.codec)
+        with patch.object(c.codec, "dumps") as Pdumps:
+            Pdumps.return_value = "DUMPED"
+            reqid, payload = c._build_payload(c, "ping")
+        self.assertEqual(dict(id="0", method="DUMPED", params="DUMPED"), payload)
+
+    def test_cache(self):
+        """ Don't cache JSON RPC errors """
+        c = jsonrpc.Client("http://example.com", cache=caching.ResponseCache())
+        with patch.object(c, "_apicall") as Papi:
+            Papi.return_value = dict(result=None, error="Nope")
+            c.ping()
+            c.ping()
+            self.assertEqual(2, Papi.call_count)
+            Papi.return_value = dict(result="pong!", error=None)
+            c.ping()
+            c.ping()
+            self.assertEqual(3, Papi.call_count)
+
+    def stream_resp(self, lines, content_type='application/x-ndjson'):
+        resp = Mock(name="Mock Response")
+        resp.headers = {'Content-Type': content_type}
+        resp.iter_lines.return_value = lines
+        return resp
+
+    def test_stream(self):
+        """ Iterate over a streamed result """
+        resp = self.stream_resp(['[1]', '[{"a": 2}]', '', '{"id": 0, "result": null, "error": null}'])
+        with patch.object(self.c._pool.session, "request") as Preq:
+            Preq.return_value = resp
+            self.assertEqual([1, {'a': 2}], list(self.c.stream("count", 2)))
+            args, kwargs = Preq.call_args
+        self.assertEqual(("POST", self.c.url), args)
+        self.assertTrue(kwargs['stream'])
+        self.assertEqual('[2]', kwargs['data']['params'])
+        self.assertEqual('application/x-ndjson', kwargs['headers']['Accept'])
+        resp.close.assert_called_once_with()
+
+    def test_stream_error(self):
+        """ Raise errors from part way through a stream """
+        lines = ['[1]', '{"id": 0, "result": null, "error": "ValueError: Oops"}']
+        items = self.c._iter_stream(0, self.stream_resp(lines))
+        self.assertEqual(1, next(items))
+        with self.assertRaises(exceptions.RemoteError):
+            next(items)
+
+    def test_stream_truncated(self):
+        """ Streams should end with a response object """
+        items = self.c._iter_stream(0, self.stream_resp(['[1]']))
+        self.assertEqual(1, next(items))
+        with self.assertRaises(exceptions.IndecipherableResponseError):
+            next(items)
+
+    def test_stream_unstreamed(self):
+        """ Iterate over results which weren't streamed """
+        resp = self.stream_resp([], content_type='application/json')
+        resp.status_code = 200
+        resp.text = '{"id": 0, "result": [1, 2], "error": null}'
+        self.assertEqual([1, 2], list(self.c._iter_stream(0, resp)))
+        resp.text = '{"id": 0, "result": null, "error": "Oops"}'
+        with self.assertRaises(exceptions.RemoteError):
+            list(self.c._iter_stream(0, resp))
+
     def test_imply_http(self):
         """ If no protocol is specified default to http """
         c = jsonrpc.Client("localhost/jsonrpc")
         self.assertEqual('http://localhost/jsonrpc', c.url)
 
 
+class BatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.c = jsonrpc.Client("http://example.com")
+
+    def mock_send(self, text):
+        resp = Mock(name="Mock Response")
+        resp.text = text
+        resp.status_code = 200
+        return patch.object(self.c, "_send", return_value=resp)
+
+    def test_queue(self):
+        """ Calls are queued, not sent """
+        with patch.object(self.c, "_send") as Psend:
+            b = self.c.batch()
+            future = b.ping()
+            self.assertFalse(future.done())
+            self.assertEqual([future], b.results)
+            self.assertEqual(0, Psend.call_count)
+
+    def test_send(self):
+        """ Send one request and resolve each call """
+        text = ('[{"id": 1, "result": "Hi David", "error": null},'
+                ' {"id": 0, "result": "pong!", "error": null}]')
+        with self.mock_send(text) as Psend:
+            with self.c.batch() as b:
+                one = b.ping()
+                two = b.sayhi("David")
+            self.assertEqual(1, Psend.call_count)
+        payload = Psend.call_args[0][0]
+        self.assertEqual([dict(id=0, method="ping", params=[]),
+                          dict(id=1, method="sayhi", params=["David"])],
+                         json.loads(payload['batch']))
+        self.assertEqual(dict(result="pong!", error=None), one.result())
+        self.assertEqual(dict(result="Hi David", error=None), two.result())
+
+    def test_missing_id(self):
+        """ Calls without a result get an IdError """
+        with self.mock_send('[]'):
+            with self.c.batch() as b:
+                future = b.ping()
+        with self.assertRaises(exceptions.IdError):
+            future.result()
+
+    def test_remote_error(self):
+        """ Errors for the whole batch resolve every call """
+        with self.mock_send('{"id": null, "result": null, "error": "Invalid batch"}'):
+            with self.c.batch() as b:
+                future = b.ping()
+        with self.assertRaises(exceptions.RemoteError):
+            future.result()
+
+    def test_send_json(self):
+        """ Send batches as a JSON array body """
+        self.c = jsonrpc.Client("http://example.com", wire="json")
+        with self.mock_send('[]') as Psend:
+            with self.c.batch() as b:
+                b.ping()
+        calls = json.loads(Psend.call_args[0][0])
+        self.assertEqual("ping", calls[0]['method'])
+
+    def test_exception_dont_send(self):
+        """ Leave unsent if the with block raised """
+        with patch.object(self.c, "_send") as Psend:
+            with self.assertRaises(ValueError):
+                with self.c.batch() as b:
+                    b.ping()
+                    raise ValueError()
+            self.assertEqual(0, Psend.call_count)
+
+
+class AsyncClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.c = jsonrpc.AsyncClient("http://async.example.com", concurrency=4)
+
+    def test_init(self):
+        """ Set initial attributes """
+        self.assertEqual("http://async.example.com", self.c.url)
+        self.assertEqual(4, self.c.concurrency)
+        self.assertEqual(4, self.c._executor.workers)
+        self.assertEqual(4, self.c._pool.maxconns)
+
+    def test_apicall(self):
+        """ Calls return Futures """
+        with patch.object(jsonrpc.Client, "_apicall") as Pcall:
+            Pcall.return_value = dict(result="pong!", error=None)
+            future = self.c.ping()
+            self.assertEqual(dict(result="pong!", error=None), future.result(timeout=1))
+            Pcall.assert_called_once_with(self.c, self.c, "ping")
+
+    def test_contextmanager(self):
+        """ Close on exit """
+        with patch.object(self.c, "close") as Pclose:
+            with self.c as c:
+                self.assertTrue(c is self.c)
+            Pclose.assert_called_once_with()
+
+    def test_closed(self):
+        """ Refuse calls once closed """
+        self.c.close()
+        with self.assertRaises(RuntimeError):
+            self.c.ping()
+        self.assertEqual([], self.c._executor._threads)
+
+    def tearDown(self):
+        self.c.close()
+
+
 class ChainTestCase(unittest.TestCase):
     def setUp(self):
         pass
@@ -125,12 +387,133 @@ class ChainTestCase(unittest.TestCase):
         pass
 
 
+class MemoHandler(object):
+    def __init__(self):
+        self.calls = 0
+        self.data = {'a': 1}
+
+    @servers.memoize
+    def lookup(self, key):
+        self.calls += 1
+        return self.data[key]
+
+    @servers.invalidates('lookup')
+    def store(self, key, value):
+        self.data[key] = value
+
+    def plain(self):
+        self.calls += 1
+        return "plain"
+
+
+class CoalesceHandler(object):
+    def __init__(self):
+        self.calls = 0
+        self.release = threading.Event()
+
+    @servers.coalesce
+    def slow(self, n):
+        self.calls += 1
+        self.release.wait(5)
+        return iter(range(n))
+
+
+class CoalesceTestCase(unittest.TestCase):
+    def test_coalesce(self):
+        """ Identical concurrent calls share one call's result """
+        s = jsonrpc.Server('localhost', 55543, CoalesceHandler, codec="stdlib")
+        responses = []
+        threads = [threading.Thread(target=lambda i=i: responses.append(s._dispatch("slow", [2], i)))
+                   for i in range(5)]
+        for thread in threads:
+            thread.start()
+        while s.flights.calls < 5:
+            time.sleep(0.001)
+        s.handler.release.set()
+        for thread in threads:
+            thread.join(5)
+        self.assertEqual(1, s.handler.calls)
+        self.assertEqual(range(5), sorted(r['id'] for r in responses))
+        self.assertEqual([[0, 1]] * 5, [r['result'] for r in responses])
+
+
+class MemoizeTestCase(unittest.TestCase):
+    def setUp(self):
+        self.s = jsonrpc.Server('localhost', 55543, MemoHandler, codec="stdlib")
+
+    def call(self, method, *params):
+        return self.s.parse_response(None, self.s._call(dict(method=method, params=params, id=1)))
+
+    def test_default_cache(self):
+        """ Make a cache for handlers with memoized methods """
+        self.assertIsInstance(self.s.cache, caching.ResponseCache)
+        self.assertEqual(None, jsonrpc.Server('localhost', 55543, Handler).cache)
+
+    def test_hit(self):
+        """ Skip the handler and serialization on a hit """
+        self.assertEqual({"id": 1, "result": 1, "error": None}, json.loads(self.call("lookup", "a")))
+        with patch.object(self.s.codec, 'dumps', wraps=self.s.codec.dumps) as Pdumps:
+            self.assertEqual({"id": 1, "result": 1, "error": None},
+                             json.loads(self.call("lookup", "a")))
+            Pdumps.assert_called_once_with(1)
+        self.assertEqual(1, self.s.handler.calls)
+        self.assertEqual((1, 1), (self.s.cache.hits, self.s.cache.misses))
+
+    def test_errors(self):
+        """ Don't cache errors """
+        self.assertEqual("KeyError: b", json.loads(self.call("lookup", "b"))['error'])
+        self.assertEqual("KeyError: b", json.loads(self.call("lookup", "b"))['error'])
+        self.assertEqual(2, self.s.handler.calls)
+        self.assertEqual(0, len(self.s.cache))
+
+    def test_invalidates(self):
+        """ Drop cached results when invalidating methods are called """
+        self.call("lookup", "a")
+        self.call("store", "a", 2)
+        self.assertEqual(2, json.loads(self.call("lookup", "a"))['result'])
+        self.s.invalidate()
+        self.call("lookup", "a")
+        self.assertEqual(3, self.s.handler.calls)
+
+    def test_invalidated_while_running(self):
+        """ Don't cache a result computed before an invalidating call """
+        lookup = self.s.table['lookup'].fn
+        def racing(key):
+            result = lookup(key)
+            self.call("store", key, 2)
+            return result
+        self.s.table['lookup'].fn = racing
+        self.assertEqual(1, json.loads(self.call("lookup", "a"))['result'])
+        self.s.table['lookup'].fn = lookup
+        self.assertEqual(2, json.loads(self.call("lookup", "a"))['result'])
+
+    def test_ttls(self):
+        """ Memoize the methods a cache's ttls name """
+        cache = caching.ResponseCache(ttls={'plain': 30})
+        s = jsonrpc.Server('localhost', 55543, MemoHandler, cache=cache)
+        self.assertTrue(s.table['plain'].memoized)
+        s._dispatch("plain", [], 1)
+        s._dispatch("plain", [], 2)
+        self.assertEqual(1, s.handler.calls)
+
+    def test_batch(self):
+        """ Answer calls in batches from the cache """
+        calls = [dict(method="lookup", params=["a"], id=1), dict(method="lookup", params=["a"], id=2)]
+        expected = [dict(id=1, result=1, error=None), dict(id=2, result=1, error=None)]
+        self.assertEqual(expected, self.s._batch(calls))
+        self.assertEqual(1, self.s.handler.calls)
+
+    def tearDown(self):
+        self.s.close()
+
+
 class ServerTestCase(unittest.TestCase):
     def setUp(self):
-        self.s = jsonrpc.Server('localhost', 55543, Handler)
+        self.s = jsonrpc.Server('localhost', 55543, Handler, codec="stdlib")
 
         self.mock_post = post = Mock(name="Mock POST")
         post.method = "POST"
+        post.headers = {}
 
     def test_contextmanager(self):
         """ Can we use as a contextmanager """
@@ -149,6 +532,144 @@ class ServerTestCase(unittest.TestCase):
         expected = dict(id='FAKEID', result='pong!', error=None)
         self.assertEqual(expected, content)
 
+    def test_procedure_not_found(self):
+        """ Unknown methods are an error """
+        self.mock_post.POST = dict(method='"pang"', params='[]', id='"FAKEID"')
+        status, headers, content = self.s.procedure(self.mock_post)
+        self.assertEqual('FAKEID', content['id'])
+        self.assertEqual(None, content['result'])
+        self.assertTrue(content['error'].startswith('Method "pang"'))
+
+    def test_procedure_private(self):
+        """ Private and non-callable attributes are not methods """
+        for name in ['"__init__"', '"_secret"', '"__class__"']:
+            self.mock_post.POST = dict(method=name, params='[]', id='1')
+            content = self.s.procedure(self.mock_post)[2]
+            self.assertTrue(content['error'].startswith('Method '))
+
+    def test_procedure_arity(self):
+        """ Reject calls with the wrong number of arguments before calling """
+        self.mock_post.POST = dict(method='"sayhi"', params='["David", 2]', id='1')
+        content = self.s.procedure(self.mock_post)[2]
+        self.assertEqual("TypeError: sayhi() takes exactly 1 argument (2 given)",
+                         content['error'])
+
+    def test_procedure_overloaded(self):
+        """ Let shed calls reach the app, to be answered with a 503 """
+        self.s.admission = admission.AdmissionControl(limit=0, queue=0)
+        self.mock_post.POST = dict(method='"ping"', params='[]', id='1')
+        with self.assertRaises(exceptions.OverloadedError):
+            self.s.procedure(self.mock_post)
+
+    def test_procedure_batch_overloaded(self):
+        """ Answer calls shed once a batch has started with errors of their own """
+        calls = [dict(method="ping", params=[], id=1), dict(method="ping", params=[], id=2)]
+        self.mock_post.POST = dict(batch=json.dumps(calls))
+        shed = admission._Shed("Too busy to call ping", 1)
+        with patch.object(self.s, 'invoke', side_effect=["pong", shed]):
+            status, headers, content = self.s.procedure(self.mock_post)
+        self.assertEqual('200 OK', status)
+        self.assertEqual([dict(id=1, result="pong", error=None),
+                          dict(id=2, result=None,
+                               error="OverloadedError: Too busy to call ping")], content)
+        with patch.object(self.s, 'invoke', side_effect=shed):
+            with self.assertRaises(exceptions.OverloadedError):
+                self.s.procedure(self.mock_post)
+
+    def test_procedure_handler_overloaded(self):
+        """ Answer OverloadedErrors the handler raises like any other error """
+        self.mock_post.POST = dict(method='"ping"', params='[]', id='1')
+        busy = exceptions.OverloadedError("Downstream is busy")
+        with patch.object(self.s.table['ping'], 'fn', side_effect=busy):
+            status, headers, content = self.s.procedure(self.mock_post)
+        self.assertEqual('200 OK', status)
+        self.assertEqual("OverloadedError: Downstream is busy", content['error'])
+
+    def test_procedure_list_methods(self):
+        """ List our methods """
+        self.mock_post.POST = dict(method='"system.listMethods"', params='[]', id='1')
+        content = self.s.procedure(self.mock_post)[2]
+        self.assertEqual(['broken', 'count', 'ping', 'sayhi', 'system.listMethods'],
+                         content['result'])
+
+    def test_procedure_batch(self):
+        """ Dispatch each call in a batch """
+        calls = [dict(method="ping", params=[], id=1),
+                 dict(method="sayhi", params=["David"], id=2),
+                 "rubbish"]
+        self.mock_post.POST = dict(batch=json.dumps(calls))
+        status, headers, content = self.s.procedure(self.mock_post)
+        self.assertEqual('200 OK', status)
+        expected = [dict(id=1, result='pong!', error=None),
+                    dict(id=2, result='Hi David', error=None),
+                    dict(id=None, result=None, error='Invalid call')]
+        self.assertEqual(expected, content)
+
+    def test_procedure_empty_batch(self):
+        """ Empty batches are invalid """
+        self.mock_post.POST = dict(batch='[]')
+        status, headers, content = self.s.procedure(self.mock_post)
+        self.assertEqual(dict(id=None, result=None, error='Invalid batch'), content)
+
+    def test_procedure_json(self):
+        """ Accept application/json request bodies """
+        self.mock_post.content_type = 'application/json'
+        self.mock_post.body = '{"method": "sayhi", "params": ["David"], "id": 3}'
+        status, headers, content = self.s.procedure(self.mock_post)
+        self.assertEqual(dict(id=3, result='Hi David', error=None), content)
+
+    def test_procedure_json_batch(self):
+        """ Accept batches as application/json request bodies """
+        self.mock_post.content_type = 'application/json'
+        self.mock_post.body = '[{"method": "ping", "id": 1}, {"method": "ping", "id": 2}]'
+        status, headers, content = self.s.procedure(self.mock_post)
+        self.assertEqual([1, 2], [r['id'] for r in content])
+
+    def test_procedure_json_invalid(self):
+        """ Deal gracefully with bad JSON bodies """
+        self.mock_post.content_type = 'application/json'
+        self.mock_post.body = '{"method": '
+        status, headers, content = self.s.procedure(self.mock_post)
+        self.assertEqual(dict(id=None, result=None, error='Invalid JSON'), content)
+
+    def test_procedure_stream(self):
+        """ Stream the results of generators to clients which accept streams """
+        self.mock_post.headers = {'Accept': 'application/x-ndjson'}
+        self.mock_post.POST = dict(method='"count"', params='[3]', id='7')
+        status, headers, content = self.s.procedure(self.mock_post)
+        self.assertIsInstance(content, servers.Stream)
+        self.assertEqual(7, content.reqid)
+        lines = list(self.s.stream_lines(self.mock_post, content))
+        self.assertEqual(['[0]\n', '[1]\n', '[2]\n',
+                          '{"error": null, "id": 7, "result": null}\n'], lines)
+
+    def test_procedure_stream_error(self):
+        """ End the stream with errors raised while streaming """
+        self.mock_post.headers = {'Accept': 'application/x-ndjson'}
+        self.mock_post.POST = dict(method='"broken"', params='[]', id='7')
+        status, headers, content = self.s.procedure(self.mock_post)
+        lines = list(self.s.stream_lines(self.mock_post, content))
+        self.assertEqual('[1]\n', lines[0])
+        self.assertEqual("ValueError: Oops", json.loads(lines[1])['error'])
+
+    def test_procedure_unstreamed(self):
+        """ Gather the results of generators for clients which don't stream """
+        self.mock_post.POST = dict(method='"count"', params='[3]', id='7')
+        status, headers, content = self.s.procedure(self.mock_post)
+        self.assertEqual(dict(id=7, result=[0, 1, 2], error=None), content)
+        self.mock_post.POST = dict(method='"broken"', params='[]', id='8')
+        status, headers, content = self.s.procedure(self.mock_post)
+        self.assertEqual(dict(id=8, result=None, error="ValueError: Oops"), content)
+
+    def test_procedure_batch_stream(self):
+        """ Gather streams in batches """
+        calls = [dict(method="count", params=[2], id=1), dict(method="broken", id=2)]
+        self.mock_post.POST = dict(batch=json.dumps(calls))
+        status, headers, content = self.s.procedure(self.mock_post)
+        expected = [dict(id=1, result=[0, 1], error=None),
+                    dict(id=2, result=None, error="ValueError: Oops")]
+        self.assertEqual(expected, content)
+
     def test_parse_response(self):
         """ Jsonify our response """
         data = dict(id='FAKEID', result='pong!', error=None)
@@ -156,6 +677,11 @@ class ServerTestCase(unittest.TestCase):
         expected = '{"error": null, "id": "FAKEID", "result": "pong!"}'
         self.assertEqual(expected, self.s.parse_response(self.mock_post, data))
 
+    def test_codec(self):
+        """ Default to the fastest JSON codec """
+        with jsonrpc.Server('localhost', 666, Handler) as s:
+            self.assertEqual(codecs.json_codec(), s.codec)
+
     def tearDown(self):
         self.s.close()
 
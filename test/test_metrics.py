@@ -0,0 +1,92 @@
+"""
+Unittests for the rpc.metrics module
+"""
+import multiprocessing
+import sys
+import unittest
+import urllib2
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+
+from rpc import metrics
+
+class CounterTestCase(unittest.TestCase):
+    def test_inc(self):
+        """ Count up """
+        counter = metrics.Counter()
+        counter.inc()
+        counter.inc(2)
+        self.assertEqual(3, counter.value)
+        self.assertEqual("<Counter 3>", str(counter))
+
+
+class HistogramTestCase(unittest.TestCase):
+    def setUp(self):
+        self.histogram = metrics.Histogram(bounds=(0.01, 0.1, 1))
+
+    def test_observe(self):
+        """ Count observations into buckets, bounds inclusive """
+        for value in [0.005, 0.01, 0.05, 0.5, 5]:
+            self.histogram.observe(value)
+        self.assertEqual([(0.01, 2), (0.1, 3), (1, 4), ('+Inf', 5)], self.histogram.buckets())
+        self.assertEqual(5, self.histogram.count)
+        self.assertAlmostEqual(5.565, self.histogram.sum)
+        self.assertEqual("<Histogram of 5 observations>", str(self.histogram))
+
+    def test_shared(self):
+        """ Count observations made in child processes """
+        child = multiprocessing.Process(target=self.histogram.observe, args=(0.05,))
+        child.start()
+        child.join(5)
+        self.assertEqual(1, self.histogram.count)
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.metrics = metrics.Metrics(buckets=(0.1, 1))
+
+    def test_method(self):
+        """ Make each method's metrics once """
+        timing, errors = self.metrics.method("ping")
+        self.assertIsInstance(timing, metrics.Histogram)
+        self.assertIsInstance(errors, metrics.Counter)
+        self.assertEqual((timing, errors), self.metrics.method("ping"))
+        self.assertEqual("<Metrics for 1 methods>", str(self.metrics))
+
+    def test_exposition(self):
+        """ Format metrics in the Prometheus text format """
+        timing, errors = self.metrics.method('say"hi')
+        timing.observe(0.5)
+        errors.inc()
+        self.metrics.decode.observe(0.05)
+        lines = self.metrics.exposition().splitlines()
+        self.assertEqual(["# HELP rpc_decode_seconds Time spent decoding requests.",
+                          "# TYPE rpc_decode_seconds histogram",
+                          'rpc_decode_seconds_bucket{le="0.1"} 1',
+                          'rpc_decode_seconds_bucket{le="1"} 1',
+                          'rpc_decode_seconds_bucket{le="+Inf"} 1',
+                          'rpc_decode_seconds_sum 0.05',
+                          'rpc_decode_seconds_count 1'], lines[:7])
+        self.assertIn('rpc_handler_seconds_bucket{le="0.1",method="say\\"hi"} 0', lines)
+        self.assertIn('rpc_handler_seconds_bucket{le="1",method="say\\"hi"} 1', lines)
+        self.assertIn('rpc_encode_seconds_count 0', lines)
+        self.assertIn('rpc_queue_seconds_count 0', lines)
+        self.assertEqual('rpc_handler_errors_total{method="say\\"hi"} 1', lines[-1])
+
+    def test_serve(self):
+        """ Serve metrics over HTTP """
+        httpd = metrics.serve(self.metrics, "localhost", 0)
+        try:
+            url = "http://localhost:{0}".format(httpd.server_address[1])
+            response = urllib2.urlopen(url + "/metrics?x=1")
+            self.assertEqual(metrics.CONTENT_TYPE, response.info()['Content-Type'])
+            self.assertEqual(self.metrics.exposition(), response.read())
+            with self.assertRaises(urllib2.HTTPError):
+                urllib2.urlopen(url + "/other")
+        finally:
+            httpd.shutdown()
+            httpd.server_close()
+
+
+if __name__ == '__main__':
+    unittest.main()
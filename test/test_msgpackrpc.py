@@ -0,0 +1,173 @@
+"""
+Unittests for the rpc.msgpackrpc module
+"""
+import sys
+import unittest
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+
+import msgpack
+from mock import patch, Mock
+
+from rpc import caching, exceptions, msgpackrpc, servers
+
+class Handler(object):
+    def ping(self):
+        return "pong!"
+
+    def sayhi(self, person):
+        return "Hi " + person
+
+    def boom(self):
+        raise ValueError("Nope")
+
+class MemoHandler(object):
+    def __init__(self):
+        self.calls = 0
+        self.data = {'a': 1}
+
+    @servers.memoize
+    def lookup(self, key):
+        self.calls += 1
+        return self.data[key]
+
+    @servers.invalidates('lookup')
+    def store(self, key, value):
+        self.data[key] = value
+
+def packed(message):
+    return msgpack.packb(message, use_bin_type=True)
+
+class ClientTestCase(unittest.TestCase):
+    def setUp(self):
+        self.c = msgpackrpc.Client("http://example.com")
+
+    def mock_resp(self, content, status=200):
+        resp = Mock(name="Mock Response")
+        resp.content = content
+        resp.status_code = status
+        return resp
+
+    def test_init(self):
+        """ Set initial attributes """
+        c = msgpackrpc.Client("localhost/msgpack", timeout=2)
+        self.assertEqual("http://localhost/msgpack", c.url)
+        self.assertEqual(2, c.timeout)
+        self.assertEqual("msgpack", c.codec.name)
+
+    def test_repr(self):
+        """ Stringify nicely """
+        self.assertEqual("<MessagePack RPC Client for http://example.com>", str(self.c))
+
+    def test_equal(self):
+        """ Equality tests """
+        self.assertEqual(self.c, msgpackrpc.Client("http://example.com"))
+
+    def test_build_payload(self):
+        """ Pack a request message with an incrementing msgid """
+        msgid, payload = self.c._build_payload(self.c, "sayhi", "David")
+        self.assertEqual([0, msgid, "sayhi", ["David"]], msgpack.unpackb(payload, raw=False))
+        self.assertEqual(msgid + 1, self.c._build_payload(self.c, "ping")[0])
+
+    def test_payload_kwargs(self):
+        """ Should raise """
+        with self.assertRaises(ValueError):
+            self.c._build_payload(None, "ping", somearg=True)
+
+    def test_apicall(self):
+        """ POST the packed call """
+        with patch.object(self.c._pool.session, "post") as Ppost:
+            Ppost.return_value = self.mock_resp(packed([1, 0, None, "pong!"]))
+            self.assertEqual(dict(result="pong!", error=None), self.c.ping())
+            args, kwargs = Ppost.call_args
+            self.assertEqual('application/x-msgpack', kwargs['headers']['Content-Type'])
+
+    def test_parse_response_500(self):
+        """ Deal gracefully with 500 errors """
+        with self.assertRaises(exceptions.RemoteError):
+            self.c._parse_resp(0, self.mock_resp("Server error", status=500))
+
+    def test_parse_response_invalid(self):
+        """ Deal gracefully with responses that aren't MessagePack-RPC """
+        for content in ["\xc1", packed([0, 1, "ping", []]), packed({})]:
+            with self.assertRaises(exceptions.IndecipherableResponseError):
+                self.c._parse_resp(1, self.mock_resp(content))
+
+    def test_wrong_id(self):
+        """ Raise due to wrong ID """
+        with self.assertRaises(exceptions.IdError):
+            self.c._parse_resp(2, self.mock_resp(packed([1, 1, None, "pong!"])))
+
+
+class ChainTestCase(unittest.TestCase):
+
+    def test_chain(self):
+        """ Chain MessagePack RPC Clients"""
+        one, two = msgpackrpc.chain("localhost").chain("example.com")
+        self.assertEqual(one.url, "http://localhost")
+        self.assertEqual(two.url, "http://example.com")
+
+
+class ServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.s = msgpackrpc.Server('localhost', 55544, Handler)
+        self.mock_post = post = Mock(name="Mock POST")
+        post.method = "POST"
+
+    def call(self, message):
+        self.mock_post.body = packed(message)
+        return self.s.procedure(self.mock_post)
+
+    def test_codec(self):
+        """ Default to MessagePack """
+        self.assertEqual("msgpack", self.s.codec.name)
+
+    def test_procedure(self):
+        """ Simple passing case """
+        status, headers, content = self.call([0, 7, "sayhi", ["David"]])
+        self.assertEqual('200 OK', status)
+        self.assertEqual([('Content-Type', 'application/x-msgpack')], headers)
+        self.assertEqual([1, 7, None, "Hi David"], content)
+
+    def test_procedure_errors(self):
+        """ Report errors in the response message """
+        self.assertEqual([1, 1, 'Method "pang" Not Found... ', None],
+                         self.call([0, 1, "pang", []])[2])
+        self.assertEqual([1, 2, 'ValueError: Nope', None],
+                         self.call([0, 2, "boom", []])[2])
+        self.assertEqual([1, None, 'Invalid request', None],
+                         self.call([1, 3, "ping", []])[2])
+        self.assertEqual([1, 4, 'TypeError: ping() takes exactly 0 arguments (1 given)', None],
+                         self.call([0, 4, "ping", [1]])[2])
+
+    def test_procedure_invalid(self):
+        """ Deal gracefully with bad bodies and verbs """
+        self.mock_post.body = "\xc1"
+        self.assertEqual([1, None, 'Invalid MessagePack', None],
+                         self.s.procedure(self.mock_post)[2])
+        self.mock_post.method = "GET"
+        self.assertEqual(None, self.s.procedure(self.mock_post)[2][1])
+
+    def test_memoize(self):
+        """ Answer memoized methods from the cache until invalidated """
+        self.s.close()
+        self.s = s = msgpackrpc.Server('localhost', 55544, MemoHandler)
+        self.assertIsInstance(s.cache, caching.ResponseCache)
+        self.assertEqual([1, 1, None, 1], self.call([0, 1, "lookup", ["a"]])[2])
+        self.assertEqual([1, 2, None, 1], self.call([0, 2, "lookup", ["a"]])[2])
+        self.assertEqual(1, s.handler.calls)
+        self.call([0, 3, "store", ["a", 2]])
+        self.assertEqual([1, 4, None, 2], self.call([0, 4, "lookup", ["a"]])[2])
+        self.assertEqual(2, s.handler.calls)
+
+    def test_parse_response(self):
+        """ Pack our response """
+        data = [1, 7, None, "pong!"]
+        self.assertEqual(data, msgpack.unpackb(self.s.parse_response(None, data), raw=False))
+
+    def tearDown(self):
+        self.s.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
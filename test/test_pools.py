@@ -0,0 +1,65 @@
+"""
+Unittests for the rpc.pools module
+"""
+import sys
+import unittest
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+
+from mock import patch
+
+from rpc import pools
+
+class ConnectionPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        self.pool = pools.ConnectionPool(maxconns=3, idle_timeout=10)
+
+    def test_repr(self):
+        """ Stringify nicely """
+        self.assertEqual("<ConnectionPool of 3 connections>", str(self.pool))
+
+    def test_session(self):
+        """ Reuse the same session between calls """
+        session = self.pool.session
+        self.assertTrue(session is self.pool.session)
+        adapter = session.get_adapter("http://example.com")
+        self.assertEqual(3, adapter._pool_maxsize)
+
+    def test_idle_timeout(self):
+        """ Drop idle sessions """
+        with patch.object(pools.time, "time") as Ptime:
+            Ptime.return_value = 100
+            session = self.pool.session
+            Ptime.return_value = 105
+            self.assertTrue(session is self.pool.session)
+            Ptime.return_value = 120
+            self.assertFalse(session is self.pool.session)
+
+    def test_close(self):
+        """ Closing means a fresh session next time """
+        session = self.pool.session
+        self.pool.close()
+        self.assertFalse(session is self.pool.session)
+
+    def tearDown(self):
+        self.pool.close()
+
+
+class GetPoolTestCase(unittest.TestCase):
+    def setUp(self):
+        pools.close_all()
+
+    def test_shared_by_host(self):
+        """ One pool per scheme and host """
+        one = pools.get_pool("http://example.com/a", maxconns=2)
+        self.assertTrue(one is pools.get_pool("http://example.com/b"))
+        self.assertEqual(2, pools.get_pool("http://example.com").maxconns)
+        self.assertFalse(one is pools.get_pool("https://example.com/a"))
+        self.assertFalse(one is pools.get_pool("http://example.com:8080/a"))
+
+    def tearDown(self):
+        pools.close_all()
+
+
+if __name__ == '__main__':
+    unittest.main()
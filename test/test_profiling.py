@@ -0,0 +1,99 @@
+"""
+Unittests for the rpc.profiling module
+"""
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import unittest
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+
+from mock import patch
+
+from rpc import profiling
+
+def work(n):
+    return sum(range(n))
+
+class SpecTestCase(unittest.TestCase):
+    def test_spec(self):
+        """ Round trip the spec through the file next to the pidfile """
+        pidfile = tempfile.NamedTemporaryFile(suffix=".pid")
+        profiling.write_spec(pidfile.name, requests=10)
+        self.assertEqual(dict(seconds=None, requests=10), profiling.read_spec(pidfile.name))
+        os.remove(profiling.spec_path(pidfile.name))
+        with self.assertRaises(IOError):
+            profiling.read_spec(pidfile.name)
+
+    def test_stats_path(self):
+        """ Write stats beside the pidfile, naming the process """
+        with patch.object(profiling.os, 'getpid', return_value=99):
+            path = profiling.stats_path("/tmp/rpc/localhost:4567.pid")
+        self.assertTrue(path.startswith("/tmp/rpc/localhost:4567.99."))
+        self.assertTrue(path.endswith(".pstats"))
+
+
+class ProfilerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mktemp(suffix=".pstats")
+
+    def tearDown(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def functions(self):
+        return set(name for filename, line, name in pstats.Stats(self.path).stats)
+
+    def test_requests(self):
+        """ Profile the next requests, then write the stats """
+        profiler = profiling.Profiler(self.path, requests=2)
+        self.assertEqual(45, profiler.call(work, 10))
+        self.assertFalse(os.path.exists(self.path))
+        profiler.call(work, 10)
+        self.assertTrue(profiler.done)
+        self.assertIn("work", self.functions())
+        self.assertEqual(45, profiler.call(work, 10))
+        self.assertEqual(2, profiler.profiled)
+
+    def test_seconds(self):
+        """ Write the stats when time's up """
+        profiler = profiling.Profiler(self.path, seconds=0.05)
+        profiler.call(work, 10)
+        profiler._timer.join(5)
+        self.assertTrue(profiler.done)
+        self.assertIn("work", self.functions())
+
+    def test_idle(self):
+        """ Write nothing if there was nothing to profile """
+        profiler = profiling.Profiler(self.path, seconds=0.01)
+        profiler._timer.join(5)
+        self.assertTrue(profiler.done)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_threads(self):
+        """ Merge the profiles of each thread, once calls in flight finish """
+        profiler = profiling.Profiler(self.path, seconds=60)
+        started, release = threading.Event(), threading.Event()
+        def slow():
+            started.set()
+            release.wait()
+        thread = threading.Thread(target=profiler.call, args=(slow,))
+        thread.start()
+        started.wait()
+        profiler.call(work, 10)
+        profiler.stop()
+        self.assertFalse(os.path.exists(self.path))
+        release.set()
+        thread.join(5)
+        self.assertTrue(set(["slow", "work"]) <= self.functions())
+
+    def test_nothing(self):
+        """ Refuse to profile forever """
+        with self.assertRaises(ValueError):
+            profiling.Profiler(self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+Unittests for the rpc.retry module
+"""
+import sys
+import unittest
+if sys.version_info < (2, 7):
+    import unittest2 as unittest
+
+from mock import patch, Mock
+
+from rpc import retry
+
+class RetryBudgetTestCase(unittest.TestCase):
+    def setUp(self):
+        self.budget = retry.RetryBudget(ratio=0.5, reserve=2)
+
+    def test_repr(self):
+        """ Stringify nicely """
+        self.assertEqual("<RetryBudget 2.0/2 retries>", str(self.budget))
+
+    def test_withdraw(self):
+        """ Spend our reserve, then earn more with calls """
+        self.assertTrue(self.budget.withdraw())
+        self.assertTrue(self.budget.withdraw())
+        self.assertFalse(self.budget.withdraw())
+        self.budget.deposit()
+        self.assertFalse(self.budget.withdraw())
+        self.budget.deposit()
+        self.assertTrue(self.budget.withdraw())
+
+    def test_reserve(self):
+        """ Never save up more than our reserve """
+        for i in range(10):
+            self.budget.deposit()
+        self.assertEqual("<RetryBudget 2.0/2 retries>", str(self.budget))
+
+
+class RetryPolicyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.policy = retry.RetryPolicy(attempts=3, idempotent=["ping"])
+        self.sleep = patch.object(retry.time, "sleep")
+        self.Psleep = self.sleep.start()
+
+    def call(self, fn, method="ping", policy=None):
+        policy = policy or self.policy
+        return policy.call(fn, method, (1,), transient=(IOError,), unsent=(OSError,))
+
+    def test_repr(self):
+        """ Stringify nicely """
+        self.assertEqual("<RetryPolicy of 3 attempts>", str(self.policy))
+
+    def test_success(self):
+        """ Pass calls through """
+        fn = Mock(return_value="pong!")
+        self.assertEqual("pong!", self.call(fn))
+        fn.assert_called_once_with("ping", 1)
+        self.assertEqual(dict(calls=1, attempts=1, retries=0, giveups=0, budget_exhausted=0),
+                         self.policy.stats())
+
+    def test_retry(self):
+        """ Retry transient errors """
+        fn = Mock(side_effect=[IOError(), IOError(), "pong!"])
+        self.assertEqual("pong!", self.call(fn))
+        self.assertEqual(3, fn.call_count)
+        self.assertEqual(2, self.Psleep.call_count)
+        self.assertEqual((3, 2), (self.policy.attempts, self.policy.retries))
+
+    def test_giveup(self):
+        """ Give up after our attempts """
+        fn = Mock(side_effect=IOError())
+        with self.assertRaises(IOError):
+            self.call(fn)
+        self.assertEqual(3, fn.call_count)
+        self.assertEqual(1, self.policy.giveups)
+
+    def test_not_transient(self):
+        """ Don't retry other errors """
+        fn = Mock(side_effect=ValueError())
+        with self.assertRaises(ValueError):
+            self.call(fn)
+        self.assertEqual(1, fn.call_count)
+        self.assertEqual(0, self.policy.giveups)
+
+    def test_idempotent(self):
+        """ Only retry transient errors for idempotent methods """
+        fn = Mock(side_effect=IOError())
+        with self.assertRaises(IOError):
+            self.call(fn, method="charge")
+        self.assertEqual(1, fn.call_count)
+        fn = Mock(side_effect=[IOError(), "ok"])
+        self.assertEqual("ok", self.call(fn, method="charge",
+                                         policy=retry.RetryPolicy(idempotent=None)))
+
+    def test_idempotent_default(self):
+        """ Retry transient errors for no methods unless they're declared """
+        fn = Mock(side_effect=[IOError(), "ok"])
+        with self.assertRaises(IOError):
+            self.call(fn, method="ping", policy=retry.RetryPolicy())
+        fn = Mock(side_effect=[OSError(), "ok"])
+        self.assertEqual("ok", self.call(fn, method="ping", policy=retry.RetryPolicy()))
+
+    def test_unsent(self):
+        """ Always retry calls that were never made """
+        fn = Mock(side_effect=[OSError(), "ok"])
+        self.assertEqual("ok", self.call(fn, method="charge"))
+
+    def test_budget(self):
+        """ Stop retrying when the budget runs out """
+        policy = retry.RetryPolicy(attempts=5, idempotent=None,
+                                   budget=retry.RetryBudget(ratio=0, reserve=1))
+        fn = Mock(side_effect=IOError())
+        with self.assertRaises(IOError):
+            self.call(fn, policy=policy)
+        self.assertEqual(2, fn.call_count)
+        self.assertEqual((1, 1), (policy.giveups, policy.budget_exhausted))
+
+    def test_delay(self):
+        """ Jittered exponential backoff """
+        policy = retry.RetryPolicy(backoff=1, max_backoff=5)
+        with patch.object(retry.random, "uniform") as Puniform:
+            for attempt in [1, 2, 3, 4]:
+                policy.delay(attempt)
+        self.assertEqual([((0, 1),), ((0, 2),), ((0, 4),), ((0, 5),)],
+                         Puniform.call_args_list)
+
+    def tearDown(self):
+        self.sleep.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
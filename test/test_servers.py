@@ -1,14 +1,23 @@
 """
 Unittests for the rpc.servers module
 """
+import multiprocessing
+import os
+import signal
+import StringIO
 import sys
+import tempfile
+import threading
+import time
 import unittest
+import urllib2
+import zlib
 if sys.version_info < (2, 7):
     import unittest2 as unittest
 
 from mock import patch, Mock
 
-from rpc import servers
+from rpc import admission, compression, exceptions, profiling, servers
 
 # Use this as our dummy handler
 class Handler(object):
@@ -18,6 +27,114 @@ class Handler(object):
     def sayhi(self, person):
         return "Hi " + person
 
+class BackendTestCase(unittest.TestCase):
+
+    def test_get_backend(self):
+        """ Look up backends by name """
+        self.assertIsInstance(servers.get_backend("simple"), servers.SimpleBackend)
+        backend = servers.get_backend("threaded", workers=3)
+        self.assertEqual(3, backend.workers)
+        self.assertTrue(servers.get_backend(backend) is backend)
+        self.assertIsInstance(servers.get_backend("eventloop"), servers.EventLoopBackend)
+        with self.assertRaises(ValueError):
+            servers.get_backend("gevent")
+
+    def test_repr(self):
+        """ Stringify nicely """
+        self.assertEqual("<threaded Backend with 3 workers>",
+                         str(servers.ThreadedBackend(workers=3)))
+
+    def test_eventloop_max_body(self):
+        """ The event loop refuses bodies its HTTPServer would """
+        server = servers.HTTPServer("localhost", 8878, Handler)
+        server.max_body = 1024
+        httpd = servers.EventLoopBackend().make_server('127.0.0.1', 0, server.app)
+        self.assertEqual(1024, httpd.max_body)
+        httpd.server_close()
+
+    def test_threaded(self):
+        """ Handle requests concurrently """
+        def app(environ, start_response):
+            time.sleep(0.1)
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return ['pong!']
+        httpd = servers.ThreadedBackend(workers=4, backlog=5).make_server('127.0.0.1', 0, app)
+        self.assertEqual(5, httpd.request_queue_size)
+        thread = threading.Thread(target=httpd.serve_forever)
+        thread.daemon = True
+        thread.start()
+        url = "http://127.0.0.1:{0}/".format(httpd.server_address[1])
+        results = []
+        def call():
+            results.append(urllib2.urlopen(url).read())
+        callers = [threading.Thread(target=call) for i in range(4)]
+        start = time.time()
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+        self.assertTrue(time.time() - start < 0.35)
+        self.assertEqual(['pong!'] * 4, results)
+        httpd.shutdown()
+        httpd.server_close()
+
+
+class PreforkTestCase(unittest.TestCase):
+
+    def test_backend(self):
+        """ Default to a worker per CPU """
+        backend = servers.get_backend("prefork")
+        self.assertEqual(multiprocessing.cpu_count(), backend.workers)
+        self.assertFalse(backend.pin)
+
+    def test_serve(self):
+        """ Serve from forked workers, replacing any that die """
+        def app(environ, start_response):
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [str(os.getpid())]
+        master = servers.PreforkBackend(workers=2, pin=True).make_server('127.0.0.1', 0, app)
+        url = "http://127.0.0.1:{0}/".format(master.server_address[1])
+        pid = os.fork()
+        if not pid:
+            sys.stderr = open(os.devnull, 'w')
+            master.serve_forever()
+            os._exit(0)
+        master.server_close()
+        try:
+            def worker(seconds=5):
+                deadline = time.time() + seconds
+                while True:
+                    try:
+                        return int(urllib2.urlopen(url, timeout=1).read())
+                    except Exception:
+                        if time.time() > deadline:
+                            raise
+                        time.sleep(0.05)
+            victim = worker()
+            self.assertNotEqual(pid, victim)
+            os.kill(victim, signal.SIGKILL)
+            time.sleep(0.1)
+            self.assertTrue(all(worker() != victim for i in range(10)))
+        finally:
+            os.kill(pid, signal.SIGTERM)
+            self.assertEqual((pid, 0), os.waitpid(pid, 0))
+        with self.assertRaises(urllib2.URLError):
+            urllib2.urlopen(url, timeout=1)
+
+    def test_forward(self):
+        """ Pass SIGUSR1 on to the workers if it's handled """
+        master = servers.PreforkBackend(workers=2).make_server('127.0.0.1', 0, None)
+        master._pids = {101: (0, 0), 102: (1, 0)}
+        with patch.object(servers.os, 'kill') as Pkill:
+            master._forward(signal.SIGUSR1, None)
+            self.assertFalse(Pkill.called)
+            master._usr1 = lambda signum, frame: None
+            master._forward(signal.SIGUSR1, None)
+            Pkill.assert_any_call(101, signal.SIGUSR1)
+            Pkill.assert_any_call(102, signal.SIGUSR1)
+        master.server_close()
+
+
 class WebobifyTestCase(unittest.TestCase):
 
     def test_webobify(self):
@@ -36,6 +153,58 @@ class WebobifyTestCase(unittest.TestCase):
             self.assertEqual(mock_request, req)
 
 
+class RequestTestCase(unittest.TestCase):
+    def environ(self, body='', **extra):
+        environ = {'REQUEST_METHOD': 'POST', 'CONTENT_LENGTH': str(len(body)),
+                   'CONTENT_TYPE': 'application/x-www-form-urlencoded; charset=utf-8',
+                   'QUERY_STRING': 'a=1&a=2&b=', 'wsgi.input': StringIO.StringIO(body + 'MORE')}
+        environ.update(extra)
+        return environ
+
+    def test_attributes(self):
+        """ Read the method and content type from the environ """
+        request = servers.Request(self.environ())
+        self.assertEqual('POST', request.method)
+        self.assertEqual('application/x-www-form-urlencoded', request.content_type)
+        self.assertEqual('GET', servers.Request({}).method)
+
+    def test_body(self):
+        """ Read only Content-Length bytes of the body, once """
+        environ = self.environ('method=ping')
+        request = servers.Request(environ)
+        self.assertEqual('method=ping', request.body)
+        self.assertEqual('method=ping', request.body)
+        self.assertEqual('', servers.Request(self.environ(CONTENT_LENGTH='')).body)
+
+        request.body = 'method=pong'
+        self.assertEqual('11', environ['CONTENT_LENGTH'])
+        self.assertEqual('pong', request.POST['method'])
+
+    def test_GET(self):
+        """ Parse the query string, the last value winning """
+        self.assertEqual(dict(a='2', b=''), servers.Request(self.environ()).GET)
+
+    def test_POST(self):
+        """ Parse form bodies of POST requests only """
+        request = servers.Request(self.environ('method=%22ping%22&id=1'))
+        self.assertEqual(dict(method='"ping"', id='1'), request.POST)
+        request = servers.Request(self.environ('{}', CONTENT_TYPE='application/json'))
+        self.assertEqual({}, request.POST)
+        request = servers.Request(self.environ('id=1', REQUEST_METHOD='GET'))
+        self.assertEqual({}, request.POST)
+
+    def test_headers(self):
+        """ Look up headers by name """
+        environ = self.environ(HTTP_CONTENT_ENCODING='gzip')
+        headers = servers.Request(environ).headers
+        self.assertEqual('gzip', headers.get('Content-Encoding'))
+        self.assertEqual('application/x-www-form-urlencoded; charset=utf-8',
+                         headers['Content-Type'])
+        self.assertEqual(None, headers.get('Accept-Encoding'))
+        del headers['Content-Encoding']
+        self.assertNotIn('HTTP_CONTENT_ENCODING', environ)
+
+
 class ServerTestCase(unittest.TestCase):
     def setUp(self):
         self.s = servers.Server(host="localhost", port=6786, handler=Handler)
@@ -93,11 +262,23 @@ class HTTPServerTestCase(unittest.TestCase):
         self.s = servers.HTTPServer("localhost", 8878, Handler)
 
     def test_close(self):
-        """Close the socket"""
+        """Close the socket and stop the backend's workers, once"""
         mock_httpd = Mock(name='Mock HTTPD')
         self.s.httpd = mock_httpd
         self.s.close()
-        mock_httpd.socket.close.assert_called_once_with()
+        self.s.close()
+        mock_httpd.server_close.assert_called_once_with()
+
+    def test_close_threaded(self):
+        """ Stop the thread pool's workers on close """
+        self.s.backend = servers.get_backend("threaded", workers=2)
+        self.s.httpd = self.s.backend.make_server('127.0.0.1', 0, self.s.app)
+        threads = list(self.s.httpd._threads)
+        self.assertEqual(2, len(threads))
+        self.s.close()
+        for thread in threads:
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
 
     def test_parse_response(self):
         """ Should be a noop """
@@ -115,6 +296,166 @@ class HTTPServerTestCase(unittest.TestCase):
         mock_resp.assert_called_once_with('200 OK', ())
         self.assertEqual(['HAI'], resp)
 
+    def test_app_stream(self):
+        """ Send Streams in chunks as they're produced """
+        mock_procedure = Mock(name='Mock Procedure')
+        stream = servers.Stream(iter(["aa", "bb", "cc"]))
+        mock_procedure.return_value = '200 OK', [('Content-Type', 'text/plain')], stream
+        mock_resp = Mock(name='Mock Response')
+        self.s.procedure = mock_procedure
+        self.s.stream_buffer = 5
+
+        resp = self.s.app({}, mock_resp)
+        mock_resp.assert_called_once_with('200 OK', [('Content-Type', 'application/x-ndjson')])
+        self.assertEqual(["aa\nbb\n", "cc\n"], list(resp))
+
+    def test_app_compression(self):
+        """ Compress responses over the threshold for clients which accept it """
+        self.s.compression = compression.Compression(threshold=3)
+        self.s.procedure = Mock(name='Mock Procedure', return_value=('200 OK', [], 'HAI'))
+        mock_resp = Mock(name='Mock Response')
+        environ = {'HTTP_ACCEPT_ENCODING': 'deflate', 'REQUEST_METHOD': 'GET'}
+
+        resp = self.s.app(environ, mock_resp)
+        mock_resp.assert_called_once_with('200 OK', [('Accept-Encoding', 'gzip, deflate'),
+                                                     ('Vary', 'Accept-Encoding'),
+                                                     ('Content-Encoding', 'deflate')])
+        self.assertEqual(['HAI'], [zlib.decompress(r) for r in resp])
+
+        self.s.compression.threshold = 4
+        self.assertEqual(['HAI'], self.s.app(environ, Mock()))
+
+    def test_app_compressed_request(self):
+        """ Decompress request bodies """
+        self.s.compression = compression.Compression()
+        self.s.procedure = Mock(name='Mock Procedure', return_value=('200 OK', [], 'HAI'))
+        body = zlib.compress('{"method": "ping"}')
+        environ = {'REQUEST_METHOD': 'POST', 'HTTP_CONTENT_ENCODING': 'deflate',
+                   'CONTENT_LENGTH': str(len(body)), 'wsgi.input': StringIO.StringIO(body)}
+        self.s.app(environ, Mock())
+        request = self.s.procedure.call_args[0][0]
+        self.assertEqual('{"method": "ping"}', request.body)
+
+        environ['HTTP_CONTENT_ENCODING'] = 'br'
+        mock_resp = Mock(name='Mock Response')
+        self.s.app(environ, mock_resp)
+        self.assertEqual('415 Unsupported Media Type', mock_resp.call_args[0][0])
+
+    def test_app_compressed_bomb(self):
+        """ Refuse request bodies which decompress past max_body """
+        self.s.compression = compression.Compression()
+        self.s.procedure = Mock(name='Mock Procedure', return_value=('200 OK', [], 'HAI'))
+        self.s.max_body = 1024 * 1024
+        body = self.s.compression.compress('\0' * (64 * 1024 * 1024), compression.GZIP)
+        self.assertTrue(len(body) < self.s.max_body)
+        environ = {'REQUEST_METHOD': 'POST', 'HTTP_CONTENT_ENCODING': 'gzip',
+                   'CONTENT_LENGTH': str(len(body)), 'wsgi.input': StringIO.StringIO(body)}
+        mock_resp = Mock(name='Mock Response')
+        self.assertEqual(['413 Request Entity Too Large'], self.s.app(environ, mock_resp))
+        self.assertEqual('413 Request Entity Too Large', mock_resp.call_args[0][0])
+        self.assertFalse(self.s.procedure.called)
+
+    def test_app_length(self):
+        """ Refuse bodies over max_body, or with an invalid length """
+        self.s.procedure = Mock(name='Mock Procedure', return_value=('200 OK', [], 'HAI'))
+        self.s.max_body = 10
+        for length, status in [('11', '413 Request Entity Too Large'),
+                               ('-1', '400 Bad Request'), ('ten', '400 Bad Request')]:
+            mock_resp = Mock(name='Mock Response')
+            environ = {'REQUEST_METHOD': 'POST', 'CONTENT_LENGTH': length,
+                       'wsgi.input': StringIO.StringIO('x' * 11)}
+            self.assertEqual([status], self.s.app(environ, mock_resp))
+            self.assertEqual(status, mock_resp.call_args[0][0])
+        self.assertFalse(self.s.procedure.called)
+
+    def test_app_overloaded(self):
+        """ Answer calls admission control sheds with a 503 """
+        self.s.admission = admission.AdmissionControl(retry_after=2)
+        self.s.procedure = Mock(name='Mock Procedure',
+                                side_effect=admission._Shed("Busy", 2))
+        mock_resp = Mock(name='Mock Response')
+        self.assertEqual(['503 Service Unavailable'], self.s.app({}, mock_resp))
+        mock_resp.assert_called_once_with('503 Service Unavailable',
+                                          [('Content-Type', 'text/plain'), ('Retry-After', '2')])
+
+    def test_app_handler_overloaded(self):
+        """ Only calls admission control sheds are answered with a 503 """
+        self.s.procedure = Mock(name='Mock Procedure',
+                                side_effect=exceptions.OverloadedError("Busy"))
+        with self.assertRaises(exceptions.OverloadedError):
+            self.s.app({}, Mock(name='Mock Response'))
+
+    def test_invoke_admission(self):
+        """ Call handler methods once admission control lets us """
+        self.s.admission = admission.AdmissionControl(limit=1, queue=0)
+        with self.s.admission.admit("other"):
+            with self.assertRaises(exceptions.OverloadedError):
+                self.s.invoke(self.s.table['ping'], [])
+        self.assertEqual("pong!", self.s.invoke(self.s.table['ping'], []))
+
+    def test_app_metrics(self):
+        """ Serve our metrics, and time requests into them """
+        self.s.procedure = Mock(name='Mock Procedure', return_value=('200 OK', [], 'HAI'))
+        self.s.app({'REQUEST_METHOD': 'GET'}, Mock())
+        self.assertEqual(1, self.s.metrics.decode.count)
+        self.assertEqual(1, self.s.metrics.encode.count)
+
+        mock_resp = Mock(name='Mock Response')
+        body = self.s.app({'REQUEST_METHOD': 'GET', 'PATH_INFO': '/metrics'}, mock_resp)
+        self.assertIn('rpc_decode_seconds_count 1\n', body[0])
+        self.assertIn('rpc_handler_seconds_count{method="ping"} 0\n', body[0])
+        mock_resp.assert_called_once_with('200 OK', [('Content-Type', 'text/plain; version=0.0.4'),
+                                                     ('Content-Length', str(len(body[0])))])
+        self.assertEqual(1, self.s.procedure.call_count)
+
+    def test_invoke_metrics(self):
+        """ Time calls to each method, and count those which raise """
+        self.s.invoke(self.s.table['ping'], [])
+        with self.assertRaises(TypeError):
+            self.s.invoke(self.s.table['sayhi'], [1])
+        timing, errors = self.s.metrics.method('ping')
+        self.assertEqual(1, timing.count)
+        self.assertEqual(0, errors.value)
+        timing, errors = self.s.metrics.method('sayhi')
+        self.assertEqual(1, timing.count)
+        self.assertEqual(1, errors.value)
+        self.assertEqual(0, self.s.metrics.queue.count)
+
+    def test_invoke_metrics_queue(self):
+        """ Time waiting for admission apart from the handler """
+        self.s.admission = admission.AdmissionControl(limit=1, queue=0)
+        with patch.object(servers, '_time', side_effect=[0.0, 2.0, 2.5, 3.0]):
+            self.s.invoke(self.s.table['ping'], [])
+        timing, errors = self.s.metrics.method('ping')
+        self.assertEqual((1, 0.5), (timing.count, timing.sum))
+        self.assertEqual((1, 2.5), (self.s.metrics.queue.count, self.s.metrics.queue.sum))
+        self.assertEqual(3.0, self.s._local.handled)
+
+    def test_profile(self):
+        """ Run requests under the profiler until it's done """
+        path = tempfile.mktemp(suffix=".pstats")
+        self.s.procedure = Mock(name='Mock Procedure', return_value=('200 OK', [], 'HAI'))
+        profiler = self.s.profile(path, requests=1)
+        self.assertTrue(self.s.profile(path, seconds=5) is profiler)
+        self.assertEqual(['HAI'], self.s.app({'REQUEST_METHOD': 'GET'}, Mock()))
+        self.assertEqual(1, profiler.profiled)
+        self.assertTrue(os.path.exists(path))
+        os.remove(path)
+        self.s.app({'REQUEST_METHOD': 'GET'}, Mock())
+        self.assertEqual(1, profiler.profiled)
+        self.assertTrue(self.s.profile(path, seconds=5) is not profiler)
+        self.s.profiler.stop()
+
+    def test_app_request_class(self):
+        """ Wrap requests in our request_class """
+        self.s.procedure = Mock(name='Mock Procedure', return_value=('200 OK', [], 'HAI'))
+        self.s.app({'REQUEST_METHOD': 'GET'}, Mock())
+        self.assertIsInstance(self.s.procedure.call_args[0][0], servers.Request)
+
+        self.s.request_class = servers.webob.Request
+        self.s.app({'REQUEST_METHOD': 'GET'}, Mock())
+        self.assertIsInstance(self.s.procedure.call_args[0][0], servers.webob.Request)
+
     # !!! serve
 
     def test_procedure(self):
@@ -126,6 +467,93 @@ class HTTPServerTestCase(unittest.TestCase):
         pass
 
 
+class DispatchTestCase(unittest.TestCase):
+    class Exposed(object):
+        name = "Larry"
+
+        @servers.expose
+        def ping(self):
+            return "pong!"
+
+        def hidden(self):
+            return "boo"
+
+    class Arities(object):
+        def one(self, a):
+            pass
+
+        def some(self, a, b=None):
+            pass
+
+        def many(self, a, *rest):
+            pass
+
+        def _private(self):
+            pass
+
+    def test_public(self):
+        """ Include public callables only """
+        self.assertEqual(['many', 'one', 'some'],
+                         sorted(servers.dispatch_table(self.Arities())))
+
+    def test_exposed(self):
+        """ Restrict handlers with exposed methods to those """
+        self.assertEqual(['ping'], list(servers.dispatch_table(self.Exposed())))
+
+    def test_methods(self):
+        """ Restrict the table to the methods we're given """
+        table = servers.dispatch_table(self.Exposed(), methods=['hidden'])
+        self.assertEqual(['hidden'], list(table))
+        self.assertEqual("boo", table['hidden']())
+        with self.assertRaises(ValueError):
+            servers.dispatch_table(self.Exposed(), methods=['name'])
+
+    def test_check(self):
+        """ Check the number of arguments """
+        table = servers.dispatch_table(self.Arities())
+        self.assertEqual(None, table['one'].check([1]))
+        self.assertEqual("TypeError: one() takes exactly 1 argument (2 given)",
+                         table['one'].check([1, 2]))
+        self.assertEqual(None, table['some'].check([1]))
+        self.assertEqual("TypeError: some() takes at most 2 arguments (3 given)",
+                         table['some'].check([1, 2, 3]))
+        self.assertEqual("TypeError: many() takes at least 1 argument (0 given)",
+                         table['many'].check([]))
+        self.assertEqual(None, table['many'].check(range(10)))
+
+    def test_check_uninspectable(self):
+        """ Accept any arguments for callables we can't inspect """
+        method = servers.Method('max', max)
+        self.assertEqual(None, method.check([]))
+
+    def test_decorators(self):
+        """ Record which methods are memoized, and what they invalidate """
+        class Handler(object):
+            @servers.memoize
+            def lookup(self):
+                pass
+
+            @servers.invalidates('lookup')
+            def store(self):
+                pass
+
+            @servers.coalesce
+            def slow(self):
+                pass
+
+        table = servers.dispatch_table(Handler())
+        self.assertEqual([False, False, True], [table[name].coalesced
+                                                for name in ['lookup', 'store', 'slow']])
+        self.assertEqual((True, ()), (table['lookup'].memoized, table['lookup'].invalidates))
+        self.assertEqual((False, ('lookup',)), (table['store'].memoized, table['store'].invalidates))
+
+    def test_server_table(self):
+        """ Build the table when we start, listing its methods """
+        server = servers.HTTPServer("localhost", 8878, Handler, methods=['ping'])
+        self.assertEqual(['ping', 'system.listMethods'], sorted(server.table))
+        self.assertEqual(['ping', 'system.listMethods'], server.table['system.listMethods']())
+
+
 class ServerDaemonTestCase(unittest.TestCase):
     def setUp(self):
         self.serv = servers.Server("example.com", 4545, Handler)
@@ -137,10 +565,29 @@ class ServerDaemonTestCase(unittest.TestCase):
         self.assertEqual('/tmp/example.com', self.daemon.pidfile)
 
     def test_run(self):
-        """ Run the server """
-        with patch.object(self.serv, 'serve') as Pserv:
-            self.daemon.run()
-            Pserv.assert_called_once_with()
+        """ Run the server, profiling on SIGUSR1 """
+        previous = signal.getsignal(signal.SIGUSR1)
+        try:
+            with patch.object(self.serv, 'serve') as Pserv:
+                self.daemon.run()
+                Pserv.assert_called_once_with()
+            self.assertEqual(self.daemon.profile, signal.getsignal(signal.SIGUSR1))
+        finally:
+            signal.signal(signal.SIGUSR1, previous)
+
+    def test_profile(self):
+        """ Profile as the spec file next to our pidfile asks """
+        self.daemon.pidfile = tempfile.mktemp(suffix=".pid")
+        with patch.object(self.serv, 'profile') as Pprofile:
+            with patch.object(sys, 'stderr', StringIO.StringIO()):
+                self.daemon.profile(signal.SIGUSR1, None)
+            self.assertFalse(Pprofile.called)
+            profiling.write_spec(self.daemon.pidfile, seconds=10)
+            self.daemon.profile(signal.SIGUSR1, None)
+            os.remove(profiling.spec_path(self.daemon.pidfile))
+        path = Pprofile.call_args[0][0]
+        self.assertTrue(path.startswith(self.daemon.pidfile[:-4] + "."))
+        self.assertEqual(dict(seconds=10, requests=None), Pprofile.call_args[1])
 
     def tearDown(self):
         pass
@@ -15,7 +15,14 @@ from thrift.server import TProcessPoolServer
 from thrift.transport import TSocket, TTransport
 
 from service import Service
-from rpc import thrifty
+from rpc import caching, retry, thrifty
+
+class Handler(object):
+    def ping(self):
+        return "pong!"
+
+    def fail(self):
+        raise ValueError()
 
 class ClientMakerTestCase(unittest.TestCase):
 
@@ -66,6 +73,48 @@ class ClientTestCase(unittest.TestCase):
                 Ptrans.TBufferedTransport.return_value.open.assert_called_once_with()
             Ptrans.TBufferedTransport.return_value.close.assert_called_once_with()
 
+    def test_apicall(self):
+        """ Open the transport around calls made on the Client """
+        client = thrifty.Client("localhost:30303", Service)
+        client._client = Mock(name="Mock Service Client")
+        client._transport = Mock(name="Mock Transport")
+        client._transport.isOpen.return_value = False
+        client.ping()
+        client._client.ping.assert_called_once_with()
+        client._transport.open.assert_called_once_with()
+        client._transport.close.assert_called_once_with()
+
+    def test_apicall_open(self):
+        """ Use an already open transport """
+        client = thrifty.Client("localhost:30303", Service)
+        client._client = Mock(name="Mock Service Client")
+        client._transport = Mock(name="Mock Transport")
+        client._transport.isOpen.return_value = True
+        client.ping()
+        client._client.ping.assert_called_once_with()
+        self.assertEqual(0, client._transport.open.call_count)
+
+    def test_cache(self):
+        """ Answer repeat calls from the cache """
+        client = thrifty.Client("localhost:30303", Service, cache=caching.ResponseCache())
+        client._client = Mock(name="Mock Service Client")
+        client._transport = Mock(name="Mock Transport")
+        client.ping()
+        client.ping()
+        client._client.ping.assert_called_once_with()
+
+    def test_retry_connect(self):
+        """ Retry failing to open the transport """
+        policy = retry.RetryPolicy(backoff=0, idempotent=[])
+        client = thrifty.Client("localhost:30303", Service, retry=policy)
+        client._client = Mock(name="Mock Service Client")
+        client._transport = Mock(name="Mock Transport")
+        client._transport.isOpen.return_value = False
+        client._transport.open.side_effect = [TTransport.TTransportException(), None]
+        client.ping()
+        client._client.ping.assert_called_once_with()
+        self.assertEqual(1, policy.retries)
+
     def tearDown(self):
         pass
 
@@ -83,6 +132,29 @@ class ServerTestCase(unittest.TestCase):
         self.assertIsInstance(server.handler, dict)
         self.assertIsInstance(server._server, TProcessPoolServer.TProcessPoolServer)
 
+    def test_metrics(self):
+        """ Time calls to the handler's methods """
+        server = thrifty.Server(host="localhost", port=4444, handler=Handler, service=Service)
+        processor = server._server.processor
+        self.assertEqual("pong!", processor._handler.ping())
+        with self.assertRaises(ValueError):
+            processor._handler.fail()
+        timing, errors = server.metrics.method("ping")
+        self.assertEqual(1, timing.count)
+        timing, errors = server.metrics.method("fail")
+        self.assertEqual(1, errors.value)
+
+    def test_metrics_port(self):
+        """ Serve metrics over HTTP when given a port """
+        server = thrifty.Server(host="localhost", port=4444, handler=dict, service=Service,
+                                metrics_port=0)
+        server._server = Mock(name='mock Tserver')
+        with patch.object(thrifty.metering, 'serve') as Pserve:
+            server.serve()
+            Pserve.assert_called_once_with(server.metrics, "localhost", 0, "/metrics")
+            server.close()
+            Pserve.return_value.shutdown.assert_called_once_with()
+
     def test_serve(self):
         "Serve should delegate"
         server = thrifty.Server(host="localhost", port=4444, handler=dict, service=Service)
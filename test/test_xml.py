@@ -2,14 +2,17 @@
 Unittests for the xmlrpc module
 """
 import SimpleXMLRPCServer
+import StringIO
 import sys
 import unittest
+import xmlrpclib
+import zlib
 if sys.version_info < (2, 7):
     import unittest2 as unittest
 
 from mock import patch, Mock
 
-from rpc import xmlrpc
+from rpc import caching, compression, metrics, xmlrpc
 
 class Handler(object):
     def ping(self):
@@ -40,6 +43,28 @@ class XmlClientTestCase(unittest.TestCase):
         self.c.ping()
         mock_proxy.ping.assert_called_once_with()
 
+    def test_cache(self):
+        """ Answer repeat calls from the cache """
+        c = xmlrpc.Client('http://localhost/xmlrpc', cache=caching.ResponseCache())
+        c._proxy = Mock(name='Mock PRoxy')
+        c.ping()
+        c.ping()
+        c._proxy.ping.assert_called_once_with()
+
+    def test_compression(self):
+        """ Gzip requests over the threshold """
+        c = xmlrpc.Client('https://localhost/xmlrpc',
+                          compression=compression.Compression(threshold=5))
+        transport = c._proxy._ServerProxy__transport
+        self.assertIsInstance(transport, xmlrpclib.SafeTransport)
+        connection = Mock(name="Mock Connection")
+        transport.send_content(connection, "<xml/>")
+        connection.putheader.assert_any_call("Content-Encoding", "gzip")
+        body = connection.endheaders.call_args[0][0]
+        self.assertEqual("<xml/>", zlib.decompress(body, 16 + zlib.MAX_WBITS))
+        transport.send_content(connection, "<x/>")
+        connection.endheaders.assert_called_with("<x/>")
+
     def test_imply_http(self):
         """ If no protocol specified default to http """
         c = xmlrpc.Client('localhost/xmlrpc')
@@ -98,6 +123,35 @@ class ServerTestCase(unittest.TestCase):
         with xmlrpc.Server('localhost', 5555,  Handler) as s:
             self.assertIsInstance(s, xmlrpc.Server)
 
+    def test_metrics(self):
+        """ Time each phase of calls to the handler's methods """
+        request = xmlrpclib.dumps(("Larry",), "sayhi")
+        response = self.s._server._marshaled_dispatch(request)
+        self.assertEqual((("Hi Larry",), None), xmlrpclib.loads(response))
+        self.s._server._marshaled_dispatch(xmlrpclib.dumps((), "sayhi"))
+        self.s._server._marshaled_dispatch(xmlrpclib.dumps((), "nosuch"))
+        self.s._server._marshaled_dispatch("<not xml")
+        timing, errors = self.s.metrics.method("sayhi")
+        self.assertEqual(2, timing.count)
+        self.assertEqual(1, errors.value)
+        self.assertEqual(4, self.s.metrics.decode.count)
+        self.assertEqual(2, self.s.metrics.encode.count)
+        self.assertNotIn("nosuch", self.s.metrics.handlers)
+        self.assertIn("system.listMethods", self.s.metrics.handlers)
+
+    def test_metrics_get(self):
+        """ Serve metrics to GET requests for the metrics path """
+        handler = Mock(name="Mock Request Handler", path="/metrics",
+                       server=self.s._server, wfile=StringIO.StringIO())
+        xmlrpc._MeteredRequestHandler.do_GET.im_func(handler)
+        handler.send_response.assert_called_once_with(200)
+        handler.send_header.assert_any_call("Content-Type", metrics.CONTENT_TYPE)
+        self.assertEqual(self.s.metrics.exposition(), handler.wfile.getvalue())
+
+        handler.path = "/other"
+        xmlrpc._MeteredRequestHandler.do_GET.im_func(handler)
+        handler.send_error.assert_called_once_with(404)
+
 
 
 